@@ -1,31 +1,71 @@
 import asyncio
+import os
 import tiktoken
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from contextlib import contextmanager
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from typing import List, Optional
 from app.models.schemas import (
     EmbedRequest, EmbedResponse, StructuredInput,
     ChunkRequest, ChunkResponse,
-    LoadModelRequest, UnloadModelRequest,
+    LoadModelRequest, SwapModelRequest, UnloadModelRequest, CacheSnapshotRequest, PrewarmRequest,
     OpenAIEmbedRequest, OpenAIEmbedResponse, OpenAIEmbeddingObject, OpenAIUsage,
     TokenRequest, TokenResponse
 )
-from app.core.model_manager import model_manager
+from app.core.model_manager import model_manager, ModelConflict
+from app.core.batcher import batch_manager
+from app.core.cache import cache_manager, track_cache_hits
+from app.core.chunk_cache import chunk_cache
 from app.services.embedding_service import embedding_service
-from app.middleware.auth import verify_api_key, verify_master_key
+from app.services.prewarm_service import prewarm_service
+from app.middleware.auth import verify_api_key, verify_master_key, get_client_identity
 from app.config.settings import settings
 from app.core.security import create_access_token
+from app.core.deadline import DeadlineExceeded, deadline_after
+from app.core.admission import admission_controller, Overloaded
 
 # Setup logger
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-concurrency_limiter = asyncio.Semaphore(settings.max_inflight_requests)
-
 # Tokenizer for counting usage (approximate, using cl100k_base)
 usage_tokenizer = tiktoken.get_encoding("cl100k_base")
 
+async def get_request_deadline(
+    x_request_timeout: Optional[float] = Header(
+        None, gt=0, description="Seconds the client is willing to wait; expired work is dropped."
+    )
+) -> Optional[float]:
+    """Converts the optional X-Request-Timeout header into an absolute deadline."""
+    return deadline_after(x_request_timeout)
+
+def single_worker_only():
+    """
+    Refuses admin changes to per-process state (loaded models, the in-memory cache)
+    with WORKERS > 1: a call only reaches the worker that accepted the connection,
+    so workers would end up serving different models under one alias.
+    """
+    if settings.workers > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Not available with WORKERS={settings.workers}: it would only change the worker that received it. "
+            "Change models.yaml or the cache settings and restart instead.",
+        )
+
+@contextmanager
+def admission_slot():
+    """
+    Holds an in-flight request slot. When the server is overloaded (no free slot, or
+    the model's estimated queue wait is over budget) the request fails fast with 503
+    and a Retry-After hint instead of queueing.
+    """
+    try:
+        with admission_controller.slot():
+            yield
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 @router.post("/auth/token", response_model=TokenResponse, dependencies=[Depends(verify_master_key)])
 async def get_access_token(request: TokenRequest):
     """
@@ -39,7 +79,12 @@ async def get_access_token(request: TokenRequest):
     )
 
 @router.post("/embed", response_model=EmbedResponse, dependencies=[Depends(verify_api_key)])
-async def embed(request: EmbedRequest):
+async def embed(
+    request: EmbedRequest,
+    response: Response,
+    client_id: str = Depends(get_client_identity),
+    deadline: Optional[float] = Depends(get_request_deadline)
+):
     """
     Generate embeddings for a list of texts or structured inputs.
     
@@ -52,7 +97,8 @@ async def embed(request: EmbedRequest):
     Raises:
         HTTPException: 422 for invalid input, 400 for model errors, 500 for internal errors.
     """
-    async with concurrency_limiter:
+    with admission_slot():
+        cache_hits = track_cache_hits()
         # 1. Normalize Input
         raw_inputs = request.input
         input_texts: List[str] = []
@@ -92,7 +138,11 @@ async def embed(request: EmbedRequest):
         
         # 2. Get Embeddings via Service
         try:
-            final_vectors = await embedding_service.get_embeddings(request.model, input_texts)
+            final_vectors = await embedding_service.get_embeddings(
+                request.model, input_texts, client_id=client_id, deadline=deadline, dimensions=request.dimensions
+            )
+        except DeadlineExceeded as e:
+             raise HTTPException(status_code=504, detail=str(e))
         except ValueError as e:
              raise HTTPException(status_code=400, detail=str(e))
         except RuntimeError as e:
@@ -101,6 +151,7 @@ async def embed(request: EmbedRequest):
         # 3. Construct Response
         dims = len(final_vectors[0]) if final_vectors else 0
         
+        response.headers["X-Cache-Hits"] = str(cache_hits.total)
         return EmbedResponse(
             model=request.model,
             dims=dims,
@@ -108,7 +159,12 @@ async def embed(request: EmbedRequest):
         )
 
 @router.post("/embed/chunk", response_model=ChunkResponse, dependencies=[Depends(verify_api_key)])
-async def chunk_and_embed(request: ChunkRequest):
+async def chunk_and_embed(
+    request: ChunkRequest,
+    response: Response,
+    client_id: str = Depends(get_client_identity),
+    deadline: Optional[float] = Depends(get_request_deadline)
+):
     """
     Split input text into chunks and generate embeddings for each chunk.
     
@@ -118,7 +174,8 @@ async def chunk_and_embed(request: ChunkRequest):
     Returns:
         ChunkResponse: List of chunks and their corresponding embeddings.
     """
-    async with concurrency_limiter:
+    with admission_slot():
+        cache_hits = track_cache_hits()
         raw_inputs = request.input
         if isinstance(raw_inputs, str):
             raw_inputs = [raw_inputs]
@@ -129,14 +186,24 @@ async def chunk_and_embed(request: ChunkRequest):
                 raw_inputs,
                 request.method,
                 request.size,
-                request.overlap
+                request.overlap,
+                client_id=client_id,
+                deadline=deadline,
+                dimensions=request.dimensions
             )
             
+            response.headers["X-Cache-Hits"] = str(cache_hits.total)
             return ChunkResponse(
                 model=request.model,
                 chunks=chunks,
                 vectors=vectors
             )
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Overloaded:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.exception(f"Chunk embedding failed: {e}")
             raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
@@ -144,7 +211,12 @@ async def chunk_and_embed(request: ChunkRequest):
 # --- OpenAI Compatible Endpoint ---
 
 @router.post("/v1/embeddings", response_model=OpenAIEmbedResponse, dependencies=[Depends(verify_api_key)])
-async def openai_embeddings(request: OpenAIEmbedRequest):
+async def openai_embeddings(
+    request: OpenAIEmbedRequest,
+    response: Response,
+    client_id: str = Depends(get_client_identity),
+    deadline: Optional[float] = Depends(get_request_deadline)
+):
     """
     OpenAI-compatible endpoint for generating embeddings.
     
@@ -154,7 +226,8 @@ async def openai_embeddings(request: OpenAIEmbedRequest):
     Returns:
         OpenAIEmbedResponse: Response following OpenAI's API format.
     """
-    async with concurrency_limiter:
+    with admission_slot():
+        cache_hits = track_cache_hits()
         # 1. Normalize Input (OpenAI supports str, list[str], list[int])
         # We only support str and list[str] for now
         input_texts: List[str] = []
@@ -178,7 +251,15 @@ async def openai_embeddings(request: OpenAIEmbedRequest):
             for text in input_texts:
                 prompt_tokens += len(usage_tokenizer.encode(text))
 
-            final_vectors = await embedding_service.get_embeddings(request.model, input_texts)
+            final_vectors = await embedding_service.get_embeddings(
+                request.model, input_texts, client_id=client_id, deadline=deadline, dimensions=request.dimensions
+            )
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Overloaded:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.exception(f"OpenAI embedding failed: {e}")
             raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
@@ -191,6 +272,7 @@ async def openai_embeddings(request: OpenAIEmbedRequest):
                 index=i
             ))
             
+        response.headers["X-Cache-Hits"] = str(cache_hits.total)
         return OpenAIEmbedResponse(
             data=data_objects,
             model=request.model,
@@ -202,19 +284,44 @@ async def openai_embeddings(request: OpenAIEmbedRequest):
 
 # --- Admin Endpoints ---
 
-@router.post("/admin/load-model", dependencies=[Depends(verify_api_key)])
+@router.post("/admin/load-model", dependencies=[Depends(verify_api_key), Depends(single_worker_only)])
 async def load_model_admin(request: LoadModelRequest):
     """
     Admin endpoint to manually load a model into memory.
+    An alias already loaded with another model, device or quantization gets 409.
     """
     try:
-        model_manager.load_model(request.alias, request.model_name, request.device)
-        return {"status": "success", "message": f"Model {request.alias} ({request.model_name}) loaded on {request.device or 'default'}"}
+        await model_manager.load_model_async(request.alias, request.model_name, request.device, request.quantize)
+        return {
+            "status": "success",
+            "message": f"Model {request.alias} ({request.model_name}) loaded on {request.device or 'default'}",
+            "quantization": model_manager.quantization.get(request.alias),
+        }
+    except ModelConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to load model {request.alias}: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/admin/unload-model", dependencies=[Depends(verify_api_key)])
+@router.post("/admin/swap-model", dependencies=[Depends(verify_api_key), Depends(single_worker_only)])
+async def swap_model_admin(request: SwapModelRequest):
+    """
+    Admin endpoint to replace the model behind a loaded alias without downtime.
+    The old version keeps serving until the new one is loaded and warmed up.
+    """
+    try:
+        swap = await model_manager.swap_model(request.alias, request.model_name, request.device, request.quantize)
+    except Exception as e:
+        logger.error(f"Failed to swap model {request.alias} to {request.model_name}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "status": "success",
+        "message": f"Model {request.alias} now serves {request.model_name}",
+        **swap,
+        "quantization": model_manager.quantization.get(request.alias),
+    }
+
+@router.post("/admin/unload-model", dependencies=[Depends(verify_api_key), Depends(single_worker_only)])
 async def unload_model_admin(request: UnloadModelRequest):
     """
     Admin endpoint to unload a model from memory.
@@ -222,12 +329,111 @@ async def unload_model_admin(request: UnloadModelRequest):
     model_manager.unload_model(request.alias)
     return {"status": "success", "message": f"Model {request.alias} unloaded"}
 
+@router.get("/admin/models", dependencies=[Depends(verify_api_key)])
+async def models_status():
+    """
+    Admin endpoint reporting the memory budget and the resident memory and idle time per loaded model.
+    """
+    return model_manager.residency()
+
+@router.get("/admin/batching", dependencies=[Depends(verify_api_key)])
+async def batching_status():
+    """
+    Admin endpoint reporting the current batch size limit and latency per model.
+    """
+    return {"models": batch_manager.status()}
+
+@router.get("/admin/cache", dependencies=[Depends(verify_api_key)])
+async def cache_status():
+    """
+    Admin endpoint reporting in-memory cache usage, entries and evictions per model.
+    """
+    return {**cache_manager.stats(), "chunks": chunk_cache.stats(), "prewarm": prewarm_service.progress}
+
+def resolve_server_path(path: Optional[str], configured: Optional[str], setting: str) -> str:
+    """
+    Resolves a server file path from an admin request. Only files in the directory
+    of the configured path are allowed (relative paths are taken from there), so a
+    caller can't read or write anywhere else on the server.
+
+    Raises:
+        HTTPException: 400 if the setting is unset or the path resolves outside its directory.
+    """
+    if not configured:
+        raise HTTPException(status_code=400, detail=f"{setting} is not set")
+    base = os.path.dirname(os.path.realpath(configured))
+    resolved = os.path.realpath(os.path.join(base, path) if path else configured)
+    if os.path.commonpath([base, resolved]) != base:
+        raise HTTPException(status_code=400, detail=f"Path must be inside {base} (the directory of {setting})")
+    return resolved
+
+@router.post("/admin/cache/export", dependencies=[Depends(verify_master_key), Depends(single_worker_only)])
+async def export_cache_snapshot(request: CacheSnapshotRequest):
+    """
+    Admin endpoint writing the in-memory cache to a snapshot file on the server,
+    in the directory of CACHE_SNAPSHOT_PATH.
+    """
+    path = resolve_server_path(request.path, settings.cache_snapshot_path, "CACHE_SNAPSHOT_PATH")
+    try:
+        count = await asyncio.to_thread(cache_manager.export_snapshot, path)
+    except OSError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to write snapshot: {e}")
+    return {"status": "success", "path": path, "entries": count}
+
+@router.post("/admin/cache/import", dependencies=[Depends(verify_master_key), Depends(single_worker_only)])
+async def import_cache_snapshot(request: CacheSnapshotRequest):
+    """
+    Admin endpoint loading a snapshot file (in the directory of CACHE_SNAPSHOT_PATH) into the in-memory cache.
+    """
+    path = resolve_server_path(request.path, settings.cache_snapshot_path, "CACHE_SNAPSHOT_PATH")
+    try:
+        count = await asyncio.to_thread(cache_manager.import_snapshot, path)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Failed to load snapshot: {e}")
+    return {"status": "success", "path": path, "entries": count}
+
+@router.post("/admin/cache/prewarm", status_code=202, dependencies=[Depends(verify_master_key), Depends(single_worker_only)])
+async def prewarm_cache(request: PrewarmRequest):
+    """
+    Admin endpoint starting background pre-computation of a JSONL corpus in the
+    directory of PREWARM_CORPUS_PATH. Progress is reported by `GET /admin/cache`.
+    """
+    path = resolve_server_path(request.path, settings.prewarm_corpus_path, "PREWARM_CORPUS_PATH")
+    if not prewarm_service.start(path, request.model):
+        raise HTTPException(status_code=409, detail="Pre-warming is already running")
+    return {"status": "started", "path": path}
+
 @router.get("/health")
 async def health():
     """Health check endpoint."""
     return {"status": "ok"}
 
+@router.get("/load")
+async def load():
+    """
+    Load report for load balancers: in-flight requests plus queue depth and
+    estimated queue wait per model.
+    """
+    models = batch_manager.load()
+    return {
+        "inflight_requests": admission_controller.inflight,
+        "max_inflight_requests": settings.max_inflight_requests,
+        "queue_depth": sum(m["queue_depth"] for m in models.values()),
+        "estimated_wait_s": max((m["estimated_wait_s"] for m in models.values()), default=0.0),
+        "models": models,
+    }
+
 @router.get("/ready")
-async def ready():
-    """Readiness probe checking if models are loaded."""
-    return {"status": "ready", "models_loaded": list(model_manager.models.keys())}
+async def ready(response: Response):
+    """
+    Readiness probe with the load state of every model. 503 until every
+    `preload: true` model is ready, so traffic isn't routed here before then.
+    """
+    status = model_manager.readiness()
+    if status != "ready":
+        response.status_code = 503
+    return {
+        "status": status,
+        "models_loaded": list(model_manager.models.keys()),
+        "models": model_manager.states,
+    }
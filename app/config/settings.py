@@ -5,17 +5,49 @@ from pathlib import Path
 from enum import Enum
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Dict, Any, Optional, Set, Union
+from typing import Dict, Any, List, Optional, Set, Union
 
 class AuthMode(str, Enum):
     NONE = "NONE"
     KEY = "KEY"
     JWT = "JWT"
 
+class CacheVectorFormat(str, Enum):
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
+    INT8 = "int8"
+
 class ModelConfig(BaseSettings):
     name: str
     preload: bool = True
     device: Optional[str] = None
+    # Dynamic batching (defaults to the global Settings values)
+    max_batch_size: Optional[int] = None
+    max_wait_ms: Optional[float] = None
+    max_batch_tokens: Optional[int] = None
+    # Bulkhead: concurrent batches for this model (defaults to MODEL_MAX_CONCURRENCY)
+    max_concurrency: Optional[int] = None
+    # Adaptive batching: tune the batch size to keep p95 encode latency under this SLO
+    latency_slo_ms: Optional[float] = None
+    min_batch_size: Optional[int] = None
+    # Execution mode: "thread" (in-process) or "process" (one replica per worker process)
+    execution: str = "thread"
+    workers: Optional[int] = None # Worker processes in process mode (default: CPU count)
+    torch_threads: Optional[int] = None # Intra-op threads per worker process (default: 1)
+    # Inference backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime on CPU, in-process)
+    backend: str = "torch"
+    onnx_path: Optional[str] = None # Pre-exported model.onnx (default: exported to ONNX_CACHE_DIR on first load)
+    onnx_threads: Optional[int] = None # ONNX Runtime intra-op threads (default: TORCH_NUM_THREADS, else ORT default)
+    # Dynamic int8 quantization of Linear layers (CPU only): None or "int8"
+    quantize: Optional[str] = None
+    # Matryoshka models: sizes accepted for the `dimensions` request parameter
+    matryoshka_dims: Optional[List[int]] = None
+    # Warm-up before the model is marked ready (defaults to MODEL_WARMUP*)
+    warmup: Optional[bool] = None
+    warmup_batch_sizes: Optional[List[int]] = None
+    warmup_seq_lengths: Optional[List[int]] = None
+    # Residency: pinned models are never evicted for memory or unloaded when idle (default: preload)
+    pinned: Optional[bool] = None
 
 class Settings(BaseSettings):
     app_name: str = "Embedding Server"
@@ -53,14 +85,90 @@ class Settings(BaseSettings):
 
     model_config_path: str = "models.yaml"
     
+    # Fair Scheduling: relative share of encode capacity per client_id (default 1.0)
+    client_weights: Union[Dict[str, float], str] = {}
+    default_client_weight: float = 1.0
+
+    @field_validator("client_weights", mode="before")
+    @classmethod
+    def parse_client_weights(cls, v: Any) -> Dict[str, float]:
+        if isinstance(v, str):
+            if v.strip().startswith("{"):
+                try:
+                    parsed = json.loads(v)
+                    if isinstance(parsed, dict):
+                        return {str(k): float(w) for k, w in parsed.items()}
+                except (json.JSONDecodeError, ValueError):
+                    pass # Fall through to comma split
+
+            # Fallback to comma-separated pairs (e.g. "indexer=0.5,chat=4")
+            weights = {}
+            for pair in v.split(","):
+                if "=" in pair:
+                    k, w = pair.split("=", 1)
+                    weights[k.strip()] = float(w)
+            return weights
+        if isinstance(v, dict):
+            return {str(k): float(w) for k, w in v.items()}
+        return {}
+
+    
     # Cache Settings
     redis_url: Optional[str] = None
+    redis_max_connections: int = 50 # Size of the asyncio connection pool
+    # Cross-replica stampede protection: one replica computes a missing text, the others wait for it
+    cache_lease_enabled: bool = False
+    cache_lease_ttl_ms: int = 5000 # Lease expiry, so a crashed holder never blocks others for long
+    cache_lease_wait_ms: int = 2000 # How long to wait for another replica before computing locally
+    cache_lease_poll_ms: int = 50
     enable_cache: bool = True
     cache_ttl: int = 3600
+    cache_vector_format: CacheVectorFormat = CacheVectorFormat.FLOAT32 # Encoding of vectors stored in Redis
+    local_cache_max_bytes: int = 256 * 1024 * 1024 # In-memory vector cache budget (float32 vector bytes)
+    local_cache_window_ratio: float = 0.01 # Share of the budget for the admission window
+    chunk_cache_max_bytes: int = 32 * 1024 * 1024 # Chunk boundaries of recently chunked documents
+    disk_cache_path: Optional[str] = None # SQLite file for the persistent tier (disabled if unset)
+    disk_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+    cache_snapshot_path: Optional[str] = None # Loaded into memory at startup, written at shutdown
+    prewarm_corpus_path: Optional[str] = None # JSONL corpus embedded in the background at startup
+    prewarm_client_weight: float = 0.1 # Fair-scheduling weight of pre-warming vs. live clients
+    prewarm_batch_size: int = 64
     
     # Concurrency / Backpressure
-    max_inflight_requests: int = 100
+    max_inflight_requests: int = 100 # Requests beyond this are rejected with 503 (0 disables)
+    admission_max_queue_wait_s: float = 5.0 # Reject when the estimated queue wait exceeds this (0 disables)
+    
+    # Dynamic Batching (per-model overrides live in models.yaml)
+    batch_max_size: int = 32
+    batch_max_wait_ms: float = 5.0
+    # Cap on padded tokens (texts x longest text) per forward pass
+    batch_max_tokens: int = 16384
+    # p95 encode latency target for adaptive batch sizing (disabled if unset)
+    batch_latency_slo_ms: Optional[float] = None
     
+    # Inference Bulkheads
+    model_max_concurrency: int = 1 # Concurrent batches per model (overridable per model)
+    torch_num_threads: Optional[int] = None # Intra-op threads (process-wide); torch default if unset
+    onnx_cache_dir: str = "onnx_models" # Where models with backend: onnx are exported to
+    quantize_min_cosine: float = 0.98 # Warn when a quantized model's self-check falls below this
+
+    # Model Residency
+    model_memory_budget_bytes: Optional[int] = None # Total parameter memory of loaded models (unbounded if unset)
+    model_idle_ttl_s: Optional[float] = None # Unload unpinned models unused for this long (disabled if unset)
+    model_reaper_interval_s: float = 30.0 # How often idle models are checked for
+    model_load_fail_fast: bool = False # Reject requests with 503 while their model loads, instead of waiting
+    model_load_retry_after_s: int = 10 # Retry-After for a model that has never finished loading before
+    model_swap_drain_timeout_s: float = 30.0 # How long a swapped-out model may finish its queued batches
+    # Synthetic batches (every batch size x sequence length) run before a loaded model is marked ready
+    model_warmup: bool = True
+    model_warmup_batch_sizes: List[int] = [1, 8, 32]
+    model_warmup_seq_lengths: List[int] = [16, 128, 512] # In tokens, capped at the model's max_seq_length
+    
+    # Pre-fork serving: the master loads preloaded models once and forks this many
+    # server processes that share them copy-on-write (CPU models only)
+    workers: int = 1
+    worker_graceful_timeout_s: float = 30.0 # Time workers get to finish on shutdown before they are killed
+
     model_config = SettingsConfigDict(env_file=os.getenv("ENV_FILE", ".env"), protected_namespaces=('settings_',))
 
 settings = Settings()
@@ -0,0 +1,81 @@
+import math
+from contextlib import contextmanager
+from typing import Optional
+from app.config.settings import settings
+from app.core.deadline import time_left
+from app.core.metrics import ADMISSION_REJECTED
+
+class Overloaded(Exception):
+    """Raised when the server sheds load. `retry_after` is a hint in whole seconds."""
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Fail-fast admission control.
+
+    Requests are rejected up front, instead of queueing without limit, when either
+    the number of in-flight requests reaches `max_inflight_requests` or the
+    estimated queue wait for the target model exceeds `admission_max_queue_wait_s`
+    (or the time left before the request's own deadline).
+    """
+    def __init__(self):
+        self.inflight = 0
+
+    def acquire(self):
+        """
+        Takes an in-flight request slot.
+
+        Raises:
+            Overloaded: If all slots are taken.
+        """
+        limit = settings.max_inflight_requests
+        if limit and self.inflight >= limit:
+            ADMISSION_REJECTED.labels("inflight").inc()
+            raise Overloaded(f"Server busy: {self.inflight} requests in flight", retry_after=1)
+        self.inflight += 1
+
+    def release(self):
+        self.inflight = max(0, self.inflight - 1)
+
+    @contextmanager
+    def slot(self):
+        """Holds an in-flight request slot for the duration of the block."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def check_queue_wait(self, alias: str, estimated_wait: Optional[float], deadline: Optional[float] = None):
+        """
+        Rejects work whose estimated queue wait is over budget.
+
+        Args:
+            alias (str): Model alias (for error messages).
+            estimated_wait (float, optional): Seconds until newly queued work would be
+                encoded, or None if throughput hasn't been measured yet.
+            deadline (float, optional): The request's time.monotonic() deadline.
+
+        Raises:
+            Overloaded: If the estimate exceeds the budget.
+        """
+        if estimated_wait is None:
+            return
+
+        budget = settings.admission_max_queue_wait_s
+        remaining = time_left(deadline)
+        if remaining is not None:
+            # No point queueing work that can't finish before the client gives up
+            budget = min(budget, remaining) if budget else remaining
+        if not budget or estimated_wait <= budget:
+            return
+
+        ADMISSION_REJECTED.labels("queue_wait").inc()
+        raise Overloaded(
+            f"Model '{alias}' is overloaded: estimated queue wait {estimated_wait:.2f}s exceeds {budget:.2f}s",
+            retry_after=max(1, math.ceil(estimated_wait - budget)),
+        )
+
+admission_controller = AdmissionController()
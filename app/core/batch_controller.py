@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+from typing import Optional
+
+class AdaptiveBatchController:
+    """
+    AIMD controller for a model's batch size, driven by observed encode latency.
+
+    While the p95 latency of recent batches stays under `latency_slo_ms`, the batch
+    size limit grows by `increase_step` (only when batches actually fill up to the
+    limit, otherwise a bigger limit changes nothing). As soon as p95 exceeds the SLO
+    the limit is multiplied by `decrease_factor` and the window restarts, so
+    decisions are made on latencies measured at the new size.
+    """
+    def __init__(
+        self,
+        latency_slo_ms: float,
+        min_batch_size: int = 1,
+        max_batch_size: int = 32,
+        initial_batch_size: Optional[int] = None,
+        increase_step: int = 1,
+        decrease_factor: float = 0.7,
+        window: int = 32,
+        adjust_every: int = 8,
+    ):
+        self.latency_slo = latency_slo_ms / 1000.0
+        self.min_batch_size = max(1, int(min_batch_size))
+        self.max_batch_size = max(self.min_batch_size, int(max_batch_size))
+        start = initial_batch_size or max(self.min_batch_size, self.max_batch_size // 4)
+        self.batch_size = min(self.max_batch_size, max(self.min_batch_size, int(start)))
+        self.increase_step = max(1, int(increase_step))
+        self.decrease_factor = decrease_factor
+        self.adjust_every = max(1, int(adjust_every))
+        self._latencies = deque(maxlen=max(window, self.adjust_every))
+        self._since_adjust = 0
+        self._full_batches = 0
+        self._lock = threading.Lock()
+
+    def p95(self) -> Optional[float]:
+        """p95 of the latencies in the current window, in seconds."""
+        with self._lock:
+            return self._p95()
+
+    def _p95(self) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def record(self, batch_size: int, latency: float) -> int:
+        """
+        Records one encoded batch and adjusts the limit if enough samples were seen.
+
+        Args:
+            batch_size (int): Number of texts in the batch.
+            latency (float): Encode latency in seconds.
+
+        Returns:
+            int: The (possibly updated) batch size limit.
+        """
+        with self._lock:
+            self._latencies.append(latency)
+            self._since_adjust += 1
+            if batch_size >= self.batch_size:
+                self._full_batches += 1
+
+            if self._since_adjust < self.adjust_every:
+                return self.batch_size
+
+            if self._p95() > self.latency_slo:
+                # Multiplicative decrease, then measure again at the new size
+                self.batch_size = max(self.min_batch_size, int(self.batch_size * self.decrease_factor))
+                self._latencies.clear()
+            elif self._full_batches:
+                self.batch_size = min(self.max_batch_size, self.batch_size + self.increase_step)
+
+            self._since_adjust = 0
+            self._full_batches = 0
+            return self.batch_size
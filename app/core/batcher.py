@@ -0,0 +1,550 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+from app.config.settings import settings
+from app.core.model_manager import model_manager
+from app.core.batch_controller import AdaptiveBatchController
+from app.core.deadline import DeadlineExceeded, is_expired, time_left
+from app.core.admission import admission_controller, Overloaded
+from app.core.metrics import (
+    QUEUE_DEPTH, MODEL_QUEUE_DEPTH, MODEL_BUSY_WORKERS, MODEL_SATURATION,
+    BATCH_SIZE, BATCH_ENCODE_SECONDS, BATCH_SIZE_LIMIT, DEADLINE_DROPPED_TEXTS, ESTIMATED_QUEUE_WAIT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Client identity of background cache pre-warming (scheduled at PREWARM_CLIENT_WEIGHT)
+PREWARM_CLIENT_ID = "__prewarm__"
+
+class BatcherClosed(Overloaded):
+    """Raised by a batcher that was closed (model swapped or unloaded) before the texts were queued."""
+
+def client_weight(client_id: str) -> float:
+    """
+    Returns the scheduling weight for a client identity.
+
+    Weights in `settings.client_weights` may be keyed by the full identity
+    (e.g. 'client:indexer') or by the bare JWT client_id ('indexer').
+    """
+    weights = settings.client_weights
+    weight = weights.get(client_id)
+    if weight is None and client_id == PREWARM_CLIENT_ID:
+        weight = settings.prewarm_client_weight
+    if weight is None:
+        _, _, bare_id = client_id.partition(":")
+        weight = weights.get(bare_id, settings.default_client_weight)
+    return max(float(weight), 1e-3)
+
+@dataclass
+class PendingText:
+    """A single text waiting in a batcher queue, with the future its caller awaits."""
+    text: str
+    future: asyncio.Future
+    tokens: int = 0
+    client_id: str = "anonymous"
+    # Weighted fair queuing virtual finish time; lower is served first
+    finish_tag: float = 0.0
+    # Absolute time.monotonic() deadline of the request, if the caller set one
+    deadline: Optional[float] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def bucket(self) -> int:
+        """Length bucket (next power of two, minimum 16) used to group similarly sized texts."""
+        return max(16, 1 << (max(self.tokens, 1) - 1).bit_length())
+
+class DynamicBatcher:
+    """
+    Merges texts submitted concurrently for one model into shared `model.encode` calls.
+
+    Batches are formed around the oldest pending text from texts in the same
+    tokenized-length bucket, so short queries are not padded to the length of a
+    long passage. A batch is capped both by `max_batch_size` texts and by
+    `max_batch_tokens` padded tokens (texts x longest text). It is flushed as soon
+    as it is full, or once its oldest text has waited `max_wait_ms`. Each caller
+    receives only the vectors for the texts it submitted, in order.
+
+    Capacity is shared between clients with weighted fair queuing: every text gets
+    a virtual finish tag of `start + tokens / weight`, where `start` is the later of
+    the current virtual time and the client's previous finish tag. Batches are
+    anchored on the lowest tag, so a client queueing thousands of texts cannot
+    starve interactive callers.
+    """
+    def __init__(
+        self,
+        alias: str,
+        model: Any,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_batch_tokens: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 1,
+        controller: Optional[AdaptiveBatchController] = None,
+    ):
+        self.alias = alias
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_batch_tokens = int(max_batch_tokens) if max_batch_tokens else None
+        # Bulkhead: batches run on the model's own executor, at most `max_concurrency` at once
+        self.executor = executor
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.busy_workers = 0
+        # Submissions still tokenizing: not queued yet, but about to use the model
+        self.submitting = 0
+        # Length estimates run on the model's own threads too, not the loop's shared default pool
+        self.tokenize_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=f"tokenize-{alias}")
+        # Optional latency-driven tuning of the batch size limit (never above max_batch_size)
+        self.controller = controller
+        self.loop = asyncio.get_running_loop()
+        self._pending: List[PendingText] = []
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._client_depth: Dict[str, int] = {}
+        # For admission control: queued tokens and measured encode throughput per worker
+        self.pending_tokens = 0
+        self.throughput: Optional[float] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def batch_size_limit(self) -> int:
+        """Current maximum texts per batch (adaptive if a controller is attached)."""
+        if self.controller is not None:
+            return min(self.controller.batch_size, self.max_batch_size)
+        return self.max_batch_size
+
+    def estimated_wait(self, extra_tokens: int = 0) -> Optional[float]:
+        """
+        Estimated seconds until `extra_tokens` newly queued tokens would be encoded,
+        or None until throughput has been measured.
+        """
+        if not self.throughput:
+            return None
+        return (self.pending_tokens + extra_tokens) / (self.throughput * self.max_concurrency)
+
+    def client_queue_depths(self) -> Dict[str, int]:
+        """Returns the number of queued texts per client identity."""
+        return dict(self._client_depth)
+
+    async def submit(
+        self,
+        texts: List[str],
+        client_id: str = "anonymous",
+        deadline: Optional[float] = None,
+    ) -> List[List[float]]:
+        """
+        Queues texts for encoding and waits for their vectors.
+
+        Args:
+            texts (List[str]): Texts to embed.
+            client_id (str): Caller identity used for fair scheduling.
+            deadline (float, optional): time.monotonic() deadline. Texts still queued when
+                it passes are dropped before they reach the model.
+
+        Returns:
+            List[List[float]]: One vector per input text, in input order.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before the vectors are ready.
+            BatcherClosed: If the batcher was closed before the texts were queued.
+        """
+        if not texts:
+            return []
+        if self._closed:
+            raise BatcherClosed(f"Model '{self.alias}' was replaced or unloaded")
+        if is_expired(deadline):
+            DEADLINE_DROPPED_TEXTS.labels(self.alias, "admission").inc(len(texts))
+            raise DeadlineExceeded("Request deadline exceeded before queueing")
+
+        if getattr(self.model, "tokenizer", None) is not None:
+            # Tokenize off the event loop; long passages can take a while
+            self.submitting += 1
+            try:
+                token_counts = await self.loop.run_in_executor(self.tokenize_executor, self.count_tokens, texts)
+            finally:
+                self.submitting -= 1
+        else:
+            token_counts = self.count_tokens(texts)
+        if self._closed:
+            # Swapped or unloaded while tokenizing: its executor may already be shut down
+            raise BatcherClosed(f"Model '{self.alias}' was replaced or unloaded")
+
+        # Fail fast instead of queueing work that would wait longer than the budget
+        admission_controller.check_queue_wait(self.alias, self.estimated_wait(sum(token_counts)), deadline)
+
+        weight = client_weight(client_id)
+        finish = max(self._virtual_time, self._last_finish.get(client_id, 0.0))
+
+        futures = []
+        for text, tokens in zip(texts, token_counts):
+            future = self.loop.create_future()
+            finish += max(tokens, 1) / weight
+            self._pending.append(PendingText(
+                text=text, future=future, tokens=tokens, client_id=client_id,
+                finish_tag=finish, deadline=deadline,
+            ))
+            futures.append(future)
+        self._last_finish[client_id] = finish
+        self._track_depth(client_id, len(texts))
+        self.pending_tokens += sum(token_counts)
+
+        self._ensure_workers()
+        self._wakeup.set()
+        if deadline is None:
+            return await asyncio.gather(*futures)
+        try:
+            # Stop waiting at the deadline; the cancelled futures take our texts out of the queue
+            return await asyncio.wait_for(asyncio.gather(*futures), timeout=max(time_left(deadline), 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline exceeded while waiting for inference")
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Returns the number of tokens the model will see for each text (after truncation).
+        Falls back to a ~4 characters per token estimate if the model has no tokenizer.
+        """
+        max_length = getattr(self.model, "max_seq_length", None)
+        max_length = max_length if isinstance(max_length, int) else None
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is not None:
+            try:
+                # Tokens past max_seq_length are never encoded, so don't pay for them here
+                truncation = {"truncation": True, "max_length": max_length} if max_length else {"truncation": False}
+                input_ids = tokenizer(texts, add_special_tokens=True, **truncation)["input_ids"]
+                counts = [len(ids) for ids in input_ids]
+            except Exception as e:
+                logger.debug(f"Tokenizer length estimate failed for {self.alias}: {e}")
+                counts = [len(text) // 4 + 2 for text in texts]
+        else:
+            counts = [len(text) // 4 + 2 for text in texts]
+
+        if max_length:
+            counts = [min(c, max_length) for c in counts]
+        return counts
+
+    def close(self):
+        """Stops accepting new work; the worker exits once the queue is drained."""
+        self._closed = True
+        # Tokenization already running finishes; its submit then sees the batcher is closed
+        self.tokenize_executor.shutdown(wait=False)
+        self._wakeup.set()
+
+    async def wait_closed(self):
+        """Waits until a closed batcher has encoded everything it had queued."""
+        if self._workers:
+            # asyncio.wait: a caller giving up must not cancel the workers
+            await asyncio.wait(self._workers)
+
+    def _ensure_workers(self):
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.max_concurrency:
+            self._workers.append(self.loop.create_task(self._run()))
+
+    async def _run(self):
+        while True:
+            self._discard_cancelled()
+            self._drop_expired()
+
+            if not self._pending:
+                if self._closed:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Give concurrent callers a chance to join a batch that isn't full yet
+            _, full = self._plan_batch()
+            if not full and not self._closed:
+                remaining = self._pending[0].enqueued_at + self.max_wait - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            batch = self._take_batch()
+            if batch:
+                await self._encode_batch(batch)
+
+    def _track_depth(self, client_id: str, delta: int):
+        MODEL_QUEUE_DEPTH.labels(self.alias).inc(delta)
+        depth = self._client_depth.get(client_id, 0) + delta
+        if depth > 0:
+            self._client_depth[client_id] = depth
+            QUEUE_DEPTH.labels(self.alias, client_id).set(depth)
+        else:
+            # Drop idle clients so label cardinality stays bounded
+            self._client_depth.pop(client_id, None)
+            try:
+                QUEUE_DEPTH.remove(self.alias, client_id)
+            except KeyError:
+                pass
+
+    def _dequeue(self, items: List[PendingText]):
+        removed = {id(item) for item in items}
+        self._pending = [item for item in self._pending if id(item) not in removed]
+        for item in items:
+            self._track_depth(item.client_id, -1)
+        self.pending_tokens = max(0, self.pending_tokens - sum(item.tokens for item in items))
+
+    def _discard_cancelled(self):
+        # Callers that went away (e.g. client disconnected) no longer need their texts encoded
+        cancelled = [item for item in self._pending if item.future.done()]
+        if cancelled:
+            self._dequeue(cancelled)
+
+    def _drop_expired(self):
+        # Nobody will read answers past their deadline; don't spend model time on them
+        expired = [item for item in self._pending if is_expired(item.deadline)]
+        if not expired:
+            return
+        self._dequeue(expired)
+        DEADLINE_DROPPED_TEXTS.labels(self.alias, "queue").inc(len(expired))
+        for item in expired:
+            if not item.future.done():
+                item.future.set_exception(DeadlineExceeded("Request deadline exceeded in queue"))
+                item.future.exception()
+
+    def _plan_batch(self) -> Tuple[List[int], bool]:
+        """
+        Picks the pending texts for the next batch.
+
+        The pending text with the lowest finish tag anchors the batch; further
+        texts from its length bucket are added in finish-tag order until the text
+        count or padded-token budget is reached.
+
+        Returns:
+            Tuple[List[int], bool]: Indices into the pending queue, and whether the
+            batch is full (no further text could be added).
+        """
+        if not self._pending:
+            return [], False
+
+        limit = self.batch_size_limit
+        order = sorted(range(len(self._pending)), key=lambda i: self._pending[i].finish_tag)
+        anchor = self._pending[order[0]]
+        indices = [order[0]]
+        longest = anchor.tokens
+
+        for i in order[1:]:
+            if len(indices) >= limit:
+                return indices, True
+            item = self._pending[i]
+            if item.bucket != anchor.bucket:
+                continue
+            candidate_longest = max(longest, item.tokens)
+            if self.max_batch_tokens and candidate_longest * (len(indices) + 1) > self.max_batch_tokens:
+                return indices, True
+            indices.append(i)
+            longest = candidate_longest
+
+        full = len(indices) >= limit
+        if self.max_batch_tokens and longest * (len(indices) + 1) > self.max_batch_tokens:
+            full = True
+        return indices, full
+
+    def _take_batch(self) -> List[PendingText]:
+        """Removes and returns the next batch to encode from the pending queue."""
+        indices, _ = self._plan_batch()
+        batch = [self._pending[i] for i in indices]
+        self._dequeue(batch)
+
+        if batch:
+            # Virtual time follows the tag in service; clients idle since then restart from it
+            self._virtual_time = max(self._virtual_time, batch[0].finish_tag)
+            self._last_finish = {
+                client: tag for client, tag in self._last_finish.items() if tag > self._virtual_time
+            }
+        return batch
+
+    def _set_busy(self, delta: int):
+        self.busy_workers += delta
+        MODEL_BUSY_WORKERS.labels(self.alias).set(self.busy_workers)
+        MODEL_SATURATION.labels(self.alias).set(self.busy_workers / self.max_concurrency)
+
+    async def _encode_batch(self, batch: List[PendingText]):
+        texts = [item.text for item in batch]
+        self._set_busy(1)
+        started = time.perf_counter()
+        try:
+            vectors = await self.loop.run_in_executor(self.executor, self._encode, texts)
+        except Exception as e:
+            logger.error(f"Batch encode failed for {self.alias} ({len(texts)} texts): {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            self._set_busy(-1)
+
+        latency = time.perf_counter() - started
+        if latency > 0:
+            # Exponentially weighted tokens/second of a single worker
+            rate = sum(max(item.tokens, 1) for item in batch) / latency
+            self.throughput = rate if self.throughput is None else 0.8 * self.throughput + 0.2 * rate
+        BATCH_SIZE.labels(self.alias).observe(len(texts))
+        BATCH_ENCODE_SECONDS.labels(self.alias).observe(latency)
+        if self.controller is not None:
+            self.controller.record(len(texts), latency)
+        BATCH_SIZE_LIMIT.labels(self.alias).set(self.batch_size_limit)
+
+        for item, vector in zip(batch, vectors):
+            if not item.future.done():
+                item.future.set_result(vector)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        # Encode the whole batch in one forward pass instead of the library's default of 32
+        vectors = self.model.encode(texts, batch_size=len(texts))
+        if hasattr(vectors, 'tolist'):
+            return vectors.tolist()
+        return list(vectors)
+
+class BatchManager:
+    """
+    Owns one DynamicBatcher per model alias and routes encode requests to it.
+    """
+    def __init__(self):
+        self.batchers: Dict[str, DynamicBatcher] = {}
+        model_manager.in_use_checks.append(self.in_use)
+        model_manager.unload_listeners.append(self.release)
+        model_manager.retire_listeners.append(self.retire)
+
+    def in_use(self, alias: str) -> bool:
+        """True while a model has requests tokenizing, queued or running batches (it must not be unloaded)."""
+        batcher = self.batchers.get(alias)
+        return batcher is not None and (batcher.submitting > 0 or batcher.queue_depth > 0 or batcher.busy_workers > 0)
+
+    def release(self, alias: str):
+        """Drops the batcher of an unloaded model, so it no longer holds the model in memory."""
+        batcher = self.batchers.pop(alias, None)
+        if batcher is not None:
+            batcher.close()
+
+    def retire(self, alias: str) -> Awaitable[None]:
+        """
+        Detaches the batcher of a swapped-out model right away, so new requests go to
+        the new version. The returned awaitable finishes once the old batcher has
+        encoded what it already queued.
+        """
+        batcher = self.batchers.pop(alias, None)
+        if batcher is None:
+            return asyncio.sleep(0)
+        batcher.close()
+        return batcher.wait_closed()
+
+    def get_batcher(self, alias: str) -> DynamicBatcher:
+        """
+        Returns the batcher for a model, creating it (and loading the model) if needed.
+
+        Raises:
+            ValueError: If the model alias is unknown.
+        """
+        model = model_manager.get_model(alias)
+        loop = asyncio.get_running_loop()
+
+        batcher = self.batchers.get(alias)
+        if batcher is None or batcher.model is not model or batcher.loop is not loop:
+            if batcher is not None:
+                # The model was reloaded: let the old batcher finish what it already queued
+                batcher.close()
+            conf = model_manager.config.get(alias, {})
+            max_batch_size = conf.get("max_batch_size", settings.batch_max_size)
+            batcher = DynamicBatcher(
+                alias,
+                model,
+                max_batch_size=max_batch_size,
+                max_wait_ms=conf.get("max_wait_ms", settings.batch_max_wait_ms),
+                max_batch_tokens=conf.get("max_batch_tokens", settings.batch_max_tokens),
+                executor=model_manager.get_executor(alias),
+                max_concurrency=model_manager.get_max_concurrency(alias),
+                controller=self._make_controller(alias, conf, max_batch_size),
+            )
+            self.batchers[alias] = batcher
+            BATCH_SIZE_LIMIT.labels(alias).set(batcher.batch_size_limit)
+        return batcher
+
+    def _make_controller(self, alias: str, conf: Dict[str, Any], max_batch_size: int) -> Optional[AdaptiveBatchController]:
+        slo = conf.get("latency_slo_ms", settings.batch_latency_slo_ms)
+        if not slo:
+            return None
+        previous = self.batchers.get(alias)
+        return AdaptiveBatchController(
+            latency_slo_ms=slo,
+            min_batch_size=conf.get("min_batch_size", 1),
+            max_batch_size=max_batch_size,
+            # Keep what was learned if the batcher is only being recreated
+            initial_batch_size=previous.batch_size_limit if previous is not None and previous.controller else None,
+        )
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth and estimated wait per model, for load balancers."""
+        result = {}
+        for alias, batcher in self.batchers.items():
+            wait = batcher.estimated_wait()
+            ESTIMATED_QUEUE_WAIT.labels(alias).set(wait or 0.0)
+            result[alias] = {
+                "queue_depth": batcher.queue_depth,
+                "pending_tokens": batcher.pending_tokens,
+                "busy_workers": batcher.busy_workers,
+                "max_concurrency": batcher.max_concurrency,
+                "throughput_tokens_per_s": round(batcher.throughput * batcher.max_concurrency, 1) if batcher.throughput else None,
+                "estimated_wait_s": round(wait, 3) if wait is not None else 0.0,
+            }
+        return result
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Batching state per model, for the admin API."""
+        result = {}
+        for alias, batcher in self.batchers.items():
+            controller = batcher.controller
+            p95 = controller.p95() if controller is not None else None
+            result[alias] = {
+                "max_batch_size": batcher.max_batch_size,
+                "current_batch_size": batcher.batch_size_limit,
+                "adaptive": controller is not None,
+                "latency_slo_ms": controller.latency_slo * 1000 if controller is not None else None,
+                "p95_latency_ms": round(p95 * 1000, 2) if p95 is not None else None,
+                "queue_depth": batcher.queue_depth,
+                "busy_workers": batcher.busy_workers,
+                "max_concurrency": batcher.max_concurrency,
+            }
+        return result
+
+    async def encode(
+        self,
+        alias: str,
+        texts: List[str],
+        client_id: str = "anonymous",
+        deadline: Optional[float] = None,
+    ) -> List[List[float]]:
+        """
+        Encodes texts with the given model, batched together with concurrent callers.
+        Texts that reach a batcher closed by a swap or unload go to the current one.
+        """
+        for _ in range(3):
+            # Cold models load in a worker thread, once, however many requests are waiting
+            if alias not in model_manager.models:
+                remaining = time_left(deadline)
+                try:
+                    # The load itself carries on for later requests if this one gives up
+                    await asyncio.wait_for(model_manager.ensure_model(alias), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"Deadline exceeded while model '{alias}' was loading")
+            try:
+                return await self.get_batcher(alias).submit(texts, client_id=client_id, deadline=deadline)
+            except BatcherClosed as e:
+                closed = e
+        raise closed
+
+batch_manager = BatchManager()
@@ -1,70 +1,394 @@
+import asyncio
 import hashlib
-import json
 import logging
-from typing import List, Optional
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
 import redis
+import redis.asyncio as aioredis
 from app.config.settings import settings
+from app.core.local_cache import WTinyLFUCache
+from app.core.disk_cache import DiskCache
+from app.core.vector_codec import encode_vector, decode_vector, is_legacy
+from app.core.snapshot import write_snapshot, read_snapshot
+from app.core.metrics import (
+    CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, CACHE_BYTES, CACHE_ERRORS, CACHE_LOOKUP_SECONDS, CACHE_LEASES,
+)
 
 logger = logging.getLogger(__name__)
 
+class CacheHits:
+    """Texts served from each cache tier during one request."""
+    def __init__(self):
+        self.by_tier: Dict[str, int] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.by_tier.values())
+
+    def add(self, tier: str, count: int):
+        self.by_tier[tier] = self.by_tier.get(tier, 0) + count
+
+def cache_key(model: str, text: str, version: Optional[str] = None) -> str:
+    # Create a deterministic hash of model + text; the version keeps each model version's vectors apart
+    content = f"{model}@{version}:{text}" if version else f"{model}:{text}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def model_version(conf: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    What produces a model's vectors, from its models.yaml entry: the model name,
+    plus backend and quantization if not the defaults. None without a name.
+    """
+    if not conf or not conf.get("name"):
+        return None
+    parts = [conf["name"]]
+    if conf.get("backend", "torch") != "torch":
+        parts.append(conf["backend"])
+    if conf.get("quantize"):
+        parts.append(conf["quantize"])
+    return "+".join(parts)
+
+_request_cache_hits: ContextVar[Optional[CacheHits]] = ContextVar("request_cache_hits", default=None)
+
+def track_cache_hits() -> CacheHits:
+    """
+    Starts counting cache hits for the current request (task). Lookups made later
+    in the same context add to the returned object, e.g. for an X-Cache-Hits header.
+    """
+    hits = CacheHits()
+    _request_cache_hits.set(hits)
+    return hits
+
 class CacheManager:
     def __init__(self):
         self.enabled = settings.enable_cache
         self.redis_client = None
-        self.local_cache = {}  # Simple dictionary for in-memory fallback
+        self._byte_models: Dict[str, set] = {}
+        # Identifies this replica as a lease holder
+        self.replica_id = uuid.uuid4().hex
+        # In-memory tier (in front of Redis, or on its own), bounded in bytes
+        self.local_cache = WTinyLFUCache(
+            settings.local_cache_max_bytes,
+            window_ratio=settings.local_cache_window_ratio,
+            on_evict=lambda model: CACHE_EVICTIONS.labels(model, "local").inc(),
+        )
+        # Optional persistent tier behind memory and Redis
+        self.disk_cache = None
+        if self.enabled and settings.disk_cache_path:
+            self.disk_cache = DiskCache(
+                settings.disk_cache_path,
+                settings.disk_cache_max_bytes,
+                on_evict=lambda model, count: CACHE_EVICTIONS.labels(model, "disk").inc(count),
+            )
         
         if self.enabled and settings.redis_url:
             try:
-                self.redis_client = redis.from_url(settings.redis_url, decode_responses=True)
-                # Test connection
-                self.redis_client.ping()
+                # Test connection once at startup (blocking is fine here), then serve
+                # traffic through the asyncio client so lookups never block the loop
+                probe = redis.from_url(settings.redis_url)
+                probe.ping()
+                probe.close()
+                self.redis_client = aioredis.from_url(
+                    settings.redis_url,
+                    decode_responses=False,
+                    max_connections=settings.redis_max_connections,
+                )
                 logger.info("Connected to Redis cache")
             except Exception as e:
                 logger.warning(f"Failed to connect to Redis, falling back to in-memory cache: {e}")
                 self.redis_client = None
 
-    def _generate_key(self, model: str, text: str) -> str:
-        # Create a deterministic hash of model + text
-        content = f"{model}:{text}"
-        return hashlib.sha256(content.encode()).hexdigest()
+    def _generate_key(self, model: str, text: str, version: Optional[str] = None) -> str:
+        return cache_key(model, text, version)
+
+    async def get_embeddings(
+        self,
+        model: str,
+        texts: List[str],
+        version: Optional[str] = None,
+        unversioned_fallback: bool = False,
+    ) -> List[Optional[List[float]]]:
+        """
+        Looks up many texts at once: local tier first, then a single MGET to Redis,
+        then the disk tier for whatever is still missing. `version` (the model's
+        `model_version`) is part of every key, so another version's vectors never match.
+
+        With `unversioned_fallback`, texts still missing are looked up again under the
+        keys used before keys were versioned (model and text only), and hits are
+        rewritten under the versioned key. Only for the version that wrote those entries.
+
+        Returns:
+            List[Optional[List[float]]]: One entry per text, None on a miss.
+        """
+        results = await self._lookup(model, texts, version)
+        if not (unversioned_fallback and version):
+            return results
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if not missing:
+            return results
+        upgraded = {}
+        found = await self._lookup(model, [texts[i] for i in missing], None, count_misses=False)
+        for i, vector in zip(missing, found):
+            if vector is not None:
+                results[i] = vector
+                upgraded[texts[i]] = vector
+        if upgraded:
+            await self.set_embeddings(model, upgraded, version)
+        return results
 
-    def get_embedding(self, model: str, text: str) -> Optional[List[float]]:
+    async def _lookup(
+        self,
+        model: str,
+        texts: List[str],
+        version: Optional[str],
+        count_misses: bool = True,
+    ) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
         if not self.enabled:
-            return None
+            return results
 
-        key = self._generate_key(model, text)
-        
-        # Try Redis first
-        if self.redis_client:
+        remote: Dict[str, List[int]] = {}
+        started = time.perf_counter()
+        for i, text in enumerate(texts):
+            key = self._generate_key(model, text, version)
+            vector = self.local_cache.get(key)
+            if vector is not None:
+                results[i] = vector.tolist()
+            else:
+                remote.setdefault(key, []).append(i)
+        CACHE_LOOKUP_SECONDS.labels("local").observe(time.perf_counter() - started)
+        self._count(model, "local", len(texts), remote, count_misses)
+
+        if remote and self.redis_client:
+            started = time.perf_counter()
             try:
-                data = self.redis_client.get(key)
-                if data:
-                    return json.loads(data)
+                values = await self.redis_client.mget(list(remote))
             except Exception as e:
                 logger.error(f"Redis get error: {e}")
-        
-        # Try Local Cache
-        if key in self.local_cache:
-            return self.local_cache[key]
-            
-        return None
+                CACHE_ERRORS.labels("redis", "get").inc()
+            else:
+                CACHE_LOOKUP_SECONDS.labels("redis").observe(time.perf_counter() - started)
+                looked_up = sum(len(indices) for indices in remote.values())
+                legacy = self._fill(model, dict(zip(list(remote), values)), remote, results)
+                self._count(model, "redis", looked_up, remote, count_misses)
+                if legacy:
+                    # Migrate JSON entries written by older versions on first read
+                    await self._write_remote(self._encode(legacy))
 
-    def set_embedding(self, model: str, text: str, vector: List[float]):
-        if not self.enabled:
+        if remote and self.disk_cache:
+            started = time.perf_counter()
+            try:
+                values = await asyncio.to_thread(self.disk_cache.get_many, list(remote))
+            except Exception as e:
+                logger.error(f"Disk cache get error: {e}")
+                CACHE_ERRORS.labels("disk", "get").inc()
+            else:
+                CACHE_LOOKUP_SECONDS.labels("disk").observe(time.perf_counter() - started)
+                looked_up = sum(len(indices) for indices in remote.values())
+                self._fill(model, values, remote, results)
+                self._count(model, "disk", looked_up, remote, count_misses)
+
+        return results
+
+    def _count(self, model: str, tier: str, looked_up: int, still_missing: Dict[str, List[int]], count_misses: bool = True):
+        misses = sum(len(indices) for indices in still_missing.values())
+        hits = looked_up - misses
+        if hits:
+            CACHE_HITS.labels(model, tier).inc(hits)
+            request_hits = _request_cache_hits.get()
+            if request_hits is not None:
+                request_hits.add(tier, hits)
+        if misses and count_misses:
+            CACHE_MISSES.labels(model, tier).inc(misses)
+
+    def _fill(self, model: str, values: Dict[str, Any], pending: Dict[str, List[int]], results: List) -> Dict[str, Any]:
+        """
+        Decodes tier hits into `results`, copies them to the local tier and removes
+        them from `pending`. Returns the hits that were stored in the legacy format.
+        """
+        legacy = {}
+        for key, data in values.items():
+            if not data:
+                continue
+            try:
+                vector = decode_vector(data)
+            except ValueError as e:
+                logger.error(f"Unreadable cache entry {key}: {e}")
+                continue
+            if is_legacy(data):
+                legacy[key] = vector
+            # Keep a local copy for the next lookup
+            self.local_cache.put(key, model, vector)
+            for i in pending.pop(key):
+                results[i] = vector.tolist()
+        return legacy
+
+    @property
+    def leases_enabled(self) -> bool:
+        return self.enabled and settings.cache_lease_enabled and self.redis_client is not None
+
+    async def acquire_leases(self, model: str, texts: List[str], version: Optional[str] = None) -> List[str]:
+        """
+        Claims the right to compute `texts` across replicas (SET NX PX on a lease key,
+        one pipelined round trip). Texts another replica holds a lease for are left out.
+        Without Redis, with leases disabled, or on a Redis error, every text is returned.
+
+        Returns:
+            List[str]: Texts this replica should compute.
+        """
+        if not texts or not self.leases_enabled:
+            return list(texts)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for text in texts:
+                    pipe.set(f"lease:{self._generate_key(model, text, version)}", self.replica_id, nx=True, px=settings.cache_lease_ttl_ms)
+                acquired = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis lease error: {e}")
+            CACHE_ERRORS.labels("redis", "lease").inc()
+            return list(texts)
+        leased = [text for text, ok in zip(texts, acquired) if ok]
+        if leased:
+            CACHE_LEASES.labels(model, "acquired").inc(len(leased))
+        return leased
+
+    async def wait_for_shared(
+        self,
+        model: str,
+        texts: List[str],
+        timeout: float,
+        version: Optional[str] = None,
+    ) -> Dict[str, List[float]]:
+        """
+        Polls Redis for vectors another replica is computing, until all arrive or
+        `timeout` seconds pass. Vectors found are copied to the local tier.
+
+        Returns:
+            Dict[str, List[float]]: The vectors that arrived, by text.
+        """
+        found: Dict[str, List[float]] = {}
+        pending = {self._generate_key(model, text, version): text for text in texts}
+        give_up = time.monotonic() + max(timeout, 0)
+        interval = settings.cache_lease_poll_ms / 1000.0
+        while pending and self.redis_client:
+            try:
+                values = await self.redis_client.mget(list(pending))
+            except Exception as e:
+                logger.error(f"Redis get error: {e}")
+                CACHE_ERRORS.labels("redis", "get").inc()
+                break
+            for key, data in zip(list(pending), values):
+                if not data:
+                    continue
+                try:
+                    vector = decode_vector(data)
+                except ValueError:
+                    continue
+                self.local_cache.put(key, model, vector)
+                found[pending.pop(key)] = vector.tolist()
+            remaining = give_up - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            await asyncio.sleep(min(interval, remaining))
+
+        if found:
+            CACHE_LEASES.labels(model, "shared").inc(len(found))
+        if pending:
+            CACHE_LEASES.labels(model, "fallback").inc(len(pending))
+        return found
+
+    async def get_embedding(self, model: str, text: str, version: Optional[str] = None) -> Optional[List[float]]:
+        return (await self.get_embeddings(model, [text], version))[0]
+
+    async def set_embeddings(self, model: str, vectors: Dict[str, List[float]], version: Optional[str] = None):
+        """
+        Stores vectors by text: in the local tier immediately, then in Redis with one
+        pipelined round trip of SET ... EX commands, and in the disk tier.
+        """
+        if not self.enabled or not vectors:
             return
 
-        key = self._generate_key(model, text)
-        
-        # Save to Redis
+        keyed = {self._generate_key(model, text, version): vector for text, vector in vectors.items()}
+        for key, vector in keyed.items():
+            self.local_cache.put(key, model, vector)
+        self._export_bytes("local", self.local_cache.model_bytes, model)
+
+        if not self.redis_client and not self.disk_cache:
+            return
+        encoded = self._encode(keyed)
         if self.redis_client:
+            await self._write_remote(encoded)
+        if self.disk_cache:
             try:
-                self.redis_client.setex(key, settings.cache_ttl, json.dumps(vector))
+                await asyncio.to_thread(self.disk_cache.put_many, {key: (model, data) for key, data in encoded.items()})
             except Exception as e:
-                logger.error(f"Redis set error: {e}")
-        
-        # Save to Local Cache (Limit size to avoid OOM in production - rudimentary LRU could be added here)
-        if len(self.local_cache) > 10000:
-            self.local_cache.clear() # Simple wipe for MVP
-        self.local_cache[key] = vector
+                logger.error(f"Disk cache set error: {e}")
+                CACHE_ERRORS.labels("disk", "set").inc()
+            self._export_bytes("disk", self.disk_cache.model_bytes, model)
+
+    async def set_embedding(self, model: str, text: str, vector: List[float], version: Optional[str] = None):
+        await self.set_embeddings(model, {text: vector}, version)
+
+    def _encode(self, keyed: Dict[str, Any]) -> Dict[str, bytes]:
+        return {key: encode_vector(vector, settings.cache_vector_format) for key, vector in keyed.items()}
+
+    async def _write_remote(self, encoded: Dict[str, bytes]):
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, data in encoded.items():
+                    pipe.set(key, data, ex=settings.cache_ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis set error: {e}")
+            CACHE_ERRORS.labels("redis", "set").inc()
+
+    def _export_bytes(self, tier: str, model_bytes: Dict[str, int], model: str):
+        # Evictions can shrink other models too, so refresh every model seen in this tier
+        self._byte_models.setdefault(tier, set()).update(model_bytes)
+        self._byte_models[tier].add(model)
+        for name in self._byte_models[tier]:
+            CACHE_BYTES.labels(name, tier).set(model_bytes.get(name, 0))
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes the local tier to a snapshot file, hottest entries first, so a
+        smaller cache importing it keeps the most valuable ones. Blocking.
+
+        Returns:
+            int: Number of entries written.
+        """
+        entries = ((key, entry.model, entry.vector) for key, entry in self.local_cache.items_by_value())
+        count = write_snapshot(path, entries, settings.cache_vector_format)
+        logger.info(f"Exported {count} cache entries to {path}")
+        return count
+
+    def import_snapshot(self, path: str) -> int:
+        """
+        Loads a snapshot file into the local tier. Keys are the same ones live
+        traffic uses, so entries are hits right away. Blocking.
+
+        Returns:
+            int: Number of entries read.
+        """
+        count = 0
+        models = set()
+        for key, model, vector in read_snapshot(path):
+            self.local_cache.put(key, model, vector)
+            models.add(model)
+            count += 1
+        for model in models:
+            self._export_bytes("local", self.local_cache.model_bytes, model)
+        logger.info(f"Imported {count} cache entries from {path}")
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache usage per tier (local usage per model), for the admin API."""
+        return {
+            "enabled": self.enabled,
+            "redis": self.redis_client is not None,
+            "local": self.local_cache.stats(),
+            "disk": self.disk_cache.stats() if self.disk_cache else None,
+        }
 
 cache_manager = CacheManager()
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+from app.config.settings import settings
+
+# Rough per-entry overhead (key, OrderedDict slot, objects) for byte accounting
+ENTRY_OVERHEAD = 200
+
+class ChunkCache:
+    """
+    Byte-bounded LRU of chunking results, keyed by (document hash, method, size, overlap).
+
+    Chunk boundaries don't depend on the model, so one entry serves every model;
+    the vectors themselves are looked up per model in the embedding cache. When all
+    chunks are substrings of the document (always for "char", nearly always for
+    "token"), only their character offsets are stored and the chunks are sliced from
+    the resubmitted document; otherwise the chunk texts are stored.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self.used_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Union[array, List[str]], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(text: str, method: str, size: int, overlap: int) -> str:
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        return f"{digest}:{method}:{size}:{overlap}"
+
+    def get(self, text: str, method: str, size: int, overlap: int) -> Optional[List[str]]:
+        key = self._key(text, method, size, overlap)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+        stored, _ = item
+        if isinstance(stored, array):
+            return [text[stored[i]:stored[i + 1]] for i in range(0, len(stored), 2)]
+        return list(stored)
+
+    def put(self, text: str, method: str, size: int, overlap: int, chunks: List[str]):
+        if self.max_bytes <= 0:
+            return
+        stored = self._boundaries(text, chunks)
+        if stored is not None:
+            nbytes = stored.itemsize * len(stored) + ENTRY_OVERHEAD
+        else:
+            stored = list(chunks)
+            nbytes = sum(len(chunk) for chunk in chunks) + ENTRY_OVERHEAD
+        if nbytes > self.max_bytes:
+            return
+
+        key = self._key(text, method, size, overlap)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.used_bytes -= previous[1]
+            self._entries[key] = (stored, nbytes)
+            self.used_bytes += nbytes
+            while self.used_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted
+
+    @staticmethod
+    def _boundaries(text: str, chunks: List[str]) -> Optional[array]:
+        """Flat [start, end, start, end, ...] offsets, or None if a chunk isn't a substring."""
+        offsets = array("I")
+        cursor = 0
+        for chunk in chunks:
+            start = text.find(chunk, cursor) if chunk else -1
+            if start < 0:
+                return None
+            offsets.extend((start, start + len(chunk)))
+            # Overlapping chunks start before the previous one ends
+            cursor = start + 1
+        return offsets
+
+    def stats(self):
+        with self._lock:
+            return {"max_bytes": self.max_bytes, "used_bytes": self.used_bytes, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+chunk_cache = ChunkCache(settings.chunk_cache_max_bytes)
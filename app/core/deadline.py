@@ -0,0 +1,28 @@
+import time
+from typing import Optional
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its embeddings are computed."""
+
+def deadline_after(timeout: Optional[float]) -> Optional[float]:
+    """
+    Converts a relative timeout into an absolute deadline.
+
+    Args:
+        timeout (float, optional): Seconds from now, or None for no deadline.
+
+    Returns:
+        Optional[float]: Deadline on the `time.monotonic()` clock, or None.
+    """
+    if timeout is None:
+        return None
+    return time.monotonic() + timeout
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """Seconds until `deadline` (negative once passed), or None if there is no deadline."""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def is_expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
@@ -0,0 +1,160 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DiskCache:
+    """
+    Persistent embedding cache in a single SQLite file.
+
+    Values are the encoded vectors (see `vector_codec`), so the file survives
+    restarts and can live on a Docker volume. Total value bytes are kept under
+    `max_bytes`: once the limit is passed, the least recently used entries are
+    deleted down to `low_watermark` of the limit and the freed pages are returned
+    to the filesystem (incremental vacuum).
+
+    Methods are blocking; callers on the event loop run them with `asyncio.to_thread`.
+    The connection is opened lazily and per process, so forked workers never share it.
+    `on_evict(model, count)` is called after compaction for each model that lost entries.
+    """
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        low_watermark: float = 0.9,
+        on_evict: Optional[Callable[[str, int], None]] = None,
+    ):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.low_watermark = low_watermark
+        self.on_evict = on_evict
+        self.total_bytes = 0
+        self.model_bytes: Dict[str, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            # auto_vacuum must be set before the first table is created
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+            self._recount(conn)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _recount(self, conn: sqlite3.Connection):
+        self.model_bytes = dict(conn.execute("SELECT model, SUM(size) FROM embeddings GROUP BY model"))
+        self.total_bytes = sum(self.model_bytes.values())
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Returns the stored values for the keys that are present, and marks them as used."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT key, value FROM embeddings WHERE key IN ({marks})", chunk)
+                found.update((key, bytes(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+        return found
+
+    def put_many(self, items: Dict[str, Tuple[str, bytes]]):
+        """Stores `key -> (model, encoded vector)` and compacts if over the size limit."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                keys = list(items)
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    replaced = conn.execute(f"SELECT model, size FROM embeddings WHERE key IN ({marks})", chunk)
+                    for model, size in replaced:
+                        self._add_bytes(model, -size)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                    [(key, model, value, len(value), now) for key, (model, value) in items.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self._recount(conn)
+                raise
+            for model, value in items.values():
+                self._add_bytes(model, len(value))
+            if self.total_bytes > self.max_bytes:
+                self._compact(conn)
+
+    def compact(self):
+        """Evicts least recently used entries until under the low watermark."""
+        with self._lock:
+            self._compact(self._connection())
+
+    def _compact(self, conn: sqlite3.Connection):
+        target = int(self.max_bytes * self.low_watermark)
+        if self.total_bytes <= target:
+            return
+        freed = 0
+        doomed = []
+        evicted: Dict[str, int] = {}
+        for key, model, size in conn.execute("SELECT key, model, size FROM embeddings ORDER BY accessed"):
+            if self.total_bytes - freed <= target:
+                break
+            doomed.append((key,))
+            freed += size
+            evicted[model] = evicted.get(model, 0) + 1
+            self.model_bytes[model] = self.model_bytes.get(model, 0) - size
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self.total_bytes -= freed
+        conn.execute("PRAGMA incremental_vacuum")
+        logger.info(f"Disk cache compacted: evicted {len(doomed)} entries ({freed} bytes)")
+        if self.on_evict is not None:
+            for model, count in evicted.items():
+                self.on_evict(model, count)
+
+    def _add_bytes(self, model: str, size: int):
+        self.model_bytes[model] = self.model_bytes.get(model, 0) + size
+        self.total_bytes += size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "max_bytes": self.max_bytes,
+                "used_bytes": self.total_bytes,
+                "entries": entries,
+                "models": {model: {"bytes": size} for model, size in self.model_bytes.items()},
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Dict, List, Optional
+
+class ComputationAbandoned(Exception):
+    """Raised to waiters when the request computing a shared embedding went away before finishing."""
+
+class InflightRegistry:
+    """
+    Singleflight registry for embeddings that are currently being computed.
+
+    Keyed by the same (model, text) hash as the cache, so concurrent requests for
+    an uncached text wait on the first request's future instead of running their
+    own forward pass.
+    """
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def get(self, key: str) -> Optional[asyncio.Future]:
+        """Returns the future of an in-flight computation for `key`, if any."""
+        future = self._inflight.get(key)
+        if future is None or future.done() or future.get_loop() is not asyncio.get_running_loop():
+            return None
+        return future
+
+    def register(self, key: str) -> asyncio.Future:
+        """Marks `key` as being computed by the caller and returns the future waiters will share."""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    def resolve(self, key: str, vector: List[float]):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(vector)
+
+    def fail(self, key: str, error: BaseException):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+            # Waiters are optional; don't log "exception was never retrieved" if there were none
+            future.exception()
+
+inflight_registry = InflightRegistry()
@@ -0,0 +1,215 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+
+class CountMinSketch:
+    """
+    Approximate access frequencies in a fixed amount of memory.
+
+    4-bit style counters (capped at 15) in `depth` rows. After `sample_size`
+    increments every counter is halved, so old popularity fades and the cache
+    adapts when the workload shifts.
+    """
+    def __init__(self, width: int, depth: int = 4):
+        self.width = 1 << max(4, int(width - 1).bit_length())
+        self.mask = self.width - 1
+        self.depth = depth
+        self.table = np.zeros((depth, self.width), dtype=np.uint8)
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    def _indices(self, key: str):
+        return [hash((row, key)) & self.mask for row in range(self.depth)]
+
+    def increment(self, key: str):
+        for row, index in enumerate(self._indices(key)):
+            if self.table[row, index] < 15:
+                self.table[row, index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.table >>= 1
+            self.additions //= 2
+
+    def estimate(self, key: str) -> int:
+        return int(min(self.table[row, index] for row, index in enumerate(self._indices(key))))
+
+@dataclass
+class CacheEntry:
+    model: str
+    vector: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.vector.nbytes
+
+class WTinyLFUCache:
+    """
+    Byte-bounded W-TinyLFU cache for embedding vectors.
+
+    New entries land in a small LRU window. Entries leaving the window must win a
+    frequency contest (estimated by a count-min sketch) against the main cache's
+    eviction victim to be admitted, so one-off texts can't flush popular ones.
+    The main cache is a segmented LRU: entries hit again while in probation move to
+    the protected segment. Vectors are stored as float32 arrays and capacity is
+    accounted in bytes, per model. `on_evict(model)` is called for every entry
+    evicted or refused admission.
+    """
+    def __init__(
+        self,
+        max_bytes: int,
+        window_ratio: float = 0.01,
+        protected_ratio: float = 0.8,
+        avg_entry_bytes: int = 1536,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.max_bytes = max(0, int(max_bytes))
+        self.window_max = int(self.max_bytes * window_ratio)
+        self.main_max = self.max_bytes - self.window_max
+        self.protected_max = int(self.main_max * protected_ratio)
+        self.sketch = CountMinSketch(max(1024, self.max_bytes // max(1, avg_entry_bytes)))
+
+        self.window: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.probation: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.protected: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.window_bytes = 0
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+
+        self.model_bytes: Dict[str, int] = {}
+        self.model_entries: Dict[str, int] = {}
+        self.evictions: Dict[str, int] = {}
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.window) + len(self.probation) + len(self.protected)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.window or key in self.probation or key in self.protected
+
+    @property
+    def used_bytes(self) -> int:
+        return self.window_bytes + self.probation_bytes + self.protected_bytes
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Returns the cached vector (and records the access), or None."""
+        with self._lock:
+            self.sketch.increment(key)
+            if key in self.window:
+                self.window.move_to_end(key)
+                return self.window[key].vector
+            if key in self.protected:
+                self.protected.move_to_end(key)
+                return self.protected[key].vector
+            if key in self.probation:
+                entry = self.probation.pop(key)
+                self.probation_bytes -= entry.nbytes
+                self._protect(key, entry)
+                return entry.vector
+            return None
+
+    def put(self, key: str, model: str, vector: Any):
+        """Stores `vector` (converted to float32) under `key`, evicting as needed."""
+        entry = CacheEntry(model, np.asarray(vector, dtype=np.float32))
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self.window[key] = entry
+            self.window_bytes += entry.nbytes
+            self._account(entry, 1)
+            while self.window_bytes > self.window_max and self.window:
+                candidate_key, candidate = self.window.popitem(last=False)
+                self.window_bytes -= candidate.nbytes
+                self._admit(candidate_key, candidate)
+
+    def items_by_value(self):
+        """Entries from most to least valuable: protected, then probation, then window (MRU first)."""
+        with self._lock:
+            return [
+                (key, entry)
+                for segment in (self.protected, self.probation, self.window)
+                for key, entry in reversed(segment.items())
+            ]
+
+    def clear(self):
+        with self._lock:
+            for segment in (self.window, self.probation, self.protected):
+                segment.clear()
+            self.window_bytes = self.probation_bytes = self.protected_bytes = 0
+            self.model_bytes.clear()
+            self.model_entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Capacity, usage and per-model accounting."""
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "used_bytes": self.used_bytes,
+                "entries": len(self),
+                "models": {
+                    model: {
+                        "entries": self.model_entries.get(model, 0),
+                        "bytes": self.model_bytes.get(model, 0),
+                        "evictions": self.evictions.get(model, 0),
+                    }
+                    for model in set(self.model_bytes) | set(self.evictions)
+                },
+            }
+
+    def _account(self, entry: CacheEntry, sign: int):
+        self.model_bytes[entry.model] = self.model_bytes.get(entry.model, 0) + sign * entry.nbytes
+        self.model_entries[entry.model] = self.model_entries.get(entry.model, 0) + sign
+        if not self.model_entries[entry.model]:
+            del self.model_bytes[entry.model]
+            del self.model_entries[entry.model]
+
+    def _remove(self, key: str):
+        for segment, attr in ((self.window, "window_bytes"), (self.probation, "probation_bytes"), (self.protected, "protected_bytes")):
+            entry = segment.pop(key, None)
+            if entry is not None:
+                setattr(self, attr, getattr(self, attr) - entry.nbytes)
+                self._account(entry, -1)
+                return
+
+    def _evict(self, segment: "OrderedDict[str, CacheEntry]", attr: str):
+        _, entry = segment.popitem(last=False)
+        setattr(self, attr, getattr(self, attr) - entry.nbytes)
+        self._account(entry, -1)
+        self._count_eviction(entry)
+
+    def _protect(self, key: str, entry: CacheEntry):
+        self.protected[key] = entry
+        self.protected_bytes += entry.nbytes
+        # Overflow from the protected segment gets another chance in probation
+        while self.protected_bytes > self.protected_max and len(self.protected) > 1:
+            demoted_key, demoted = self.protected.popitem(last=False)
+            self.protected_bytes -= demoted.nbytes
+            self.probation[demoted_key] = demoted
+            self.probation_bytes += demoted.nbytes
+
+    def _admit(self, key: str, entry: CacheEntry):
+        if entry.nbytes > self.main_max:
+            self._reject(entry)
+            return
+        frequency = self.sketch.estimate(key)
+        while self.probation_bytes + self.protected_bytes + entry.nbytes > self.main_max:
+            segment, attr = (self.probation, "probation_bytes") if self.probation else (self.protected, "protected_bytes")
+            victim_key = next(iter(segment))
+            if frequency <= self.sketch.estimate(victim_key):
+                self._reject(entry)
+                return
+            self._evict(segment, attr)
+        self.probation[key] = entry
+        self.probation_bytes += entry.nbytes
+
+    def _reject(self, entry: CacheEntry):
+        self._account(entry, -1)
+        self._count_eviction(entry)
+
+    def _count_eviction(self, entry: CacheEntry):
+        self.evictions[entry.model] = self.evictions.get(entry.model, 0) + 1
+        if self.on_evict is not None:
+            self.on_evict(entry.model)
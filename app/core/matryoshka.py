@@ -0,0 +1,38 @@
+from typing import List, Optional
+import numpy as np
+from app.core.model_manager import model_manager
+
+def validate_dimensions(model_name: str, dimensions: Optional[int]) -> Optional[int]:
+    """
+    Checks a requested output size against the model's `matryoshka_dims` (models.yaml).
+
+    Returns:
+        Optional[int]: The requested size, or None for the model's full size.
+
+    Raises:
+        ValueError: If the model isn't Matryoshka-trained or the size isn't one it was trained for.
+    """
+    if not dimensions:
+        return None
+    supported = model_manager.config.get(model_name, {}).get("matryoshka_dims")
+    if not supported:
+        raise ValueError(f"Model '{model_name}' does not support `dimensions` (no matryoshka_dims configured)")
+    if dimensions not in supported:
+        raise ValueError(f"Model '{model_name}' supports dimensions {sorted(supported)}, got {dimensions}")
+    return dimensions
+
+def truncate(vectors: List[List[float]], dimensions: Optional[int]) -> List[List[float]]:
+    """
+    Keeps the first `dimensions` components of each vector and re-normalizes it to
+    unit length. Vectors are returned unchanged for None or the full size.
+
+    Raises:
+        ValueError: If `dimensions` is larger than the vectors.
+    """
+    if not dimensions or not vectors or dimensions == len(vectors[0]):
+        return vectors
+    if dimensions > len(vectors[0]):
+        raise ValueError(f"dimensions {dimensions} exceeds the model's size of {len(vectors[0])}")
+    truncated = np.asarray(vectors, dtype=np.float32)[:, :dimensions]
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return (truncated / np.clip(norms, 1e-12, None)).tolist()
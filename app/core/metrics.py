@@ -0,0 +1,150 @@
+"""
+Prometheus metrics for the inference pipeline.
+
+Registered on the default registry, so they are exported on `/metrics`
+alongside the HTTP metrics from the Instrumentator in `main.py`.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+QUEUE_DEPTH = Gauge(
+    "embedding_queue_depth",
+    "Texts waiting in a model's batching queue, per client.",
+    ["model", "client"],
+)
+
+COALESCED_TEXTS = Counter(
+    "embedding_coalesced_texts_total",
+    "Uncached texts served by an identical in-flight or in-request computation instead of a new forward pass.",
+    ["model"],
+)
+
+MODEL_QUEUE_DEPTH = Gauge(
+    "embedding_model_queue_depth",
+    "Texts waiting in a model's batching queue.",
+    ["model"],
+)
+
+MODEL_BUSY_WORKERS = Gauge(
+    "embedding_model_busy_workers",
+    "Batches currently running on a model's dedicated executor.",
+    ["model"],
+)
+
+MODEL_SATURATION = Gauge(
+    "embedding_model_saturation",
+    "Fraction of a model's concurrency cap (max_concurrency) in use.",
+    ["model"],
+)
+
+BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Texts per forward pass.",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+BATCH_ENCODE_SECONDS = Histogram(
+    "embedding_batch_encode_seconds",
+    "Wall time of one batched model.encode call.",
+    ["model"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+BATCH_SIZE_LIMIT = Gauge(
+    "embedding_batch_size_limit",
+    "Current batch size limit per model (tuned by the adaptive controller when latency_slo_ms is set).",
+    ["model"],
+)
+
+DEADLINE_DROPPED_TEXTS = Counter(
+    "embedding_deadline_dropped_texts_total",
+    "Texts dropped because their request deadline passed, before queueing (admission) or while queued (queue).",
+    ["model", "stage"],
+)
+
+ADMISSION_REJECTED = Counter(
+    "embedding_admission_rejected_total",
+    "Requests rejected by admission control (inflight: too many requests, queue_wait: estimated wait over budget).",
+    ["reason"],
+)
+
+ESTIMATED_QUEUE_WAIT = Gauge(
+    "embedding_estimated_queue_wait_seconds",
+    "Estimated wait for newly queued texts, from pending tokens and measured throughput.",
+    ["model"],
+)
+
+CACHE_HITS = Counter(
+    "embedding_cache_hits_total",
+    "Texts served from a cache tier (local, redis, disk).",
+    ["model", "tier"],
+)
+
+CACHE_MISSES = Counter(
+    "embedding_cache_misses_total",
+    "Texts looked up in a cache tier and not found there.",
+    ["model", "tier"],
+)
+
+CACHE_EVICTIONS = Counter(
+    "embedding_cache_evictions_total",
+    "Entries evicted from (or refused admission to) a cache tier.",
+    ["model", "tier"],
+)
+
+CACHE_BYTES = Gauge(
+    "embedding_cache_bytes",
+    "Vector bytes held in a cache tier.",
+    ["model", "tier"],
+)
+
+CACHE_ERRORS = Counter(
+    "embedding_cache_errors_total",
+    "Failed cache operations (Redis or disk errors), by tier and operation.",
+    ["tier", "operation"],
+)
+
+CACHE_LOOKUP_SECONDS = Histogram(
+    "embedding_cache_lookup_seconds",
+    "Latency of one batched lookup against a cache tier.",
+    ["tier"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+CACHE_LEASES = Counter(
+    "embedding_cache_leases_total",
+    "Cross-replica leases (acquired: computed here, shared: result of another replica, fallback: waited then computed here).",
+    ["model", "outcome"],
+)
+
+MODEL_RESIDENT_BYTES = Gauge(
+    "embedding_model_resident_bytes",
+    "Memory held by a loaded model (parameters and buffers, all replicas), measured at load.",
+    ["model"],
+)
+
+MODEL_LOAD_SECONDS = Histogram(
+    "embedding_model_load_seconds",
+    "Time to load a model, including any download and warm-up.",
+    ["model"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+MODEL_WARMUP_SECONDS = Histogram(
+    "embedding_model_warmup_seconds",
+    "Time spent running warm-up batches after a model loads, before it is marked ready.",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+
+MODEL_QUANTIZATION_COSINE = Gauge(
+    "embedding_model_quantization_cosine",
+    "Lowest cosine similarity between a quantized model's vectors and fp32 vectors in the load-time self-check.",
+    ["model"],
+)
+
+MODEL_UNLOADS = Counter(
+    "embedding_model_unloads_total",
+    "Models unloaded, by reason (budget: evicted to make room, idle: unused past the TTL, admin).",
+    ["model", "reason"],
+)
@@ -1,27 +1,96 @@
+import asyncio
 import logging
-from typing import Dict, Optional
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from sentence_transformers import SentenceTransformer
 import torch
+from app.config.settings import settings
+from app.core.admission import Overloaded
+from app.core.cache import model_version
+from app.core.metrics import MODEL_LOAD_SECONDS, MODEL_QUANTIZATION_COSINE, MODEL_RESIDENT_BYTES, MODEL_UNLOADS, MODEL_WARMUP_SECONDS
+from app.core.onnx_backend import OnnxModel
+from app.core.process_engine import ProcessPoolModel, WORKER_ENV_FLAG
+from app.core.quantization import quantize_dynamic, self_check, validate_quantize
+from app.core.residency import resident_bytes
+from app.core.warmup import warm_up, warmup_plan
 
 logger = logging.getLogger(__name__)
 
+class ModelLoading(Overloaded):
+    """Raised instead of waiting for a model that is still loading (MODEL_LOAD_FAIL_FAST)."""
+
+class ModelConflict(ValueError):
+    """Raised when loading an alias that is already loaded (or loading) with another model, device or quantization."""
+
 class ModelManager:
     """
     Manages the lifecycle of embedding models (loading, unloading, caching).
+
+    A loaded model runs warm-up batches (see `app.core.warmup`) before it is marked
+    ready, so its first real requests don't pay for lazy initialization.
+
+    `swap_model` replaces the model behind an alias without a gap: the new version
+    loads next to the old one, which drains its queued batches before it is freed.
+
+    Loaded models are kept within MODEL_MEMORY_BUDGET_BYTES: each model's memory is
+    measured when it loads, and the least recently used unpinned models are unloaded
+    to make room. Unpinned models unused for MODEL_IDLE_TTL_S are unloaded by
+    `run_reaper`. Models with queued or running batches are never unloaded.
     """
     def __init__(self):
         self.models: Dict[str, SentenceTransformer] = {}
+        # One bounded executor per loaded model, so a slow model can't take every worker thread
+        self.executors: Dict[str, ThreadPoolExecutor] = {}
+        # Measured at load and kept after unload, so a reload can make room up front
+        self.model_bytes: Dict[str, int] = {}
+        self.last_used: Dict[str, float] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self.warmup_seconds: Dict[str, float] = {}
+        # Cosine drift of quantized models against fp32, from the load-time self-check
+        self.quantization: Dict[str, Dict[str, float]] = {}
+        # Per alias: {"state": "loading" | "ready" | "failed", "since": ..., "error": ...}
+        self.states: Dict[str, Dict[str, Any]] = {}
+        # Aliases that have been ready at least once in this process
+        self._served: Set[str] = set()
+        # In-progress async loads, shared by concurrent callers
+        self._loading: Dict[str, asyncio.Future] = {}
+        # (name, device, quantize) of the model loaded or loading per alias
+        self.targets: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self._swapping: Set[str] = set()
+        # Set by the batching layer: in_use(alias) is True while a model has pending work;
+        # unload listeners drop references to an unloaded model so its memory is freed
+        self.in_use_checks: List[Callable[[str], bool]] = []
+        self.unload_listeners: List[Callable[[str], None]] = []
+        # Called when an alias's model is swapped: detach the old model at once, and return
+        # an awaitable that finishes once its queued batches have
+        self.retire_listeners: List[Callable[[str], Awaitable[None]]] = []
         # Determine default device
         self.default_device = "cuda" if torch.cuda.is_available() else "cpu"
         if torch.backends.mps.is_available():
             self.default_device = "mps"
         
+        if settings.workers > 1:
+            # Pre-fork master: OpenMP's thread pool doesn't survive fork(), so models load and
+            # warm up single-threaded here and each server worker sets its threads in after_fork
+            torch.set_num_threads(1)
+        elif settings.torch_num_threads:
+            # ATen's intra-op pool is process-wide; per-model budgets come from max_concurrency
+            torch.set_num_threads(settings.torch_num_threads)
+
         logger.info(f"ModelManager initialized. Default device: {self.default_device}")
         
         # We need to load config differently or pass it in. 
         # For now, let's lazy load config inside methods or constructor
         from app.config.settings import model_config
         self.config = model_config
+        # What models.yaml configured at startup; see reads_unversioned_keys
+        self.configured_versions = {alias: model_version(conf) for alias, conf in self.config.items()}
+        if os.environ.get(WORKER_ENV_FLAG):
+            # Inference worker processes re-import the server module; they load only their own replica
+            return
         self._load_preloaded_models()
 
     def _load_preloaded_models(self):
@@ -32,27 +101,261 @@ class ModelManager:
                 logger.info(f"Preloading model: {alias} ({conf['name']}) on {device}")
                 self.load_model(alias, device=device)
 
-    def load_model(self, alias: str, model_name: Optional[str] = None, device: Optional[str] = None) -> Optional[SentenceTransformer]:
+    def load_model(
+        self,
+        alias: str,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        quantize: Optional[str] = None,
+    ) -> Optional[SentenceTransformer]:
         """
-        Loads a model into memory.
+        Loads a model into memory. Blocks the caller: use `load_model_async` on the event loop.
 
         Args:
             alias (str): The alias/ID of the model.
             model_name (str, optional): The HuggingFace model name. Defaults to config if not provided.
             device (str, optional): The device to load the model on (cpu, cuda, mps).
+            quantize (str, optional): "int8" for dynamic quantization. Defaults to config.
 
         Returns:
             SentenceTransformer: The loaded model instance.
 
         Raises:
-            ValueError: If the model alias is not found in config and no model_name is provided.
+            ValueError: If the model alias is not found in config and no model_name is provided,
+                or the quantize mode is invalid.
+            ModelConflict: If the alias is loaded with another model, device or quantization.
             Exception: If model loading fails.
         """
         if alias in self.models:
+            self._check_target(alias, model_name, device, quantize)
             return self.models[alias]
-        
+
+        target_name, target_device, target_quantize = self._resolve(alias, model_name, device, quantize)
+        self.targets[alias] = (target_name, target_device, target_quantize)
+        # Known size from an earlier load: evict before loading, not after
+        self._make_room(alias, self.model_bytes.get(alias, 0))
+        self._set_state(alias, "loading")
+        started = time.monotonic()
+        try:
+            model = self._build(alias, target_name, target_device, target_quantize)
+            warmup_seconds = self._warm_up(alias, model)
+        except Exception as e:
+            self._load_failed(alias, target_name, e)
+            raise e
+        return self._register(alias, model, target_name, target_device, target_quantize, time.monotonic() - started, warmup_seconds)
+
+    async def load_model_async(
+        self,
+        alias: str,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        quantize: Optional[str] = None,
+    ) -> SentenceTransformer:
+        """
+        Loads a model in a worker thread, so the event loop keeps serving other requests.
+
+        Concurrent calls for the same alias share one load instead of loading it twice.
+
+        Raises:
+            ValueError: If the model alias is not found in config and no model_name is provided.
+            ModelConflict: If the alias is loaded or loading with another model, device or
+                quantization; unload or swap it instead.
+            Exception: If model loading fails.
+        """
+        if alias in self.models or alias in self._loading:
+            self._check_target(alias, model_name, device, quantize)
+        if alias in self.models:
+            return self.get_model(alias)
+        future = self._loading.get(alias) or self._start_load(alias, model_name, device, quantize)
+        # One caller giving up (deadline, disconnect) must not cancel the shared load
+        return await asyncio.shield(future)
+
+    async def ensure_model(self, alias: str) -> SentenceTransformer:
+        """
+        Returns a loaded model, loading it off the event loop if needed.
+
+        Raises:
+            ModelLoading: If MODEL_LOAD_FAIL_FAST is set and the model is not ready yet;
+                the load continues in the background.
+        """
+        if alias in self.models:
+            return self.get_model(alias)
+        if settings.model_load_fail_fast:
+            if alias not in self._loading:
+                # Unknown aliases raise here, for this caller. Load failures are recorded
+                # in the model's state; the next request retries.
+                self._start_load(alias)
+            raise ModelLoading(f"Model '{alias}' is loading", retry_after=self._expected_wait(alias))
+        return await self.load_model_async(alias)
+
+    def _start_load(
+        self,
+        alias: str,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        quantize: Optional[str] = None,
+    ) -> asyncio.Future:
+        target = self._resolve(alias, model_name, device, quantize)
+        self.targets[alias] = target
+        self._set_state(alias, "loading")
+        future = asyncio.ensure_future(self._load_in_thread(alias, *target))
+        self._loading[alias] = future
+
+        def done(future: asyncio.Future):
+            self._loading.pop(alias, None)
+            if not future.cancelled():
+                # Retrieved here so a load nobody awaits anymore doesn't log "never retrieved"
+                future.exception()
+
+        future.add_done_callback(done)
+        return future
+
+    async def _load_in_thread(
+        self,
+        alias: str,
+        target_name: str,
+        target_device: str,
+        target_quantize: Optional[str],
+    ) -> SentenceTransformer:
+        self._make_room(alias, self.model_bytes.get(alias, 0))
+        started = time.monotonic()
+        try:
+            model = await asyncio.to_thread(self._build, alias, target_name, target_device, target_quantize)
+            warmup_seconds = await asyncio.to_thread(self._warm_up, alias, model)
+        except Exception as e:
+            self._load_failed(alias, target_name, e)
+            raise
+        # Registered on the loop: unloading others notifies the (loop-bound) batchers
+        return self._register(alias, model, target_name, target_device, target_quantize, time.monotonic() - started, warmup_seconds)
+
+    async def swap_model(
+        self,
+        alias: str,
+        model_name: str,
+        device: Optional[str] = None,
+        quantize: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Replaces the model behind a loaded alias without a gap in service.
+
+        The new version is loaded and warmed up in a worker thread while the old one
+        keeps serving, then the alias is switched to it in one step. Batches already
+        queued for the old version finish on it (up to MODEL_SWAP_DRAIN_TIMEOUT_S), and
+        it is freed once they have drained. If the new version fails to load, the old
+        one stays in place.
+
+        Returns:
+            Dict[str, Any]: The previous and new version, and load and drain times.
+
+        Raises:
+            ValueError: If the alias is not loaded or is already being swapped.
+        """
+        if alias not in self.models:
+            raise ValueError(f"Model '{alias}' is not loaded; use load-model instead")
+        if alias in self._swapping:
+            raise ValueError(f"Model '{alias}' is already being swapped")
+        target_name, target_device, target_quantize = self._resolve(
+            alias, model_name, device or self.config.get(alias, {}).get("device"), quantize
+        )
+        previous = self.model_version(alias)
+
+        self._swapping.add(alias)
+        self.states[alias]["swapping_to"] = target_name
+        try:
+            # Both versions are resident until the old one drains
+            self._make_room(alias, self.model_bytes.get(alias, 0))
+            started = time.monotonic()
+            model = await asyncio.to_thread(self._build, alias, target_name, target_device, target_quantize)
+            warmup_seconds = await asyncio.to_thread(self._warm_up, alias, model)
+        except Exception as e:
+            logger.error(f"Failed to load {target_name} for {alias}; keeping {previous}: {e}")
+            raise
+        finally:
+            self._swapping.discard(alias)
+            self.states.get(alias, {}).pop("swapping_to", None)
+
+        old_model = self.models.get(alias)
+        old_executor = self.executors.get(alias)
+        self.config.setdefault(alias, {"preload": False})["name"] = target_name
+        if device:
+            self.config[alias]["device"] = target_device
+        self._register(alias, model, target_name, target_device, target_quantize, time.monotonic() - started, warmup_seconds)
+        logger.info(f"Model {alias} swapped from {previous} to {self.model_version(alias)}")
+
+        drain_started = time.monotonic()
+        if old_model is not None:
+            # Detached before any other request runs, so none reaches the old model from here on
+            drains = [asyncio.ensure_future(listener(alias)) for listener in self.retire_listeners]
+            _, busy = await asyncio.wait(drains, timeout=settings.model_swap_drain_timeout_s) if drains else (None, None)
+            if busy:
+                logger.warning(f"Old version of {alias} still busy after {settings.model_swap_drain_timeout_s}s; releasing it anyway")
+            MODEL_UNLOADS.labels(alias, "swap").inc()
+            if old_executor is not None:
+                old_executor.shutdown(wait=False)
+            if isinstance(old_model, ProcessPoolModel):
+                old_model.close()
+            del old_model
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return {
+            "previous": previous,
+            "version": self.model_version(alias),
+            "load_s": round(self.load_seconds[alias], 3),
+            "warmup_s": round(warmup_seconds, 3),
+            "drain_s": round(time.monotonic() - drain_started, 3),
+        }
+
+    def model_version(self, alias: str) -> Optional[str]:
+        """
+        What produces an alias's vectors: model name, plus backend and quantization if
+        not the defaults. Part of every cache key, so a swapped or reconfigured model
+        never gets another version's cached vectors. None for unknown aliases.
+        """
+        return model_version(self.config.get(alias))
+
+    def reads_unversioned_keys(self, alias: str) -> bool:
+        """
+        Whether cache entries written before keys were versioned may be served for an
+        alias. Those were keyed by alias and text only, so they are trusted only while
+        the alias runs the plain (default backend, unquantized) model models.yaml
+        configured at startup.
+        """
+        version = self.model_version(alias)
+        return version is not None and "+" not in version and version == self.configured_versions.get(alias)
+
+    def _check_target(
+        self,
+        alias: str,
+        model_name: Optional[str],
+        device: Optional[str],
+        quantize: Optional[str],
+    ):
+        """Raises ModelConflict if a load asks for another model, device or quantization than the alias has."""
+        loaded = self.targets.get(alias)
+        if loaded is None:
+            return
+        requested = (model_name, device, quantize.lower() if quantize else None)
+        differs = [
+            f"{field} {current!r} (requested {wanted!r})"
+            for field, wanted, current in zip(("model", "device", "quantize"), requested, loaded)
+            if wanted and wanted != current
+        ]
+        if differs:
+            raise ModelConflict(
+                f"Model '{alias}' is already loaded with " + ", ".join(differs)
+                + "; unload it first, or use swap-model to replace it without downtime"
+            )
+
+    def _resolve(
+        self,
+        alias: str,
+        model_name: Optional[str],
+        device: Optional[str],
+        quantize: Optional[str] = None,
+    ) -> Tuple[str, str, Optional[str]]:
         target_name = model_name
         target_device = device or self.default_device
+        target_quantize = quantize
 
         if not target_name:
             if alias not in self.config:
@@ -60,30 +363,140 @@ class ModelManager:
             conf = self.config[alias]
             target_name = conf["name"]
             target_device = conf.get("device", target_device)
-        
-        try:
-            logger.info(f"Loading model: {target_name} on {target_device}")
-            model = SentenceTransformer(target_name, device=target_device)
-            self.models[alias] = model
-            
-            if alias not in self.config:
-                self.config[alias] = {"name": target_name, "preload": False, "device": target_device}
-                
+            target_quantize = quantize or conf.get("quantize")
+        # Quantized kernels are CPU-only: an auto-detected GPU doesn't apply
+        if target_quantize and not device and not self.config.get(alias, {}).get("device"):
+            target_device = "cpu"
+        return target_name, target_device, validate_quantize(target_quantize, target_device)
+
+    def _build(self, alias: str, target_name: str, target_device: str, target_quantize: Optional[str] = None):
+        """Constructs the model. Thread-safe: touches no manager state."""
+        conf = self.config.get(alias, {})
+        if conf.get("backend", "torch") == "onnx":
+            if conf.get("execution") == "process":
+                raise ValueError(f"Model '{alias}': backend onnx runs in-process; tune onnx_threads instead of execution: process")
+            logger.info(f"Loading model: {target_name} with ONNX Runtime")
+            return OnnxModel(
+                target_name,
+                onnx_path=conf.get("onnx_path"),
+                intra_op_threads=conf.get("onnx_threads") or settings.torch_num_threads,
+                quantize=target_quantize,
+            )
+        logger.info(f"Loading model: {target_name} on {target_device}" + (f" ({target_quantize})" if target_quantize else ""))
+        if conf.get("execution") == "process":
+            model = ProcessPoolModel(
+                target_name,
+                device=target_device,
+                workers=conf.get("workers"),
+                max_rows=conf.get("max_batch_size") or settings.batch_max_size,
+                torch_threads=conf.get("torch_threads") or 1,
+                quantize=target_quantize,
+                warmup=warmup_plan(conf),
+            )
+            model.start()
             return model
-        except Exception as e:
-            logger.error(f"Failed to load model {target_name}: {e}")
-            raise e
+        model = SentenceTransformer(target_name, device=target_device)
+        if target_quantize:
+            quantized = quantize_dynamic(model)
+            quantized.quantization = self_check(model, quantized)
+            return quantized
+        return model
+
+    def _warm_up(self, alias: str, model) -> float:
+        """Runs the model's warm-up plan. Returns the seconds spent. Thread-safe: touches no manager state."""
+        if isinstance(model, ProcessPoolModel):
+            # Each worker process warmed its own replica before reporting ready
+            return model.warmup_seconds
+        plan = warmup_plan(self.config.get(alias, {}))
+        if not plan:
+            return 0.0
+        seconds = warm_up(model, plan, alias)
+        logger.info(f"Model {alias} warmed up with {len(plan)} batch shapes in {seconds:.2f}s")
+        return seconds
+
+    def _register(
+        self,
+        alias: str,
+        model,
+        target_name: str,
+        target_device: str,
+        target_quantize: Optional[str],
+        load_seconds: float,
+        warmup_seconds: float = 0.0,
+    ):
+        if alias not in self.config:
+            self.config[alias] = {"name": target_name, "preload": False, "device": target_device}
+        # Reloads (after an eviction) keep the model and mode chosen at runtime, and
+        # model_version reflects what is actually loaded
+        self.config[alias]["name"] = target_name
+        self.config[alias]["quantize"] = target_quantize
+        self.targets[alias] = (target_name, target_device, target_quantize)
+        self.quantization.pop(alias, None)
+        drift = getattr(model, "quantization", None)
+        if drift is not None:
+            self.quantization[alias] = drift
+            MODEL_QUANTIZATION_COSINE.labels(alias).set(drift["min_cosine"])
+            log = logger.warning if drift["min_cosine"] < settings.quantize_min_cosine else logger.info
+            log(
+                f"Model {alias} ({target_quantize}) self-check: cosine to fp32 "
+                f"min {drift['min_cosine']:.4f}, mean {drift['mean_cosine']:.4f}"
+            )
 
-    def unload_model(self, alias: str):
+        self.models[alias] = model
+        self.executors[alias] = self._new_executor(alias)
+        self.last_used[alias] = time.monotonic()
+        # Includes warm-up: it is what a request waiting for this model waits for
+        self.load_seconds[alias] = load_seconds
+        MODEL_LOAD_SECONDS.labels(alias).observe(load_seconds)
+        self.warmup_seconds[alias] = warmup_seconds
+        MODEL_WARMUP_SECONDS.labels(alias).observe(warmup_seconds)
+        self.model_bytes[alias] = resident_bytes(model)
+        MODEL_RESIDENT_BYTES.labels(alias).set(self.model_bytes[alias])
+        logger.info(f"Model {alias} loaded in {load_seconds:.1f}s, resident: {self.model_bytes[alias] / 2**20:.1f} MiB")
+        self._set_state(alias, "ready")
+        self._served.add(alias)
+        self.states[alias]["warmup_s"] = round(warmup_seconds, 3)
+        self._make_room(alias, 0)
+        return model
+
+    def _load_failed(self, alias: str, target_name: str, error: Exception):
+        logger.error(f"Failed to load model {target_name}: {error}")
+        self._set_state(alias, "failed", error)
+
+    def _set_state(self, alias: str, state: str, error: Optional[Exception] = None):
+        self.states[alias] = {"state": state, "since": time.time()}
+        if error is not None:
+            self.states[alias]["error"] = str(error)
+
+    def _expected_wait(self, alias: str) -> int:
+        """Seconds until a loading model is likely ready, from its last load time."""
+        expected = self.load_seconds.get(alias, settings.model_load_retry_after_s)
+        elapsed = time.time() - self.states.get(alias, {}).get("since", time.time())
+        return max(1, math.ceil(expected - elapsed))
+
+    def unload_model(self, alias: str, reason: str = "admin"):
         """
         Unloads a model from memory to free up resources.
 
         Args:
             alias (str): The alias of the model to unload.
+            reason (str): Why it is unloaded ("admin", "budget" or "idle"), for metrics.
         """
         if alias in self.models:
-            logger.info(f"Unloading model: {alias}")
-            del self.models[alias]
+            logger.info(f"Unloading model: {alias} ({reason})")
+            model = self.models.pop(alias)
+            self.last_used.pop(alias, None)
+            self.states.pop(alias, None)
+            MODEL_RESIDENT_BYTES.labels(alias).set(0)
+            MODEL_UNLOADS.labels(alias, reason).inc()
+            for listener in self.unload_listeners:
+                listener(alias)
+            if isinstance(model, ProcessPoolModel):
+                model.close()
+            executor = self.executors.pop(alias, None)
+            if executor is not None:
+                # Batches already running finish; the threads exit afterwards
+                executor.shutdown(wait=False)
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
         else:
@@ -101,6 +514,166 @@ class ModelManager:
         """
         if alias not in self.models:
             return self.load_model(alias)
+        self.last_used[alias] = time.monotonic()
         return self.models[alias]
 
+    def readiness(self) -> str:
+        """
+        "ready" once every `preload: true` model has been ready, "failed" if one of
+        them failed to load at startup, else "loading". Only the startup load counts:
+        a preloaded model unloaded or reloaded later loads again on demand, and making
+        the server unready would stop the traffic that reloads it.
+        """
+        states = [
+            self.states.get(alias, {}).get("state") for alias, conf in self.config.items()
+            if conf.get("preload", True) and alias not in self._served
+        ]
+        if "failed" in states:
+            return "failed"
+        return "ready" if all(state == "ready" for state in states) else "loading"
+
+    def is_pinned(self, alias: str) -> bool:
+        """Pinned models (`pinned`, default `preload` in models.yaml) stay loaded."""
+        conf = self.config.get(alias, {})
+        pinned = conf.get("pinned")
+        return bool(conf.get("preload", True) if pinned is None else pinned)
+
+    def is_in_use(self, alias: str) -> bool:
+        return any(check(alias) for check in self.in_use_checks)
+
+    @property
+    def resident_total(self) -> int:
+        return sum(self.model_bytes.get(alias, 0) for alias in self.models)
+
+    def _make_room(self, alias: str, incoming: int):
+        """Unloads least recently used, unpinned, idle models until `incoming` more bytes fit the budget."""
+        budget = settings.model_memory_budget_bytes
+        if not budget:
+            return
+        while self.resident_total + incoming > budget:
+            candidates = [
+                other for other in self.models
+                if other != alias and not self.is_pinned(other) and not self.is_in_use(other)
+            ]
+            if not candidates:
+                logger.warning(
+                    f"Model memory {(self.resident_total + incoming) / 2**20:.1f} MiB exceeds the budget "
+                    f"of {budget / 2**20:.1f} MiB; no unpinned idle model left to evict"
+                )
+                return
+            victim = min(candidates, key=lambda other: self.last_used.get(other, 0.0))
+            self.unload_model(victim, reason="budget")
+
+    def unload_idle(self, now: Optional[float] = None) -> List[str]:
+        """Unloads unpinned models not used for MODEL_IDLE_TTL_S. Returns their aliases."""
+        ttl = settings.model_idle_ttl_s
+        if not ttl:
+            return []
+        now = time.monotonic() if now is None else now
+        idle = [
+            alias for alias in self.models
+            if not self.is_pinned(alias)
+            and not self.is_in_use(alias)
+            and now - self.last_used.get(alias, now) > ttl
+        ]
+        for alias in idle:
+            self.unload_model(alias, reason="idle")
+        return idle
+
+    async def run_reaper(self):
+        """Background task: periodically unloads idle models."""
+        while True:
+            await asyncio.sleep(settings.model_reaper_interval_s)
+            try:
+                self.unload_idle()
+            except Exception as e:
+                logger.error(f"Idle model reaper failed: {e}")
+
+    def residency(self) -> Dict[str, object]:
+        """Memory budget and per-model residency, for the admin API."""
+        now = time.monotonic()
+        return {
+            "budget_bytes": settings.model_memory_budget_bytes,
+            "resident_bytes": self.resident_total,
+            "idle_ttl_s": settings.model_idle_ttl_s,
+            "models": {
+                alias: {
+                    "bytes": self.model_bytes.get(alias, 0),
+                    "pinned": self.is_pinned(alias),
+                    "version": self.model_version(alias),
+                    "quantize": self.config.get(alias, {}).get("quantize"),
+                    "quantization": self.quantization.get(alias),
+                    "load_s": round(self.load_seconds.get(alias, 0.0), 3),
+                    "warmup_s": round(self.warmup_seconds.get(alias, 0.0), 3),
+                    "idle_s": round(now - self.last_used.get(alias, now), 1),
+                }
+                for alias in self.models
+            },
+        }
+
+    def get_max_concurrency(self, alias: str) -> int:
+        """Number of batches of this model allowed to run at once (`max_concurrency` in models.yaml)."""
+        conf = self.config.get(alias, {})
+        if conf.get("max_concurrency"):
+            return max(1, int(conf["max_concurrency"]))
+        model = self.models.get(alias)
+        if isinstance(model, ProcessPoolModel):
+            # One in-flight batch per worker process
+            return model.num_workers
+        return max(1, int(settings.model_max_concurrency))
+
+    def _new_executor(self, alias: str) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=self.get_max_concurrency(alias),
+            thread_name_prefix=f"encode-{alias}",
+        )
+
+    def before_fork(self):
+        """
+        Checks that the loaded models can be shared with forked server workers (WORKERS > 1),
+        and stops the inference processes of `execution: process` models: each server
+        worker starts its own in `after_fork`, so the master's would sit idle.
+
+        Raises:
+            RuntimeError: If a model is loaded on a GPU; CUDA and MPS can't be used across fork().
+        """
+        off_cpu = [
+            f"{alias} ({model.device})" for alias, model in self.models.items()
+            if not str(getattr(model, "device", "cpu")).startswith("cpu")
+        ]
+        if off_cpu or torch.cuda.is_initialized():
+            raise RuntimeError(
+                "WORKERS > 1 shares CPU models with forked workers; run GPU models with WORKERS=1 "
+                f"(loaded off CPU: {', '.join(off_cpu) or 'CUDA initialized'})"
+            )
+        for model in self.models.values():
+            if isinstance(model, ProcessPoolModel):
+                model.close()
+
+    def after_fork(self):
+        """
+        Sets up a forked server worker: its share of the CPU threads, fresh executors,
+        and its own inference processes for `execution: process` models.
+        """
+        threads = settings.torch_num_threads or max(1, (os.cpu_count() or 1) // max(1, settings.workers))
+        torch.set_num_threads(threads)
+        # Executor threads don't survive fork(); the copied executors would wait on them forever
+        for alias in list(self.executors):
+            self.executors[alias] = self._new_executor(alias)
+        for model in self.models.values():
+            if isinstance(model, ProcessPoolModel):
+                model.start()
+        logger.info(f"Worker {os.getpid()} serving {len(self.models)} shared models with {threads} torch threads")
+
+    def get_executor(self, alias: str) -> ThreadPoolExecutor:
+        """
+        Returns the dedicated executor that runs inference for a loaded model.
+
+        Raises:
+            ValueError: If the model is not loaded.
+        """
+        if alias not in self.executors:
+            raise ValueError(f"Model '{alias}' is not loaded.")
+        return self.executors[alias]
+
 model_manager = ModelManager()
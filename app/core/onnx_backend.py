@@ -0,0 +1,211 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SentenceTransformer modules the ONNX path reproduces; anything else (Dense, ...) is rejected
+SUPPORTED_MODULES = {"Transformer", "Pooling", "Normalize"}
+# Concatenation order of SentenceTransformer's Pooling module
+POOLING_MODES = ("cls", "max", "mean", "mean_sqrt_len")
+
+def pool(token_embeddings: np.ndarray, attention_mask: np.ndarray, modes: List[str], normalize: bool) -> np.ndarray:
+    """
+    Pools token embeddings into sentence embeddings like SentenceTransformer's
+    Pooling (and Normalize) modules.
+
+    Args:
+        token_embeddings: (batch, sequence, dim) output of the transformer.
+        attention_mask: (batch, sequence) mask of real (non-padding) tokens.
+        modes: Pooling modes, concatenated in `POOLING_MODES` order.
+        normalize: Scale each vector to unit length.
+
+    Returns:
+        np.ndarray: float32 array of shape (batch, dim * len(modes)).
+    """
+    token_embeddings = token_embeddings.astype(np.float32, copy=False)
+    mask = attention_mask.astype(np.float32)[:, :, None]
+    parts = []
+    for mode in POOLING_MODES:
+        if mode not in modes:
+            continue
+        if mode == "cls":
+            parts.append(token_embeddings[:, 0])
+        elif mode == "max":
+            parts.append(np.where(mask > 0, token_embeddings, -1e9).max(axis=1))
+        else:
+            summed = (token_embeddings * mask).sum(axis=1)
+            counts = np.clip(mask.sum(axis=1), 1e-9, None)
+            parts.append(summed / (counts if mode == "mean" else np.sqrt(counts)))
+    vectors = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+    if normalize:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.clip(norms, 1e-12, None)
+    return vectors.astype(np.float32, copy=False)
+
+def pooling_modes(pooling: Any) -> List[str]:
+    """Pooling modes of a SentenceTransformer Pooling module, or ValueError if unsupported."""
+    config = pooling.get_config_dict()
+    modes = [mode for mode in POOLING_MODES if config.get(f"pooling_mode_{mode}_token" if mode == "cls" else f"pooling_mode_{mode}_tokens")]
+    unsupported = [key for key in ("pooling_mode_weightedmean_tokens", "pooling_mode_lasttoken") if config.get(key)]
+    if unsupported or not modes:
+        raise ValueError(f"Pooling {pooling.get_pooling_mode_str()} is not supported by the ONNX backend")
+    return modes
+
+def default_onnx_path(model_name: str) -> str:
+    from app.config.settings import settings
+    return os.path.join(settings.onnx_cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name), "model.onnx")
+
+class OnnxModel:
+    """
+    Runs a sentence-transformers model with ONNX Runtime on CPU.
+
+    Drop-in for SentenceTransformer in the batching path (`encode`, `tokenizer`,
+    `max_seq_length`). The transformer is exported to ONNX on first use (or loaded
+    from `onnx_path`); tokenization stays with the Hugging Face tokenizer, and
+    pooling and normalization are done in numpy to match the torch path exactly.
+    With `quantize="int8"` the exported graph is dynamically quantized once (saved
+    next to it as `model.int8.onnx`) and checked against the fp32 torch model.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        onnx_path: Optional[str] = None,
+        intra_op_threads: Optional[int] = None,
+        quantize: Optional[str] = None,
+    ):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("backend: onnx requires onnxruntime (pip install -r requirements-onnx.txt, or the Docker image built with WITH_ONNX=true)") from e
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.onnx_path = onnx_path or default_onnx_path(model_name)
+
+        # The torch model supplies the tokenizer, pooling config and (once) the export
+        source = SentenceTransformer(model_name, device="cpu")
+        kinds = [type(module).__name__ for module in source]
+        if set(kinds) - SUPPORTED_MODULES or kinds[0] != "Transformer":
+            raise ValueError(f"Model {model_name} has modules {kinds}; the ONNX backend supports {sorted(SUPPORTED_MODULES)}")
+        self.tokenizer = source.tokenizer
+        self.do_lower_case = source[0].do_lower_case
+        self.max_seq_length = source.max_seq_length
+        self.dim = source.get_sentence_embedding_dimension()
+        self.modes = pooling_modes(source[kinds.index("Pooling")]) if "Pooling" in kinds else ["mean"]
+        self.normalize = "Normalize" in kinds
+        if not os.path.exists(self.onnx_path):
+            self._export(source)
+        self.session_path = self.onnx_path
+        self.quantization: Optional[Dict[str, float]] = None
+        reference = None
+        if quantize:
+            from app.core.quantization import SELF_CHECK_TEXTS
+            self.session_path = self._quantize(quantize)
+            reference = source.encode(SELF_CHECK_TEXTS, batch_size=len(SELF_CHECK_TEXTS))
+        del source
+
+        self.intra_op_threads = intra_op_threads
+        self._open_session()
+        if reference is not None:
+            from app.core.quantization import SELF_CHECK_TEXTS, cosine_drift
+            self.quantization = cosine_drift(reference, self.encode(SELF_CHECK_TEXTS))
+
+    def _open_session(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.intra_op_threads:
+            options.intra_op_num_threads = int(self.intra_op_threads)
+        self.session = ort.InferenceSession(self.session_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        # The session's thread pool doesn't survive fork(): forked server workers open their own
+        self._pid = os.getpid()
+        logger.info(f"ONNX Runtime session for {self.model_name} from {self.session_path} (inputs: {self.input_names})")
+
+    @property
+    def resident_bytes(self) -> int:
+        """Approximated by the size of the ONNX weights, which the session holds in memory."""
+        paths = [self.session_path, f"{self.session_path}.data"]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def _export(self, source: Any):
+        import torch
+
+        transformer = source[0].auto_model.eval()
+        features = source.tokenize(["export"])
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in features]
+
+        class TokenEmbeddings(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(names, inputs)))[0]
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.onnx_path)), exist_ok=True)
+        tmp_path = f"{self.onnx_path}.tmp"
+        logger.info(f"Exporting {self.model_name} to ONNX at {self.onnx_path}")
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(transformer),
+                tuple(features[name] for name in names),
+                tmp_path,
+                input_names=names,
+                output_names=["token_embeddings"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["token_embeddings"]},
+                opset_version=17,
+                dynamo=False,
+            )
+        os.replace(tmp_path, self.onnx_path)
+
+    def _quantize(self, quantize: str) -> str:
+        """Dynamically quantizes the exported graph's weights to int8 (once). Returns its path."""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        path = re.sub(r"\.onnx$", "", self.onnx_path) + f".{quantize}.onnx"
+        if not os.path.exists(path):
+            logger.info(f"Quantizing {self.onnx_path} to {path}")
+            tmp_path = f"{path}.tmp"
+            quantize_dynamic(self.onnx_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, path)
+        return path
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self.dim
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        """
+        Encodes texts in one session run per `batch_size` texts.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dim).
+        """
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._pid != os.getpid():
+            self._open_session()
+        # Same preprocessing as SentenceTransformer's Transformer.tokenize
+        texts = [text.strip() for text in texts]
+        if self.do_lower_case:
+            texts = [text.lower() for text in texts]
+        batch_size = batch_size or len(texts)
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            features = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds: Dict[str, np.ndarray] = {name: features[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            parts.append(pool(token_embeddings, features["attention_mask"], self.modes, self.normalize))
+        return parts[0] if len(parts) == 1 else np.vstack(parts)
@@ -0,0 +1,132 @@
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Binds a listening TCP socket that forked workers inherit and accept on."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def freeze_heap():
+    """
+    Moves every object allocated so far into the garbage collector's permanent
+    generation. Collections in the workers then never write to those objects'
+    headers, so the pages holding the master's heap (models included) stay
+    shared copy-on-write instead of being copied into each worker.
+    """
+    gc.collect()
+    gc.freeze()
+
+class PreforkServer:
+    """
+    Forks `workers` processes from a master that has already loaded its models,
+    and keeps that many running.
+
+    Each worker runs `target(index)`; when it returns the worker exits. A worker
+    that exits on its own is forked again from the master, so it starts with the
+    master's (shared) models instead of loading them. SIGTERM or SIGINT to the
+    master is forwarded to the workers, which get `graceful_timeout_s` to finish
+    before they are killed.
+    """
+    def __init__(
+        self,
+        workers: int,
+        target: Callable[[int], None],
+        graceful_timeout_s: float = 30.0,
+        restart_delay_s: float = 1.0,
+    ):
+        self.workers = max(1, int(workers))
+        self.target = target
+        self.graceful_timeout_s = graceful_timeout_s
+        self.restart_delay_s = restart_delay_s
+        self.children: Dict[int, int] = {} # pid -> worker index
+        self.stopping = False
+        self._kill_at: Optional[float] = None
+
+    def run(self):
+        """Forks the workers and supervises them until they have all exited after `stop`."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(f"Pre-fork master {os.getpid()} starting {self.workers} workers")
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while self.children:
+            exited = self._reap()
+            if not exited:
+                if self._kill_at is not None and time.monotonic() > self._kill_at:
+                    logger.warning(f"Killing {len(self.children)} workers still running after {self.graceful_timeout_s}s")
+                    self._signal_children(signal.SIGKILL)
+                    self._kill_at = None
+                time.sleep(0.1)
+                continue
+            for pid, status in exited:
+                index = self.children.pop(pid)
+                if self.stopping:
+                    continue
+                logger.warning(f"Worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}; restarting it")
+                time.sleep(self.restart_delay_s)
+                if not self.stopping:
+                    self._spawn(index)
+        logger.info("Pre-fork master stopped")
+
+    def _reap(self) -> List[Tuple[int, int]]:
+        """
+        (pid, wait status) of the workers that have exited. Waits on each worker's
+        pid, so other children of the master are never reaped here.
+        """
+        exited = []
+        for pid in list(self.children):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                # Already reaped elsewhere
+                done, status = pid, 0
+            if done:
+                exited.append((pid, status))
+        return exited
+
+    def stop(self, signum: int = signal.SIGTERM, frame=None):
+        if self.stopping:
+            return
+        logger.info(f"Stopping {len(self.children)} workers")
+        self.stopping = True
+        self._kill_at = time.monotonic() + self.graceful_timeout_s
+        self._signal_children(signal.SIGTERM)
+
+    def _signal_children(self, signum: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # The master's handlers (and its view of the children) don't apply here
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.children = {}
+                self.target(index)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+                code = 1
+            finally:
+                # Skip the master's atexit handlers and finalizers
+                os._exit(code)
+        self.children[pid] = index
+        logger.info(f"Started worker {index} (pid {pid})")
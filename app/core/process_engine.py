@@ -0,0 +1,257 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set in the environment of worker processes. The spawn start method re-imports the
+# parent's __main__ module, so ModelManager checks this to skip preloading there.
+WORKER_ENV_FLAG = "EMBEDDING_SERVER_INFERENCE_WORKER"
+
+def _worker_main(
+    conn,
+    model_name: str,
+    device: str,
+    torch_threads: int,
+    quantize: Optional[str] = None,
+    warmup: Optional[List[Tuple[int, int]]] = None,
+):
+    """Entry point of an inference worker process: holds one model replica and serves encode calls."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(torch_threads)
+    shm = None
+    out = None
+    try:
+        model = SentenceTransformer(model_name, device=device)
+        from app.core.residency import parameter_bytes
+        drift = None
+        if quantize:
+            from app.core.quantization import quantize_dynamic, self_check
+            quantized = quantize_dynamic(model)
+            drift = self_check(model, quantized)
+            model = quantized
+        warmup_seconds = 0.0
+        if warmup:
+            from app.core.warmup import warm_up
+            warmup_seconds = warm_up(model, warmup, model_name)
+        conn.send(("ready", model.get_sentence_embedding_dimension(), model.max_seq_length, parameter_bytes(model), drift, warmup_seconds))
+
+        command, shm_name, max_rows = conn.recv()
+        shm = shared_memory.SharedMemory(name=shm_name)
+        dim = model.get_sentence_embedding_dimension()
+        out = np.ndarray((max_rows, dim), dtype=np.float32, buffer=shm.buf)
+
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            texts = message[1]
+            try:
+                vectors = model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+                out[:len(texts)] = vectors
+                conn.send(("ok", len(texts)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception as e:
+        try:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        except Exception:
+            pass
+    finally:
+        if shm is not None:
+            # Release the buffer view before closing the mapping
+            out = None
+            shm.close()
+
+class _Worker:
+    def __init__(self, process, conn, shm):
+        self.process = process
+        self.conn = conn
+        self.shm = shm
+
+class ProcessPoolModel:
+    """
+    Runs a model in N worker processes, each holding its own replica.
+
+    Drop-in for SentenceTransformer in the batching path (`encode`, `tokenizer`,
+    `max_seq_length`). Texts are sent to an idle worker over a pipe; vectors come
+    back through a float32 shared-memory buffer preallocated per worker, so results
+    are never pickled. Each worker gets its own torch thread budget, which sidesteps
+    GIL and intra-op pool contention within a single process.
+    """
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cpu",
+        workers: Optional[int] = None,
+        max_rows: int = 32,
+        torch_threads: int = 1,
+        quantize: Optional[str] = None,
+        warmup: Optional[List[Tuple[int, int]]] = None,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.num_workers = max(1, int(workers or os.cpu_count() or 1))
+        self.max_rows = max(1, int(max_rows))
+        self.torch_threads = max(1, int(torch_threads))
+        self.quantize = quantize
+        self.warmup = warmup # Shapes each worker (including replacements) runs before it takes work
+        self.warmup_seconds = 0.0 # Slowest worker's warm-up
+        self.quantization: Optional[Dict[str, float]] = None # Self-check of the first worker
+        self.dim: Optional[int] = None
+        self.replica_bytes = 0 # Parameter bytes of one worker's replica
+        self.max_seq_length: Optional[int] = None
+        self.tokenizer: Any = None
+        self._workers: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._closed = False
+
+        try:
+            from transformers import AutoTokenizer
+            # Only used to estimate sequence lengths for batch formation
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        except Exception as e:
+            logger.warning(f"No tokenizer for {model_name} in parent process, using length estimates: {e}")
+
+    def start(self):
+        """Spawns the worker processes and waits until every replica is loaded."""
+        with self._lock:
+            if self._pid == os.getpid() and self._workers:
+                return
+            # After a fork the parent's workers, pipes and buffers belong to the parent
+            self._workers = []
+            self._idle = queue.Queue()
+            self._pid = os.getpid()
+            self._closed = False
+
+            logger.info(f"Starting {self.num_workers} inference processes for {self.model_name}")
+            for _ in range(self.num_workers):
+                worker = self._spawn_worker()
+                self._workers.append(worker)
+                self._idle.put(worker)
+
+    def _spawn_worker(self) -> _Worker:
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        previous = os.environ.get(WORKER_ENV_FLAG)
+        os.environ[WORKER_ENV_FLAG] = "1"
+        try:
+            process = ctx.Process(
+                target=_worker_main,
+                args=(child_conn, self.model_name, self.device, self.torch_threads, self.quantize, self.warmup),
+                daemon=True,
+            )
+            process.start()
+        finally:
+            if previous is None:
+                os.environ.pop(WORKER_ENV_FLAG, None)
+            else:
+                os.environ[WORKER_ENV_FLAG] = previous
+        child_conn.close()
+
+        status, *info = parent_conn.recv()
+        if status != "ready":
+            process.join(timeout=5)
+            raise RuntimeError(f"Inference worker for {self.model_name} failed to start: {info[0]}")
+
+        self.dim, self.max_seq_length, self.replica_bytes, drift, warmup_seconds = info
+        self.quantization = self.quantization or drift
+        self.warmup_seconds = max(self.warmup_seconds, warmup_seconds)
+        shm = shared_memory.SharedMemory(create=True, size=self.max_rows * self.dim * 4)
+        parent_conn.send(("attach", shm.name, self.max_rows))
+        return _Worker(process, parent_conn, shm)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Model replicas plus shared-memory result buffers across all worker processes."""
+        buffers = self.max_rows * (self.dim or 0) * 4
+        return len(self._workers) * (self.replica_bytes + buffers)
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        return self.dim
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        """
+        Encodes texts on the next idle worker process. Blocks the calling thread.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dim).
+
+        Raises:
+            RuntimeError: If the pool was closed (the model was unloaded); only `start` reopens it.
+        """
+        if self._closed:
+            raise RuntimeError(f"Inference processes for {self.model_name} were stopped")
+        if self._pid != os.getpid():
+            # A forked copy: this process starts its own workers
+            self.start()
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        worker = self._idle.get()
+        try:
+            parts = []
+            for start in range(0, len(texts), self.max_rows):
+                chunk = texts[start:start + self.max_rows]
+                worker.conn.send(("encode", chunk))
+                status, result = worker.conn.recv()
+                if status != "ok":
+                    raise RuntimeError(f"Inference worker error: {result}")
+                view = np.ndarray((self.max_rows, self.dim), dtype=np.float32, buffer=worker.shm.buf)
+                # Copy out before the buffer is reused for the next chunk
+                parts.append(view[:result].copy())
+                del view
+            return parts[0] if len(parts) == 1 else np.vstack(parts)
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            logger.error(f"Inference worker for {self.model_name} died: {e}")
+            worker = self._replace(worker)
+            raise RuntimeError(f"Inference worker for {self.model_name} died") from e
+        finally:
+            self._idle.put(worker)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        self._stop_worker(worker)
+        replacement = self._spawn_worker()
+        with self._lock:
+            self._workers = [replacement if w is worker else w for w in self._workers]
+        return replacement
+
+    def _stop_worker(self, worker: _Worker):
+        try:
+            worker.conn.send(("stop",))
+        except Exception:
+            pass
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.conn.close()
+        worker.shm.close()
+        try:
+            worker.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Stops the worker processes and frees their shared-memory buffers."""
+        with self._lock:
+            self._closed = True
+            if self._pid != os.getpid():
+                # Forked copy: the workers belong to another process
+                self._workers = []
+                return
+            for worker in self._workers:
+                self._stop_worker(worker)
+            self._workers = []
+            self._idle = queue.Queue()
+            self._pid = None
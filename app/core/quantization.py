@@ -0,0 +1,58 @@
+import logging
+from typing import Any, Dict, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZE_MODES = ("int8",)
+
+# Encoded by the fp32 and the quantized model when a quantized model loads
+SELF_CHECK_TEXTS = [
+    "What is the capital of France?",
+    "Paris is the capital and most populous city of France.",
+    "def fibonacci(n): return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)",
+    "The patient was prescribed 20mg of atorvastatin once daily.",
+    "Quarterly revenue grew 12% year over year, driven by subscriptions.",
+    "ok",
+    "Ein kurzer deutscher Satz über das Wetter in Berlin.",
+    "Embeddings map text to vectors so that similar meanings end up close together, "
+    "which makes semantic search, clustering and retrieval-augmented generation possible.",
+]
+
+def validate_quantize(quantize: Optional[str], device: Optional[str] = None) -> Optional[str]:
+    """
+    Checks a `quantize` setting. Returns it normalized (None when off).
+
+    Raises:
+        ValueError: On an unknown mode, or int8 on a non-CPU device.
+    """
+    if not quantize:
+        return None
+    quantize = str(quantize).lower()
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantize mode '{quantize}' (supported: {', '.join(QUANTIZE_MODES)})")
+    if device and device != "cpu":
+        raise ValueError(f"quantize: {quantize} runs on CPU only (device: {device})")
+    return quantize
+
+def quantize_dynamic(model: Any) -> Any:
+    """
+    Returns a copy of a torch model with its Linear layers dynamically quantized
+    to int8: weights are stored as int8, activations are quantized per batch.
+    """
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=False)
+
+def cosine_drift(reference: np.ndarray, vectors: np.ndarray) -> Dict[str, float]:
+    """Minimum and mean cosine similarity between matching rows of two embedding matrices."""
+    reference = np.asarray(reference, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+    cosines = (reference * vectors).sum(axis=1) / np.clip(norms, 1e-12, None)
+    return {"min_cosine": round(float(cosines.min()), 6), "mean_cosine": round(float(cosines.mean()), 6)}
+
+def self_check(reference_model: Any, quantized_model: Any) -> Dict[str, float]:
+    """Encodes SELF_CHECK_TEXTS with both models and reports the cosine drift."""
+    reference = reference_model.encode(SELF_CHECK_TEXTS, batch_size=len(SELF_CHECK_TEXTS))
+    vectors = quantized_model.encode(SELF_CHECK_TEXTS, batch_size=len(SELF_CHECK_TEXTS))
+    return cosine_drift(reference, vectors)
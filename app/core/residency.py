@@ -0,0 +1,34 @@
+from typing import Any
+
+def parameter_bytes(module: Any) -> int:
+    """
+    Bytes held by a torch module's parameters and buffers (tied weights counted once).
+
+    This is the model's resident footprint excluding activations, which are
+    transient and bounded by the batch limits.
+    """
+    if not hasattr(module, "parameters"):
+        return 0
+    seen = set()
+    total = 0
+    tensors = list(module.parameters())
+    if hasattr(module, "buffers"):
+        tensors += list(module.buffers())
+    if hasattr(module, "modules"):
+        # Dynamically quantized layers keep their int8 weights in packed params, not parameters
+        for layer in module.modules():
+            if hasattr(layer, "_weight_bias"):
+                tensors += [tensor for tensor in layer._weight_bias() if tensor is not None]
+    for tensor in tensors:
+        pointer = tensor.data_ptr()
+        if pointer in seen:
+            continue
+        seen.add(pointer)
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+def resident_bytes(model: Any) -> int:
+    """Memory held by a loaded model: its own accounting if it has one, else its parameters."""
+    if hasattr(model, "resident_bytes"):
+        return int(model.resident_bytes)
+    return parameter_bytes(model)
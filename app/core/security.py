@@ -1,7 +1,8 @@
+import hashlib
 from datetime import datetime, timedelta
 from typing import Optional, Union, Any
 from jose import jwt
-from app.config.settings import settings
+from app.config.settings import settings, AuthMode
 
 def create_access_token(subject: Union[str, Any], client_id: str, expires_delta: Optional[timedelta] = None) -> str:
     if expires_delta:
@@ -20,3 +21,41 @@ def decode_access_token(token: str) -> Optional[dict]:
         return payload
     except jwt.JWTError:
         return None
+
+def resolve_client_identity(
+    api_key: Optional[str] = None,
+    authorization: Optional[str] = None,
+    remote_addr: Optional[str] = None,
+) -> str:
+    """
+    Derives a stable identity for a caller (Token > API Key > IP).
+    Used as the key for rate limiting and fair scheduling of inference capacity.
+
+    Returns: 'master_key', 'client:<id>', 'user:<sub>', 'apikey:<hash>' or the remote address.
+    """
+    client_id = remote_addr or "unknown"
+
+    bearer = None
+    if authorization and authorization.startswith("Bearer "):
+        bearer = authorization.split(" ")[1]
+
+    # 1. Check Master Key (Highest Priority)
+    if (api_key and api_key == settings.api_key) or (bearer and bearer == settings.api_key):
+        return "master_key"
+
+    # 2. Mode Specific
+    if settings.auth_mode == AuthMode.JWT:
+        if bearer:
+            payload = decode_access_token(bearer)
+            if payload:
+                if "client_id" in payload:
+                    client_id = f"client:{payload['client_id']}"
+                elif "sub" in payload:
+                    client_id = f"user:{payload['sub']}"
+
+    elif settings.auth_mode == AuthMode.KEY:
+        if api_key:
+            # Never expose raw keys (identities end up in metrics labels)
+            client_id = f"apikey:{hashlib.sha256(api_key.encode()).hexdigest()[:12]}"
+
+    return client_id
@@ -0,0 +1,71 @@
+import os
+import struct
+from typing import Iterable, Iterator, Tuple
+import numpy as np
+from app.core.vector_codec import encode_vector, decode_vector
+
+# File header: magic, format version. Each record: sha256 cache key (raw digest),
+# model name length, encoded vector length; followed by the model name and the
+# vector in the binary cache format.
+SNAPSHOT_MAGIC = b"EVSNAP"
+SNAPSHOT_VERSION = 1
+FILE_HEADER = struct.Struct("<6sB")
+RECORD = struct.Struct("<32sHI")
+
+def write_snapshot(path: str, entries: Iterable[Tuple[str, str, np.ndarray]], dtype: str = "float32") -> int:
+    """
+    Writes `(key, model, vector)` entries to a snapshot file. The file is written
+    next to `path` and renamed into place, so a crash never leaves a torn snapshot.
+
+    Returns:
+        int: Number of entries written.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Per process: pre-forked workers may each export on shutdown; the last rename wins
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(FILE_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+            for key, model, vector in entries:
+                name = model.encode()
+                value = encode_vector(vector, dtype)
+                f.write(RECORD.pack(bytes.fromhex(key), len(name), len(value)))
+                f.write(name)
+                f.write(value)
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+def read_snapshot(path: str) -> Iterator[Tuple[str, str, np.ndarray]]:
+    """
+    Yields `(key, model, vector)` entries from a snapshot file, in file order.
+
+    Raises:
+        ValueError: If the file is not a snapshot or is truncated.
+    """
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a cache snapshot")
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a cache snapshot (magic={magic!r}, version={version})")
+
+        while True:
+            record = f.read(RECORD.size)
+            if not record:
+                return
+            if len(record) < RECORD.size:
+                raise ValueError(f"Truncated cache snapshot: {path}")
+            digest, name_length, value_length = RECORD.unpack(record)
+            name = f.read(name_length)
+            value = f.read(value_length)
+            if len(name) < name_length or len(value) < value_length:
+                raise ValueError(f"Truncated cache snapshot: {path}")
+            yield digest.hex(), name.decode(), decode_vector(value)
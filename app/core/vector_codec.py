@@ -0,0 +1,78 @@
+import json
+import struct
+from typing import Any
+import numpy as np
+
+# Header: magic, format version, dtype code, dimensions (little-endian)
+MAGIC = b"EV"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+SCALE = struct.Struct("<f")
+
+DTYPE_CODES = {"float32": 1, "float16": 2, "int8": 3}
+CODE_DTYPES = {code: name for name, code in DTYPE_CODES.items()}
+
+def encode_vector(vector: Any, dtype: str = "float32") -> bytes:
+    """
+    Serializes a vector into the versioned binary cache format.
+
+    Args:
+        vector: Sequence of floats or numpy array.
+        dtype (str): "float32" (lossless for model output), "float16" (half the size)
+            or "int8" (a quarter of the size, symmetric quantization with one scale).
+
+    Returns:
+        bytes: Header followed by the payload.
+    """
+    dtype = getattr(dtype, "value", dtype)
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported cache vector format: {dtype}")
+    array = np.asarray(vector, dtype=np.float32).ravel()
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype], array.size)
+
+    if dtype == "float32":
+        return header + array.astype("<f4").tobytes()
+    if dtype == "float16":
+        return header + array.astype("<f2").tobytes()
+
+    peak = float(np.abs(array).max()) if array.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    quantized = np.clip(np.rint(array / scale), -127, 127).astype(np.int8)
+    return header + SCALE.pack(scale) + quantized.tobytes()
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """
+    Parses a cached vector. Legacy JSON entries (written before the binary format)
+    are still accepted so existing Redis data stays readable during migration.
+
+    Returns:
+        np.ndarray: float32 vector.
+
+    Raises:
+        ValueError: If the data is neither format.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if data[:1] == b"[":
+        return np.asarray(json.loads(data), dtype=np.float32)
+
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated cache entry")
+    magic, version, code, dims = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or code not in CODE_DTYPES:
+        raise ValueError(f"Unknown cache entry format (magic={magic!r}, version={version}, dtype={code})")
+
+    payload = memoryview(data)[HEADER.size:]
+    dtype = CODE_DTYPES[code]
+    if dtype == "float32":
+        array = np.frombuffer(payload, dtype="<f4", count=dims)
+    elif dtype == "float16":
+        array = np.frombuffer(payload, dtype="<f2", count=dims)
+    else:
+        (scale,) = SCALE.unpack_from(payload)
+        array = np.frombuffer(payload[SCALE.size:], dtype=np.int8, count=dims) * np.float32(scale)
+    return array.astype(np.float32)
+
+def is_legacy(data: bytes) -> bool:
+    """True for entries in the old JSON format."""
+    return data[:1] in (b"[", "[")
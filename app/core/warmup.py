@@ -0,0 +1,49 @@
+import logging
+import time
+from typing import Any, Dict, List, Tuple
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# A word that is a single token in common vocabularies, so N words ≈ N tokens
+WARMUP_WORD = "the"
+
+def warmup_plan(conf: Dict[str, Any]) -> List[Tuple[int, int]]:
+    """
+    (batch size, sequence length) shapes to run before a model serves traffic.
+
+    Batch sizes are capped by the model's `max_batch_size`, since live batches
+    never grow past it. Empty when warm-up is disabled (MODEL_WARMUP, or
+    `warmup: false` in models.yaml).
+    """
+    warmup = conf.get("warmup")
+    if not (settings.model_warmup if warmup is None else warmup):
+        return []
+    max_batch_size = conf.get("max_batch_size") or settings.batch_max_size
+    batch_sizes = sorted({max(1, min(int(size), max_batch_size)) for size in conf.get("warmup_batch_sizes") or settings.model_warmup_batch_sizes})
+    seq_lengths = sorted({max(1, int(length)) for length in conf.get("warmup_seq_lengths") or settings.model_warmup_seq_lengths})
+    return [(batch_size, seq_length) for seq_length in seq_lengths for batch_size in batch_sizes]
+
+def warm_up(model: Any, plan: List[Tuple[int, int]], name: str = "") -> float:
+    """
+    Encodes a synthetic batch of each shape in `plan`, so allocator pools, kernel
+    selection and tokenizer caches are set up before the first real request.
+    Sequence lengths are capped at the model's `max_seq_length`. A failure is
+    logged and ends the warm-up; the model still loads.
+
+    Returns:
+        float: Seconds spent.
+    """
+    started = time.perf_counter()
+    limit = getattr(model, "max_seq_length", None)
+    limit = limit if isinstance(limit, int) else None
+    shapes = sorted({(batch_size, min(seq_length, limit or seq_length)) for batch_size, seq_length in plan}, key=lambda shape: (shape[1], shape[0]))
+    for batch_size, seq_length in shapes:
+        # Two tokens of the sequence go to the special [CLS]/[SEP] style markers
+        text = " ".join([WARMUP_WORD] * max(1, seq_length - 2))
+        try:
+            model.encode([text] * batch_size, batch_size=batch_size)
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed at batch {batch_size} x {seq_length} tokens: {e}")
+            break
+    return time.perf_counter() - started
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16protos/embedding.proto\x12\tembedding\"\x18\n\x06Vector\x12\x0e\n\x06values\x18\x01 \x03(\x02\",\n\x0c\x45mbedRequest\x12\r\n\x05model\x18\x01 \x01(\t\x12\r\n\x05input\x18\x02 \x03(\t\"P\n\rEmbedResponse\x12\r\n\x05model\x18\x01 \x01(\t\x12\x0c\n\x04\x64ims\x18\x02 \x01(\x05\x12\"\n\x07vectors\x18\x03 \x03(\x0b\x32\x11.embedding.Vector\"[\n\x0c\x43hunkRequest\x12\r\n\x05model\x18\x01 \x01(\t\x12\r\n\x05input\x18\x02 \x03(\t\x12\x0e\n\x06method\x18\x03 \x01(\t\x12\x0c\n\x04size\x18\x04 \x01(\x05\x12\x0f\n\x07overlap\x18\x05 \x01(\x05\"R\n\rChunkResponse\x12\r\n\x05model\x18\x01 \x01(\t\x12\x0e\n\x06\x63hunks\x18\x02 \x03(\t\x12\"\n\x07vectors\x18\x03 \x03(\x0b\x32\x11.embedding.Vector2\xde\x01\n\x10\x45mbeddingService\x12<\n\x05\x45mbed\x12\x17.embedding.EmbedRequest\x1a\x18.embedding.EmbedResponse\"\x00\x12\x46\n\x0b\x45mbedStream\x12\x17.embedding.EmbedRequest\x1a\x18.embedding.EmbedResponse\"\x00(\x01\x30\x01\x12\x44\n\rChunkAndEmbed\x12\x17.embedding.ChunkRequest\x1a\x18.embedding.ChunkResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16protos/embedding.proto\x12\tembedding\"\x18\n\x06Vector\x12\x0e\n\x06values\x18\x01 \x03(\x02\"@\n\x0c\x45mbedRequest\x12\r\n\x05model\x18\x01 \x01(\t\x12\r\n\x05input\x18\x02 \x03(\t\x12\x12\n\ndimensions\x18\x03 \x01(\x05\"P\n\rEmbedResponse\x12\r\n\x05model\x18\x01 \x01(\t\x12\x0c\n\x04\x64ims\x18\x02 \x01(\x05\x12\"\n\x07vectors\x18\x03 \x03(\x0b\x32\x11.embedding.Vector\"o\n\x0c\x43hunkRequest\x12\r\n\x05model\x18\x01 \x01(\t\x12\r\n\x05input\x18\x02 \x03(\t\x12\x0e\n\x06method\x18\x03 \x01(\t\x12\x0c\n\x04size\x18\x04 \x01(\x05\x12\x0f\n\x07overlap\x18\x05 \x01(\x05\x12\x12\n\ndimensions\x18\x06 \x01(\x05\"R\n\rChunkResponse\x12\r\n\x05model\x18\x01 \x01(\t\x12\x0e\n\x06\x63hunks\x18\x02 \x03(\t\x12\"\n\x07vectors\x18\x03 \x03(\x0b\x32\x11.embedding.Vector2\xde\x01\n\x10\x45mbeddingService\x12<\n\x05\x45mbed\x12\x17.embedding.EmbedRequest\x1a\x18.embedding.EmbedResponse\"\x00\x12\x46\n\x0b\x45mbedStream\x12\x17.embedding.EmbedRequest\x1a\x18.embedding.EmbedResponse\"\x00(\x01\x30\x01\x12\x44\n\rChunkAndEmbed\x12\x17.embedding.ChunkRequest\x1a\x18.embedding.ChunkResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -34,13 +34,13 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_VECTOR']._serialized_start=37
   _globals['_VECTOR']._serialized_end=61
   _globals['_EMBEDREQUEST']._serialized_start=63
-  _globals['_EMBEDREQUEST']._serialized_end=107
-  _globals['_EMBEDRESPONSE']._serialized_start=109
-  _globals['_EMBEDRESPONSE']._serialized_end=189
-  _globals['_CHUNKREQUEST']._serialized_start=191
-  _globals['_CHUNKREQUEST']._serialized_end=282
-  _globals['_CHUNKRESPONSE']._serialized_start=284
-  _globals['_CHUNKRESPONSE']._serialized_end=366
-  _globals['_EMBEDDINGSERVICE']._serialized_start=369
-  _globals['_EMBEDDINGSERVICE']._serialized_end=591
+  _globals['_EMBEDREQUEST']._serialized_end=127
+  _globals['_EMBEDRESPONSE']._serialized_start=129
+  _globals['_EMBEDRESPONSE']._serialized_end=209
+  _globals['_CHUNKREQUEST']._serialized_start=211
+  _globals['_CHUNKREQUEST']._serialized_end=322
+  _globals['_CHUNKRESPONSE']._serialized_start=324
+  _globals['_CHUNKRESPONSE']._serialized_end=406
+  _globals['_EMBEDDINGSERVICE']._serialized_start=409
+  _globals['_EMBEDDINGSERVICE']._serialized_end=631
 # @@protoc_insertion_point(module_scope)
@@ -9,22 +9,85 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "generated"))
 from protos import embedding_pb2
 from protos import embedding_pb2_grpc
 from app.services.embedding_service import embedding_service
+from app.core.security import resolve_client_identity
+from app.core.deadline import DeadlineExceeded, deadline_after
+from app.core.admission import admission_controller, Overloaded
+from app.core.cache import track_cache_hits
+from app.core.model_manager import ModelLoading
 
 logger = logging.getLogger(__name__)
 
+def client_identity(context) -> str:
+    """Derives the caller identity from gRPC metadata, matching the HTTP rate limit key."""
+    metadata = {}
+    try:
+        metadata = {k.lower(): v for k, v in (context.invocation_metadata() or [])}
+    except Exception:
+        pass
+
+    remote_addr = None
+    try:
+        peer = context.peer()
+        if isinstance(peer, str):
+            # e.g. "ipv4:10.0.0.1:5432" or "ipv6:[::1]:5432"
+            remote_addr = peer.split(":", 1)[-1].rsplit(":", 1)[0].strip("[]")
+    except Exception:
+        pass
+
+    return resolve_client_identity(
+        api_key=metadata.get("x-api-key"),
+        authorization=metadata.get("authorization"),
+        remote_addr=remote_addr,
+    )
+
+def request_deadline(context):
+    """Converts the client's gRPC deadline (if any) into an absolute time.monotonic() deadline."""
+    try:
+        remaining = context.time_remaining()
+    except Exception:
+        return None
+    if isinstance(remaining, (int, float)):
+        return deadline_after(remaining)
+    return None
+
+async def abort_overloaded(context, error: Overloaded):
+    """
+    Sheds load with RESOURCE_EXHAUSTED (UNAVAILABLE while the model loads) and a
+    retry-after hint (seconds) in trailing metadata.
+    """
+    code = grpc.StatusCode.UNAVAILABLE if isinstance(error, ModelLoading) else grpc.StatusCode.RESOURCE_EXHAUSTED
+    await context.abort(
+        code,
+        str(error),
+        trailing_metadata=(("retry-after", str(error.retry_after)),)
+    )
+
 class EmbeddingServicer(embedding_pb2_grpc.EmbeddingServiceServicer):
     async def Embed(self, request, context):
         try:
-            vectors = await embedding_service.get_embeddings(request.model, request.input)
+            with admission_controller.slot():
+                cache_hits = track_cache_hits()
+                vectors = await embedding_service.get_embeddings(
+                    request.model,
+                    request.input,
+                    client_id=client_identity(context),
+                    deadline=request_deadline(context),
+                    dimensions=request.dimensions or None
+                )
             
             # Convert list of lists to repeated Vector messages
             vector_msgs = [embedding_pb2.Vector(values=v) for v in vectors]
+            context.set_trailing_metadata((("x-cache-hits", str(cache_hits.total)),))
             
             return embedding_pb2.EmbedResponse(
                 model=request.model,
                 dims=len(vectors[0]) if vectors else 0,
                 vectors=vector_msgs
             )
+        except DeadlineExceeded as e:
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(e))
+        except Overloaded as e:
+            await abort_overloaded(context, e)
         except ValueError as e:
             await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         except Exception as e:
@@ -34,34 +97,59 @@ class EmbeddingServicer(embedding_pb2_grpc.EmbeddingServiceServicer):
     async def EmbedStream(self, request_iterator, context):
         async for request in request_iterator:
             try:
-                vectors = await embedding_service.get_embeddings(request.model, request.input)
+                with admission_controller.slot():
+                    vectors = await embedding_service.get_embeddings(
+                        request.model,
+                        request.input,
+                        client_id=client_identity(context),
+                        deadline=request_deadline(context),
+                        dimensions=request.dimensions or None
+                    )
                 vector_msgs = [embedding_pb2.Vector(values=v) for v in vectors]
                 yield embedding_pb2.EmbedResponse(
                     model=request.model,
                     dims=len(vectors[0]) if vectors else 0,
                     vectors=vector_msgs
                 )
+            except DeadlineExceeded as e:
+                await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(e))
+            except Overloaded as e:
+                await abort_overloaded(context, e)
+            except ValueError as e:
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
             except Exception as e:
                 logger.exception("gRPC EmbedStream failed")
                 await context.abort(grpc.StatusCode.INTERNAL, str(e))
 
     async def ChunkAndEmbed(self, request, context):
         try:
-            chunks, vectors = await embedding_service.chunk_and_embed(
-                request.model,
-                request.input,
-                request.method,
-                request.size,
-                request.overlap
-            )
+            with admission_controller.slot():
+                cache_hits = track_cache_hits()
+                chunks, vectors = await embedding_service.chunk_and_embed(
+                    request.model,
+                    request.input,
+                    request.method,
+                    request.size,
+                    request.overlap,
+                    client_id=client_identity(context),
+                    deadline=request_deadline(context),
+                    dimensions=request.dimensions or None
+                )
             
             vector_msgs = [embedding_pb2.Vector(values=v) for v in vectors]
+            context.set_trailing_metadata((("x-cache-hits", str(cache_hits.total)),))
             
             return embedding_pb2.ChunkResponse(
                 model=request.model,
                 chunks=chunks,
                 vectors=vector_msgs
             )
+        except DeadlineExceeded as e:
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(e))
+        except Overloaded as e:
+            await abort_overloaded(context, e)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         except Exception as e:
             logger.exception("gRPC ChunkAndEmbed failed")
             await context.abort(grpc.StatusCode.INTERNAL, str(e))
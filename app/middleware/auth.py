@@ -1,8 +1,8 @@
-from fastapi import HTTPException, Security
+from fastapi import HTTPException, Request, Security
 from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
 from starlette.status import HTTP_403_FORBIDDEN
 from app.config.settings import settings, AuthMode
-from app.core.security import decode_access_token
+from app.core.security import decode_access_token, resolve_client_identity
 from typing import Optional
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -80,3 +80,14 @@ async def verify_master_key(
             status_code=HTTP_403_FORBIDDEN, detail="Invalid Master API Key"
         )
     return "master"
+
+async def get_client_identity(request: Request) -> str:
+    """
+    Returns the caller identity used for fair scheduling of inference capacity.
+    Matches the identity RateLimitMiddleware uses (JWT client_id, API key or IP).
+    """
+    return resolve_client_identity(
+        api_key=request.headers.get("X-API-Key"),
+        authorization=request.headers.get("Authorization"),
+        remote_addr=request.client.host if request.client else None,
+    )
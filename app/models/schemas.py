@@ -32,6 +32,7 @@ class EmbedRequest(BaseModel):
     model: str
     # Typed as Any to handle Pydantic Union complexity with FastAPI
     input: Any 
+    dimensions: Optional[int] = Field(None, gt=0, description="Truncate vectors to this size (Matryoshka models)")
 
 class EmbedResponse(BaseModel):
     model: str
@@ -44,6 +45,7 @@ class ChunkRequest(BaseModel):
     size: int = 512
     overlap: int = 0
     model: str
+    dimensions: Optional[int] = Field(None, gt=0, description="Truncate vectors to this size (Matryoshka models)")
 
 class ChunkResponse(BaseModel):
     model: str
@@ -54,16 +56,31 @@ class LoadModelRequest(BaseModel):
     alias: str
     model_name: str
     device: Optional[str] = None
+    quantize: Optional[str] = None # "int8" for dynamic int8 quantization (CPU)
+
+class SwapModelRequest(BaseModel):
+    alias: str
+    model_name: str # The new version to serve under `alias`
+    device: Optional[str] = None # Defaults to the alias's configured device
+    quantize: Optional[str] = None # "int8" for dynamic int8 quantization (CPU)
 
 class UnloadModelRequest(BaseModel):
     alias: str
 
+class CacheSnapshotRequest(BaseModel):
+    path: Optional[str] = Field(None, description="Snapshot file in the directory of CACHE_SNAPSHOT_PATH (defaults to that file)")
+
+class PrewarmRequest(BaseModel):
+    path: str = Field(..., description="JSONL corpus file in the directory of PREWARM_CORPUS_PATH")
+    model: Optional[str] = Field(None, description="Model alias for lines without a 'model' field")
+
 # --- OpenAI Compatibility Schemas ---
 
 class OpenAIEmbedRequest(BaseModel):
     input: Union[str, List[str], List[int], List[List[int]]]
     model: str
     encoding_format: Optional[str] = "float" # float or base64 (we only support float for now)
+    dimensions: Optional[int] = Field(None, gt=0, description="Truncate vectors to this size (Matryoshka models)")
     user: Optional[str] = None
 
 class OpenAIEmbeddingObject(BaseModel):
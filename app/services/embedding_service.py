@@ -1,53 +1,85 @@
 import asyncio
 import logging
-from typing import List
-from app.core.model_manager import model_manager
+from typing import Dict, List, Optional
+from app.config.settings import settings
+from app.core.batcher import batch_manager
 from app.core.cache import cache_manager
+from app.core.inflight import inflight_registry, ComputationAbandoned
+from app.core.deadline import DeadlineExceeded, is_expired, time_left
+from app.core.admission import Overloaded
+from app.core.metrics import COALESCED_TEXTS, CACHE_HITS, CACHE_MISSES
 from app.core.chunking import chunking_service
+from app.core.chunk_cache import chunk_cache
+from app.core.matryoshka import truncate, validate_dimensions
+from app.core.model_manager import model_manager
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
     @staticmethod
-    async def get_embeddings(model_name: str, texts: List[str]) -> List[List[float]]:
+    async def get_embeddings(
+        model_name: str,
+        texts: List[str],
+        client_id: str = "anonymous",
+        deadline: Optional[float] = None,
+        dimensions: Optional[int] = None
+    ) -> List[List[float]]:
         """
         Get embeddings for a list of texts, handling caching and missing values.
+        `client_id` identifies the caller for fair scheduling of encode capacity;
+        `deadline` (time.monotonic()) bounds how long the caller is willing to wait;
+        `dimensions` truncates the vectors of Matryoshka models (full vectors are cached).
+
+        All vectors of a response come from one model version: if the model is swapped
+        while the request encodes, the request runs again under the new version.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before all vectors are available.
+            ValueError: If the model doesn't support the requested `dimensions`.
+            Overloaded: If the model kept being swapped while the request ran.
         """
+        dimensions = validate_dimensions(model_name, dimensions)
+        for _ in range(2):
+            # Pinned for the whole attempt: a model swapped meanwhile must not mix up cache entries
+            version = model_manager.model_version(model_name)
+            vectors = await EmbeddingService._embed_version(model_name, texts, client_id, deadline, version)
+            if model_manager.model_version(model_name) == version:
+                return truncate(vectors, dimensions)
+            logger.info(f"Model {model_name} was swapped during a request; running it again under the new version")
+        raise Overloaded(f"Model '{model_name}' is being swapped; retry", retry_after=1)
+
+    @staticmethod
+    async def _embed_version(
+        model_name: str,
+        texts: List[str],
+        client_id: str,
+        deadline: Optional[float],
+        version: Optional[str]
+    ) -> List[List[float]]:
+        """Cache lookup and computation of the missing vectors, under one model version."""
         vectors_map = {}
-        missing_indices = []
-        missing_texts = []
+        # Uncached text -> positions in `texts` (repeats within a request are encoded once)
+        missing: Dict[str, List[int]] = {}
 
-        # Check Cache
-        for i, text in enumerate(texts):
-            cached_vector = cache_manager.get_embedding(model_name, text)
+        # Check Cache (one round trip for the whole request)
+        cached_vectors = await cache_manager.get_embeddings(
+            model_name, texts, version, unversioned_fallback=model_manager.reads_unversioned_keys(model_name)
+        )
+        for i, (text, cached_vector) in enumerate(zip(texts, cached_vectors)):
             if cached_vector:
                 vectors_map[i] = cached_vector
             else:
-                missing_indices.append(i)
-                missing_texts.append(text)
+                missing.setdefault(text, []).append(i)
 
         # Compute Missing
-        if missing_texts:
+        if missing:
+            duplicates = sum(len(indices) - 1 for indices in missing.values())
+            if duplicates:
+                COALESCED_TEXTS.labels(model_name).inc(duplicates)
             try:
-                # Offload blocking model inference to thread pool
-                model = model_manager.get_model(model_name)
-                
-                loop = asyncio.get_event_loop()
-                # model.encode usually returns numpy array
-                new_vectors = await loop.run_in_executor(None, model.encode, missing_texts)
-                
-                # Convert to list if it's numpy array
-                if hasattr(new_vectors, 'tolist'):
-                    new_vectors_list = new_vectors.tolist()
-                else:
-                    new_vectors_list = new_vectors
-                
-                for i, vector in enumerate(new_vectors_list):
-                    original_idx = missing_indices[i]
-                    vectors_map[original_idx] = vector
-                    # Cache the result
-                    cache_manager.set_embedding(model_name, missing_texts[i], vector)
-                    
+                computed = await EmbeddingService._compute_missing(model_name, list(missing), client_id, deadline, version)
+            except (DeadlineExceeded, Overloaded):
+                raise
             except ValueError as e:
                 logger.error(f"Model error for {model_name}: {e}")
                 raise ValueError(str(e))
@@ -55,9 +87,107 @@ class EmbeddingService:
                 logger.exception(f"Internal embedding error: {e}")
                 raise RuntimeError(f"Internal embedding error: {str(e)}")
 
+            for text, vector in computed.items():
+                for original_idx in missing[text]:
+                    vectors_map[original_idx] = vector
+
         # Construct Final List
-        final_vectors = [vectors_map[i] for i in range(len(texts))]
-        return final_vectors
+        return [vectors_map[i] for i in range(len(texts))]
+
+    @staticmethod
+    async def _compute_missing(
+        model_name: str,
+        texts: List[str],
+        client_id: str,
+        deadline: Optional[float] = None,
+        version: Optional[str] = None
+    ) -> Dict[str, List[float]]:
+        """
+        Computes embeddings for unique uncached texts.
+
+        Texts already being computed by another request are awaited instead of
+        encoded again; the rest are registered as in-flight, encoded through the
+        batcher, cached, and handed to any requests that joined in the meantime.
+        """
+        results: Dict[str, List[float]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        owned: Dict[str, str] = {}
+
+        for text in texts:
+            key = cache_manager._generate_key(model_name, text, version)
+            future = inflight_registry.get(key)
+            if future is not None:
+                waiting[text] = future
+            else:
+                inflight_registry.register(key)
+                owned[text] = key
+
+        if waiting:
+            COALESCED_TEXTS.labels(model_name).inc(len(waiting))
+
+        if owned:
+            owned_texts = list(owned)
+            computed: Dict[str, List[float]] = {}
+            encoded: Dict[str, List[float]] = {}
+            try:
+                # Across replicas, only the lease holder computes a text; the others wait for its result
+                leased = await cache_manager.acquire_leases(model_name, owned_texts, version)
+                leased_set = set(leased)
+                elsewhere = [text for text in owned_texts if text not in leased_set]
+
+                if leased:
+                    # Queue for the model's batcher so concurrent requests share forward passes
+                    encoded.update(zip(leased, await batch_manager.encode(
+                        model_name, leased, client_id=client_id, deadline=deadline
+                    )))
+                if elsewhere:
+                    remaining = time_left(deadline)
+                    wait = settings.cache_lease_wait_ms / 1000.0
+                    computed.update(await cache_manager.wait_for_shared(
+                        model_name, elsewhere, min(wait, remaining) if remaining is not None else wait, version
+                    ))
+                    # The lease holder is slow or gone: compute locally
+                    fallback = [text for text in elsewhere if text not in computed]
+                    if fallback:
+                        encoded.update(zip(fallback, await batch_manager.encode(
+                            model_name, fallback, client_id=client_id, deadline=deadline
+                        )))
+            except BaseException as e:
+                # Waiters must not hang; if we were cancelled or timed out they retry on their own
+                error = e if isinstance(e, Exception) else ComputationAbandoned(f"Computation for {model_name} was cancelled")
+                for key in owned.values():
+                    inflight_registry.fail(key, error)
+                raise
+
+            computed.update(encoded)
+            results.update(computed)
+            for text, vector in computed.items():
+                inflight_registry.resolve(owned[text], vector)
+            # Fills the local tier before yielding, so new requests hit it; Redis is one pipelined write.
+            # If the model was swapped meanwhile, some texts may have been encoded by the new version.
+            if model_manager.model_version(model_name) == version:
+                await cache_manager.set_embeddings(model_name, encoded, version)
+
+        retry = []
+        for text, future in waiting.items():
+            try:
+                # Shield: our cancellation or timeout must not cancel the future other requests share
+                timeout = time_left(deadline)
+                results[text] = await asyncio.wait_for(
+                    asyncio.shield(future), timeout=max(timeout, 0) if timeout is not None else None
+                )
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request deadline exceeded while waiting for a shared computation")
+            except (ComputationAbandoned, DeadlineExceeded):
+                # The request computing it went away or ran out of time; we may still have time
+                if is_expired(deadline):
+                    raise DeadlineExceeded("Request deadline exceeded")
+                retry.append(text)
+
+        if retry:
+            results.update(await EmbeddingService._compute_missing(model_name, retry, client_id, deadline, version))
+
+        return results
 
     @staticmethod
     async def chunk_and_embed(
@@ -65,26 +195,40 @@ class EmbeddingService:
         texts: List[str], 
         method: str = "token", 
         size: int = 512, 
-        overlap: int = 0
+        overlap: int = 0,
+        client_id: str = "anonymous",
+        deadline: Optional[float] = None,
+        dimensions: Optional[int] = None
     ) -> tuple[List[str], List[List[float]]]:
         """
         Chunk texts and return both chunks and their embeddings.
         """
+        dimensions = validate_dimensions(model_name, dimensions)
         all_chunks = []
         
         for text in texts:
-            chunks = chunking_service.chunk_text(
-                text, 
-                method=method, 
-                size=size, 
-                overlap=overlap
-            )
+            # Resubmitted documents skip tokenization; their chunk vectors come from the embedding cache
+            chunks = chunk_cache.get(text, method, size, overlap) if cache_manager.enabled else None
+            if chunks is not None:
+                CACHE_HITS.labels(model_name, "chunks").inc()
+            else:
+                chunks = chunking_service.chunk_text(
+                    text, 
+                    method=method, 
+                    size=size, 
+                    overlap=overlap
+                )
+                if cache_manager.enabled:
+                    CACHE_MISSES.labels(model_name, "chunks").inc()
+                    chunk_cache.put(text, method, size, overlap, chunks)
             all_chunks.extend(chunks)
         
         if not all_chunks:
             return [], []
 
-        vectors = await EmbeddingService.get_embeddings(model_name, all_chunks)
+        vectors = await EmbeddingService.get_embeddings(
+            model_name, all_chunks, client_id=client_id, deadline=deadline, dimensions=dimensions
+        )
         return all_chunks, vectors
 
 embedding_service = EmbeddingService()
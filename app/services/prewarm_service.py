@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from app.config.settings import settings
+from app.core.admission import Overloaded
+from app.core.batcher import PREWARM_CLIENT_ID
+from app.services.embedding_service import embedding_service
+
+logger = logging.getLogger(__name__)
+
+def load_corpus(path: str, default_model: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Reads a JSONL corpus into texts per model.
+
+    Each line is `{"model": "mini", "text": "..."}` or `{"model": "mini", "texts": [...]}`;
+    `model` may be omitted when `default_model` is given. Duplicates are dropped.
+
+    Raises:
+        ValueError: On a malformed line.
+    """
+    corpus: Dict[str, Dict[str, None]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: invalid JSON ({e})")
+            model = record.get("model") or default_model
+            texts = record.get("texts") or ([record["text"]] if "text" in record else [])
+            if not model or not texts:
+                raise ValueError(f"{path}:{number}: expected 'model' and 'text' or 'texts'")
+            bucket = corpus.setdefault(model, {})
+            for text in texts:
+                bucket[text] = None
+    return {model: list(texts) for model, texts in corpus.items()}
+
+class PrewarmService:
+    """
+    Pre-computes embeddings for a corpus in the background so its texts are cache
+    hits for live traffic. Texts go through the normal embedding path (cache check,
+    coalescing, batching) as client `__prewarm__`, whose low fair-scheduling weight
+    keeps live requests ahead of it in every batcher queue.
+    """
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.progress: Dict[str, Any] = {"running": False}
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, path: str, model: Optional[str] = None) -> bool:
+        """Starts pre-warming in the background. Returns False if a run is in progress."""
+        if self.running:
+            return False
+        self.task = asyncio.create_task(self.run(path, model))
+        return True
+
+    async def run(self, path: str, model: Optional[str] = None):
+        self.progress = {"running": True, "path": path, "total": 0, "done": 0, "failed": 0, "started_at": time.time()}
+        try:
+            corpus = await asyncio.to_thread(load_corpus, path, model)
+            self.progress["total"] = sum(len(texts) for texts in corpus.values())
+            logger.info(f"Pre-warming cache with {self.progress['total']} texts from {path}")
+
+            batch_size = max(1, settings.prewarm_batch_size)
+            for alias, texts in corpus.items():
+                for start in range(0, len(texts), batch_size):
+                    batch = texts[start:start + batch_size]
+                    await self._embed(alias, batch)
+        except Exception as e:
+            logger.error(f"Cache pre-warming from {path} failed: {e}")
+            self.progress["error"] = str(e)
+        finally:
+            self.progress["running"] = False
+            self.progress["finished_at"] = time.time()
+            logger.info(f"Cache pre-warming finished: {self.progress['done']} done, {self.progress['failed']} failed")
+
+    async def _embed(self, alias: str, batch: List[str]):
+        while True:
+            try:
+                await embedding_service.get_embeddings(alias, batch, client_id=PREWARM_CLIENT_ID)
+                self.progress["done"] += len(batch)
+                return
+            except Overloaded as e:
+                # Live traffic has priority: back off instead of competing for the queue
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.warning(f"Pre-warming batch for {alias} failed: {e}")
+                self.progress["failed"] += len(batch)
+                return
+
+    async def stop(self):
+        if self.running:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+prewarm_service = PrewarmService()
@@ -0,0 +1,80 @@
+import argparse
+import logging
+import os
+import sys
+import requests
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def build_snapshot(corpus_path: str, out_path: str, model: str = None, batch_size: int = 64):
+    """
+    Encodes a JSONL corpus offline and writes a cache snapshot that a server can
+    load at startup (CACHE_SNAPSHOT_PATH). Keys are generated exactly like the
+    server's cache keys, including the model version from models.yaml, so every
+    entry is a hit for live traffic.
+    The Docker build runs it after download_models.py when snapshot_corpus.jsonl
+    is in the build context.
+    """
+    from sentence_transformers import SentenceTransformer
+    from app.config.settings import model_config, settings
+    from app.core.cache import cache_key, model_version
+    from app.core.onnx_backend import OnnxModel
+    from app.core.quantization import quantize_dynamic
+    from app.core.snapshot import write_snapshot
+    from app.services.prewarm_service import load_corpus
+
+    corpus = load_corpus(corpus_path, model)
+
+    def entries():
+        for alias, texts in corpus.items():
+            conf = model_config.get(alias)
+            if conf is None:
+                raise ValueError(f"Model alias '{alias}' is not defined in {settings.model_config_path}")
+            logger.info(f"Encoding {len(texts)} texts with {alias} ({conf['name']})...")
+            # Encoded like the server would, so the vectors match the version in the keys
+            if conf.get("backend", "torch") == "onnx":
+                encoder = OnnxModel(conf["name"], onnx_path=conf.get("onnx_path"), quantize=conf.get("quantize"))
+            elif conf.get("quantize"):
+                encoder = quantize_dynamic(SentenceTransformer(conf["name"], device="cpu"))
+            else:
+                # Device left to SentenceTransformer (cuda if available) unless models.yaml pins one
+                encoder = SentenceTransformer(conf["name"], device=conf.get("device"))
+            vectors = encoder.encode(texts, batch_size=batch_size, show_progress_bar=False)
+            version = model_version(conf)
+            for text, vector in zip(texts, vectors):
+                yield cache_key(alias, text, version), alias, vector
+
+    count = write_snapshot(out_path, entries(), settings.cache_vector_format)
+    logger.info(f"Wrote {count} entries to {out_path}")
+
+def call_admin(url: str, action: str, path: str = None):
+    """Asks a running server to export or import its in-memory cache."""
+    headers = {"X-API-Key": os.getenv("API_KEY", "changeme")}
+    response = requests.post(f"{url.rstrip('/')}/admin/cache/{action}", json={"path": path}, headers=headers, timeout=600)
+    if response.status_code != 200:
+        logger.error(f"{action} failed ({response.status_code}): {response.text}")
+        sys.exit(1)
+    logger.info(response.json())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, export and import embedding cache snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Encode a JSONL corpus into a snapshot file (offline)")
+    build.add_argument("--corpus", required=True, help="JSONL file with {'model': ..., 'text': ...} lines")
+    build.add_argument("--out", required=True, help="Snapshot file to write")
+    build.add_argument("--model", help="Model alias for lines without a 'model' field")
+    build.add_argument("--batch-size", type=int, default=64)
+
+    for action in ("export", "import"):
+        command = commands.add_parser(action, help=f"{action.capitalize()} the cache of a running server")
+        command.add_argument("--url", default="http://localhost:8000")
+        command.add_argument("--path", help="Snapshot file in the directory of the server's CACHE_SNAPSHOT_PATH (defaults to that file)")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_snapshot(args.corpus, args.out, args.model, args.batch_size)
+    else:
+        call_admin(args.url, args.command, args.path)
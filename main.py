@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from prometheus_fastapi_instrumentator import Instrumentator
 from app.config.settings import settings
@@ -30,7 +31,35 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
 
-app = FastAPI(title=settings.app_name, version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.core.cache import cache_manager
+    from app.core.model_manager import model_manager
+    from app.services.prewarm_service import prewarm_service
+
+    # Warm start: restore the last cache snapshot, then pre-warm the corpus in the background
+    snapshot = settings.cache_snapshot_path
+    if cache_manager.enabled and snapshot and os.path.exists(snapshot):
+        try:
+            await asyncio.to_thread(cache_manager.import_snapshot, snapshot)
+        except Exception as e:
+            logger.error(f"Failed to load cache snapshot {snapshot}: {e}")
+    if cache_manager.enabled and settings.prewarm_corpus_path:
+        prewarm_service.start(settings.prewarm_corpus_path)
+    reaper = asyncio.create_task(model_manager.run_reaper()) if settings.model_idle_ttl_s else None
+
+    yield
+
+    if reaper is not None:
+        reaper.cancel()
+    await prewarm_service.stop()
+    if cache_manager.enabled and snapshot:
+        try:
+            await asyncio.to_thread(cache_manager.export_snapshot, snapshot)
+        except Exception as e:
+            logger.error(f"Failed to write cache snapshot {snapshot}: {e}")
+
+app = FastAPI(title=settings.app_name, version="1.0.0", lifespan=lifespan)
 
 # Middleware
 app.add_middleware(SecurityHeadersMiddleware)
@@ -49,7 +78,8 @@ async def serve_grpc():
     from app.grpc.generated.protos import embedding_pb2
     from grpc_reflection.v1alpha import reflection
 
-    server = grpc.aio.server(interceptors=[LoggingInterceptor()])
+    # SO_REUSEPORT: pre-forked workers each bind the gRPC port and the kernel spreads connections
+    server = grpc.aio.server(interceptors=[LoggingInterceptor()], options=[("grpc.so_reuseport", 1)])
     embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(EmbeddingServicer(), server)
     
     # Enable reflection
@@ -63,9 +93,13 @@ async def serve_grpc():
     server.add_insecure_port(f'[::]:{grpc_port}')
     logger.info(f"Starting gRPC server on [::]:{grpc_port}")
     await server.start()
-    await server.wait_for_termination()
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(grace=5)
 
-async def main():
+async def main(sockets=None):
+    """Serves HTTP and gRPC until the HTTP server shuts down (SIGINT/SIGTERM)."""
     import uvicorn
     
     http_port = int(os.getenv("PORT", 8000))
@@ -77,10 +111,34 @@ async def main():
     
     logger.info(f"Starting Dual-Protocol Server (HTTP: {http_port}, gRPC: {grpc_port})")
     
-    await asyncio.gather(
-        server.serve(),
-        serve_grpc()
-    )
+    grpc_server = asyncio.create_task(serve_grpc())
+    try:
+        # `sockets`: a listening socket inherited from the pre-fork master
+        await server.serve(sockets=sockets)
+    finally:
+        grpc_server.cancel()
+        await asyncio.gather(grpc_server, return_exceptions=True)
+
+def serve_prefork():
+    """
+    Runs WORKERS server processes forked from this one. Models preloaded on import
+    are shared copy-on-write, so workers add throughput without adding model copies.
+    """
+    from app.core.model_manager import model_manager
+    from app.core.prefork import PreforkServer, bind_socket, freeze_heap
+
+    model_manager.before_fork()
+    http_socket = bind_socket("0.0.0.0", int(os.getenv("PORT", 8000)))
+    freeze_heap()
+
+    def worker(index: int):
+        model_manager.after_fork()
+        asyncio.run(main(sockets=[http_socket]))
+
+    PreforkServer(settings.workers, worker, graceful_timeout_s=settings.worker_graceful_timeout_s).run()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if settings.workers > 1:
+        serve_prefork()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from app.core.admission import admission_controller, Overloaded
+from app.grpc.servicer import EmbeddingServicer
+from app.grpc.generated.protos import embedding_pb2
+
+def test_inflight_limit_rejects_with_retry_after(client, auth_headers, override_settings):
+    with override_settings(max_inflight_requests=1):
+        admission_controller.acquire()
+        try:
+            response = client.post("/embed", json={"model": "mini", "input": "hello"}, headers=auth_headers)
+        finally:
+            admission_controller.release()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_load_endpoint_reports_queue_and_wait(client, auth_headers):
+    client.post("/embed", json={"model": "mini", "input": "warm up"}, headers=auth_headers)
+
+    response = client.get("/load")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inflight_requests"] == 0
+    assert data["queue_depth"] == 0
+    mini = data["models"]["mini"]
+    assert mini["throughput_tokens_per_s"] > 0
+    assert mini["estimated_wait_s"] == 0.0
+
+@pytest.mark.asyncio
+async def test_grpc_overload_is_resource_exhausted(mocker):
+    import grpc
+    service = mocker.patch("app.grpc.servicer.embedding_service", new_callable=AsyncMock)
+    service.get_embeddings.side_effect = Overloaded("busy", retry_after=3)
+    context = MagicMock()
+    context.abort = AsyncMock()
+
+    await EmbeddingServicer().Embed(embedding_pb2.EmbedRequest(model="mini", input=["hi"]), context)
+
+    context.abort.assert_awaited_once_with(
+        grpc.StatusCode.RESOURCE_EXHAUSTED, "busy", trailing_metadata=(("retry-after", "3"),)
+    )
+    assert admission_controller.inflight == 0
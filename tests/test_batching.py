@@ -0,0 +1,277 @@
+import asyncio
+import pytest
+import numpy as np
+from app.core.batcher import DynamicBatcher
+
+class FakeModel:
+    """Records the batches passed to encode and returns [index-in-batch, len(text)] vectors."""
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=32):
+        self.batches.append(list(texts))
+        return np.array([[float(i), float(len(t))] for i, t in enumerate(texts)])
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=16, max_wait_ms=50)
+
+    results = await asyncio.gather(
+        batcher.submit(["a"]),
+        batcher.submit(["bb", "ccc"]),
+        batcher.submit(["dddd"]),
+    )
+
+    # One forward pass for all three callers
+    assert model.batches == [["a", "bb", "ccc", "dddd"]]
+    # Each caller gets its own slice, in order
+    assert [v[1] for v in results[0]] == [1.0]
+    assert [v[1] for v in results[1]] == [2.0, 3.0]
+    assert [v[1] for v in results[2]] == [4.0]
+
+@pytest.mark.asyncio
+async def test_batch_size_is_capped():
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=2, max_wait_ms=50)
+
+    vectors = await batcher.submit(["a", "b", "c", "d", "e"])
+
+    assert [len(b) for b in model.batches] == [2, 2, 1]
+    assert [v[1] for v in vectors] == [1.0] * 5
+
+@pytest.mark.asyncio
+async def test_encode_error_propagates_to_callers():
+    model = FakeModel()
+    model.encode = lambda texts, batch_size=32: (_ for _ in ()).throw(RuntimeError("boom"))
+    batcher = DynamicBatcher("fake", model, max_batch_size=8, max_wait_ms=0)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await batcher.submit(["a"])
+
+@pytest.mark.asyncio
+async def test_texts_are_grouped_by_length_bucket():
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=16, max_wait_ms=50)
+    long_text = "x" * 400  # ~100 tokens by the fallback estimate
+
+    results = await asyncio.gather(
+        batcher.submit(["a"]),
+        batcher.submit([long_text]),
+        batcher.submit(["b"]),
+    )
+
+    # Short texts are batched together; the long passage doesn't pad them
+    assert model.batches == [["a", "b"], [long_text]]
+    assert [v[1] for v in results[1]] == [400.0]
+
+@pytest.mark.asyncio
+async def test_batch_is_capped_by_padded_tokens():
+    model = FakeModel()
+    # Each single-char text is estimated at 2 tokens, so a 4-token budget fits 2 texts
+    batcher = DynamicBatcher("fake", model, max_batch_size=16, max_wait_ms=50, max_batch_tokens=4)
+
+    await batcher.submit(["a", "b", "c", "d", "e"])
+
+    assert [len(b) for b in model.batches] == [2, 2, 1]
+
+@pytest.mark.asyncio
+async def test_interactive_client_is_not_starved_by_bulk_client(override_settings):
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=4, max_wait_ms=20)
+
+    with override_settings(client_weights={}):
+        bulk = asyncio.ensure_future(batcher.submit([f"bulk{i}" for i in range(12)], client_id="bulk"))
+        await asyncio.sleep(0)
+        interactive = await batcher.submit(["hi"], client_id="chat")
+        await bulk
+
+    # The interactive text rides in the first batch instead of waiting behind all 12 bulk texts
+    assert "hi" in model.batches[0]
+    assert len(interactive) == 1
+
+@pytest.mark.asyncio
+async def test_client_weights_shift_capacity(override_settings):
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=4, max_wait_ms=20)
+
+    with override_settings(client_weights={"heavy": 3.0}):
+        await asyncio.gather(
+            batcher.submit([f"h{i}" for i in range(6)], client_id="client:heavy"),
+            batcher.submit([f"l{i}" for i in range(6)], client_id="light"),
+        )
+
+    first_batch = model.batches[0]
+    assert sum(t.startswith("h") for t in first_batch) == 3
+    assert sum(t.startswith("l") for t in first_batch) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_batches_are_capped_per_model():
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    class SlowModel(FakeModel):
+        def __init__(self):
+            super().__init__()
+            self.running = 0
+            self.peak = 0
+            self.lock = threading.Lock()
+
+        def encode(self, texts, batch_size=32):
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(0.02)
+            with self.lock:
+                self.running -= 1
+            return super().encode(texts, batch_size)
+
+    model = SlowModel()
+    executor = ThreadPoolExecutor(max_workers=2)
+    batcher = DynamicBatcher("slow", model, max_batch_size=1, max_wait_ms=0, executor=executor, max_concurrency=2)
+
+    await asyncio.gather(*[batcher.submit([f"t{i}"]) for i in range(6)])
+    executor.shutdown()
+
+    assert len(model.batches) == 6
+    assert model.peak == 2
+    assert batcher.busy_workers == 0
+
+def test_loaded_models_get_dedicated_executors():
+    from app.core.model_manager import model_manager
+
+    model_manager.get_model("mini")
+    executor = model_manager.get_executor("mini")
+    assert executor._max_workers == model_manager.get_max_concurrency("mini")
+    with pytest.raises(ValueError):
+        model_manager.get_executor("not-loaded")
+
+def test_adaptive_controller_grows_under_slo_and_shrinks_over_it():
+    from app.core.batch_controller import AdaptiveBatchController
+
+    controller = AdaptiveBatchController(latency_slo_ms=100, min_batch_size=1, max_batch_size=64, initial_batch_size=8, adjust_every=4)
+
+    for _ in range(8):
+        controller.record(controller.batch_size, 0.02)
+    assert controller.batch_size == 10
+
+    for _ in range(4):
+        controller.record(controller.batch_size, 0.5)
+    assert controller.batch_size == 7
+
+    # Partially filled batches give no evidence that a larger batch would help
+    for _ in range(4):
+        controller.record(1, 0.02)
+    assert controller.batch_size == 7
+
+def test_admin_batching_status(client, auth_headers):
+    response = client.post("/embed", json={"model": "mini", "input": "hello"}, headers=auth_headers)
+    assert response.status_code == 200
+
+    response = client.get("/admin/batching", headers=auth_headers)
+    assert response.status_code == 200
+    mini = response.json()["models"]["mini"]
+    assert mini["current_batch_size"] <= mini["max_batch_size"]
+
+@pytest.mark.asyncio
+async def test_expired_work_is_dropped_before_the_model():
+    import time
+    from app.core.deadline import DeadlineExceeded, deadline_after
+
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=1, max_wait_ms=0)
+
+    with pytest.raises(DeadlineExceeded):
+        await batcher.submit(["late"], deadline=time.monotonic() - 1)
+
+    # "slow" blocks the only worker while "short" waits in the queue past its deadline
+    slow_encode = model.encode
+    model.encode = lambda texts, batch_size=32: (time.sleep(0.1), slow_encode(texts))[1]
+    first = asyncio.ensure_future(batcher.submit(["slow"]))
+    await asyncio.sleep(0.01)
+    with pytest.raises(DeadlineExceeded):
+        await batcher.submit(["short"], deadline=deadline_after(0.02))
+    await first
+
+    assert model.batches == [["slow"]]
+    assert batcher.queue_depth == 0
+
+def test_invalid_request_timeout_header(client, auth_headers):
+    response = client.post(
+        "/embed",
+        json={"model": "mini", "input": "hello"},
+        headers={**auth_headers, "X-Request-Timeout": "-1"},
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/embed",
+        json={"model": "mini", "input": "hello"},
+        headers={**auth_headers, "X-Request-Timeout": "5"},
+    )
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_queue_wait_over_budget_is_rejected(override_settings):
+    from app.core.admission import Overloaded
+
+    model = FakeModel()
+    batcher = DynamicBatcher("fake", model, max_batch_size=8, max_wait_ms=0)
+    # 100 tokens/s and 1000 tokens already queued: ~10s of work ahead
+    batcher.throughput = 100.0
+    batcher.pending_tokens = 1000
+
+    with override_settings(admission_max_queue_wait_s=2.0):
+        with pytest.raises(Overloaded) as excinfo:
+            await batcher.submit(["hello"])
+    assert excinfo.value.retry_after >= 8
+    assert model.batches == []
+
+    # Within budget the work is queued as usual
+    batcher.pending_tokens = 0
+    with override_settings(admission_max_queue_wait_s=2.0):
+        assert len(await batcher.submit(["hello"])) == 1
+
+@pytest.mark.asyncio
+async def test_model_is_in_use_while_a_request_tokenizes(mocker):
+    import time
+    from app.core.batcher import BatchManager
+
+    class SlowTokenizer:
+        def __call__(self, texts, **kwargs):
+            time.sleep(0.2)
+            return {"input_ids": [[0, 1] for _ in texts]}
+
+    mocker.patch("app.core.batcher.model_manager", mocker.Mock(in_use_checks=[], unload_listeners=[], retire_listeners=[]))
+    batches = BatchManager()
+    model = FakeModel()
+    model.tokenizer = SlowTokenizer()
+    batches.batchers["fake"] = DynamicBatcher("fake", model, max_batch_size=8, max_wait_ms=0)
+
+    # Not queued yet, but eviction must not pull the model out from under it
+    submit = asyncio.ensure_future(batches.batchers["fake"].submit(["tokenizing"]))
+    await asyncio.sleep(0.05)
+    assert batches.in_use("fake")
+    await submit
+    assert not batches.in_use("fake")
+
+@pytest.mark.asyncio
+async def test_token_counts_are_truncated_and_run_on_the_models_threads():
+    import threading
+
+    class Tokenizer:
+        def __call__(self, texts, add_special_tokens=True, truncation=False, max_length=None):
+            self.calls.append((threading.current_thread().name, truncation, max_length))
+            return {"input_ids": [list(range(min(len(t.split()), max_length or 10**6))) for t in texts]}
+
+    model = FakeModel()
+    model.max_seq_length = 8
+    model.tokenizer = Tokenizer()
+    model.tokenizer.calls = []
+    batcher = DynamicBatcher("fake", model, max_batch_size=8, max_wait_ms=0)
+
+    await batcher.submit(["word " * 100])
+    assert model.tokenizer.calls == [("tokenize-fake_0", True, 8)]
+    assert batcher.count_tokens(["word " * 100]) == [8]
+    batcher.close()
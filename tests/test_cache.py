@@ -0,0 +1,337 @@
+import numpy as np
+import pytest
+from app.core.cache import CacheManager
+from app.core.local_cache import WTinyLFUCache
+from app.core.model_manager import model_manager
+
+def vec(dim=4, value=1.0):
+    return [value] * dim
+
+def test_local_cache_is_bounded_in_bytes():
+    cache = WTinyLFUCache(max_bytes=16 * 100)  # room for 100 four-dim float32 vectors
+
+    for i in range(1000):
+        cache.put(f"k{i}", "mini", vec())
+
+    assert cache.used_bytes <= 16 * 100
+    assert 0 < len(cache) <= 100
+
+def test_frequent_entries_survive_a_scan_of_one_off_texts():
+    cache = WTinyLFUCache(max_bytes=16 * 100)
+    for i in range(50):
+        cache.put(f"hot{i}", "mini", vec())
+    for _ in range(5):
+        for i in range(50):
+            assert cache.get(f"hot{i}") is not None
+
+    # A burst of texts seen only once must not flush the popular ones
+    for i in range(5000):
+        cache.get(f"cold{i}")
+        cache.put(f"cold{i}", "mini", vec())
+
+    assert sum(cache.get(f"hot{i}") is not None for i in range(50)) >= 45
+
+def test_per_model_accounting():
+    cache = WTinyLFUCache(max_bytes=1 << 20)
+    cache.put("a", "mini", vec(384))
+    cache.put("b", "mini", vec(384))
+    cache.put("c", "code", vec(768))
+    cache.put("a", "mini", vec(384))  # overwrite is not double counted
+
+    models = cache.stats()["models"]
+    assert models["mini"] == {"entries": 2, "bytes": 2 * 384 * 4, "evictions": 0}
+    assert models["code"] == {"entries": 1, "bytes": 768 * 4, "evictions": 0}
+    assert cache.used_bytes == 4 * 384 * 4
+
+@pytest.mark.asyncio
+async def test_cache_manager_stores_float32_arrays(override_settings):
+    with override_settings(enable_cache=True, redis_url=None):
+        manager = CacheManager()
+    await manager.set_embedding("mini", "hello", [0.5, 0.25, 0.125])
+
+    key = manager._generate_key("mini", "hello")
+    assert manager.local_cache.get(key).dtype == np.float32
+    assert await manager.get_embedding("mini", "hello") == [0.5, 0.25, 0.125]
+    assert await manager.get_embedding("mini", "other") is None
+
+def test_admin_cache_status(client, auth_headers):
+    response = client.get("/admin/cache", headers=auth_headers)
+    assert response.status_code == 200
+    assert "max_bytes" in response.json()["local"]
+
+def test_vector_codec_round_trips_every_format():
+    from app.core.vector_codec import encode_vector, decode_vector
+
+    vector = np.random.default_rng(0).normal(size=768).astype(np.float32)
+
+    exact = encode_vector(vector, "float32")
+    assert len(exact) == 8 + 768 * 4
+    assert np.array_equal(decode_vector(exact), vector)
+
+    assert np.allclose(decode_vector(encode_vector(vector, "float16")), vector, atol=1e-2)
+
+    compact = encode_vector(vector, "int8")
+    assert len(compact) == 8 + 4 + 768
+    restored = decode_vector(compact)
+    cosine = restored @ vector / (np.linalg.norm(restored) * np.linalg.norm(vector))
+    assert cosine > 0.999
+
+@pytest.fixture
+def fake_redis(mocker):
+    from fakeredis import FakeAsyncRedis
+
+    server = FakeAsyncRedis(decode_responses=False)
+    mocker.patch("app.core.cache.redis.from_url")
+    mocker.patch("app.core.cache.aioredis.from_url", return_value=server)
+    return server
+
+@pytest.mark.asyncio
+async def test_redis_tier_uses_binary_format_and_reads_legacy_json(override_settings, fake_redis):
+    from app.core.vector_codec import MAGIC
+
+    with override_settings(enable_cache=True, redis_url="redis://fake", cache_vector_format="float16"):
+        manager = CacheManager()
+
+        await manager.set_embedding("mini", "new", [0.5, 0.25])
+        assert (await fake_redis.get(manager._generate_key("mini", "new")))[:2] == MAGIC
+
+        # Entries written by older versions are JSON text; they are still served and rewritten
+        legacy_key = manager._generate_key("mini", "old")
+        await fake_redis.set(legacy_key, b"[0.5, 0.25]")
+        assert await manager.get_embedding("mini", "old") == [0.5, 0.25]
+        assert (await fake_redis.get(legacy_key))[:2] == MAGIC
+
+@pytest.mark.asyncio
+async def test_redis_lookups_and_writes_are_batched(override_settings, fake_redis, mocker):
+    with override_settings(enable_cache=True, redis_url="redis://fake"):
+        manager = CacheManager()
+        texts = [f"text {i}" for i in range(500)]
+
+        execute = mocker.spy(type(fake_redis.pipeline()), "execute")
+        await manager.set_embeddings("mini", {t: [float(i), 1.0] for i, t in enumerate(texts)})
+        assert execute.call_count == 1
+
+        # Force every lookup past the local tier
+        manager.local_cache.clear()
+        mget = mocker.spy(fake_redis, "mget")
+        get = mocker.spy(fake_redis, "get")
+        vectors = await manager.get_embeddings("mini", texts + ["unknown"])
+
+        assert mget.call_count == 1
+        assert get.call_count == 0
+        assert vectors[:500] == [[float(i), 1.0] for i in range(500)]
+        assert vectors[500] is None
+
+@pytest.mark.asyncio
+async def test_entries_from_before_versioned_keys_are_served_and_rewritten(override_settings, fake_redis, tmp_path, mocker):
+    from app.services.embedding_service import EmbeddingService
+
+    version = model_manager.model_version("mini")
+    encode = mocker.patch("app.services.embedding_service.batch_manager.encode")
+    with override_settings(enable_cache=True, redis_url="redis://fake", disk_cache_path=str(tmp_path / "cache.db")):
+        manager = CacheManager()
+        mocker.patch("app.services.embedding_service.cache_manager", manager)
+        # Written by a release that keyed by model and text only: JSON in Redis, binary on disk
+        await fake_redis.set(manager._generate_key("mini", "in redis"), b"[0.5, 0.25]")
+        manager.disk_cache.put_many({manager._generate_key("mini", "on disk"): ("mini", manager._encode({"k": [1.0, 0.0]})["k"])})
+
+        assert model_manager.reads_unversioned_keys("mini")
+        assert await EmbeddingService.get_embeddings("mini", ["in redis", "on disk"]) == [[0.5, 0.25], [1.0, 0.0]]
+        encode.assert_not_called()
+
+        # Rewritten under the versioned keys
+        restarted = CacheManager()
+        assert await restarted.get_embeddings("mini", ["in redis", "on disk"], version) == [[0.5, 0.25], [1.0, 0.0]]
+
+    # Another backend or quantization never produced those entries
+    mocker.patch.dict(model_manager.config["mini"], {"quantize": "int8"})
+    assert not model_manager.reads_unversioned_keys("mini")
+
+def test_disk_cache_compacts_least_recently_used(tmp_path):
+    from app.core.disk_cache import DiskCache
+
+    cache = DiskCache(str(tmp_path / "cache.db"), max_bytes=1000)
+    cache.put_many({f"k{i}": ("mini", b"x" * 100) for i in range(9)})
+    cache.get_many(["k0"])  # k0 becomes the most recently used entry
+
+    cache.put_many({"k9": ("mini", b"x" * 100), "k10": ("mini", b"x" * 100)})
+
+    assert cache.total_bytes <= 900
+    remaining = cache.get_many([f"k{i}" for i in range(11)])
+    assert "k0" in remaining and "k10" in remaining
+    assert "k1" not in remaining
+    assert cache.stats()["used_bytes"] == 100 * len(remaining)
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(override_settings, tmp_path):
+    with override_settings(enable_cache=True, redis_url=None, disk_cache_path=str(tmp_path / "cache.db")):
+        manager = CacheManager()
+        await manager.set_embeddings("mini", {"persisted": [0.5, 0.25]})
+        manager.disk_cache.close()
+
+        # A fresh process starts with an empty memory tier but finds the vector on disk
+        restarted = CacheManager()
+        assert len(restarted.local_cache) == 0
+        assert await restarted.get_embeddings("mini", ["persisted", "missing"]) == [[0.5, 0.25], None]
+        assert len(restarted.local_cache) == 1
+
+def test_cache_hits_header_and_metrics(client, auth_headers, mocker):
+    from prometheus_client import REGISTRY
+    from app.core.cache import cache_manager
+
+    mocker.patch.object(cache_manager, "enabled", True)
+
+    def hits():
+        return REGISTRY.get_sample_value("embedding_cache_hits_total", {"model": "mini", "tier": "local"}) or 0.0
+
+    body = {"model": "mini", "input": ["header probe one", "header probe two"]}
+    first = client.post("/embed", json=body, headers=auth_headers)
+    assert first.headers["X-Cache-Hits"] == "0"
+
+    before = hits()
+    second = client.post("/embed", json=body, headers=auth_headers)
+    assert second.headers["X-Cache-Hits"] == "2"
+    assert hits() - before == 2
+    assert REGISTRY.get_sample_value("embedding_cache_bytes", {"model": "mini", "tier": "local"}) > 0
+
+    metrics = client.get("/metrics").text
+    assert "embedding_cache_misses_total" in metrics
+    assert "embedding_cache_lookup_seconds" in metrics
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip_restores_live_keys(override_settings, tmp_path):
+    path = str(tmp_path / "cache.snap")
+    with override_settings(enable_cache=True, redis_url=None):
+        manager = CacheManager()
+        await manager.set_embeddings("mini", {"alpha": [0.5, 0.25], "beta": [1.0, 0.0]})
+        assert manager.export_snapshot(path) == 2
+
+        restarted = CacheManager()
+        assert restarted.import_snapshot(path) == 2
+        assert await restarted.get_embeddings("mini", ["alpha", "beta"]) == [[0.5, 0.25], [1.0, 0.0]]
+
+@pytest.mark.asyncio
+async def test_offline_snapshot_is_hit_by_live_requests(override_settings, tmp_path, mocker):
+    import json
+    from cache_snapshot import build_snapshot
+    from app.services.embedding_service import EmbeddingService
+
+    class Encoder:
+        def __init__(self, name, device=None):
+            pass
+
+        def encode(self, texts, batch_size=None, **kwargs):
+            return np.array([[0.5, 0.25]] * len(texts), dtype=np.float32)
+
+    mocker.patch("sentence_transformers.SentenceTransformer", Encoder)
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text(json.dumps({"model": "mini", "texts": ["offline one", "offline two"]}) + "\n")
+    path = str(tmp_path / "built.snap")
+    build_snapshot(str(corpus), path)
+
+    encode = mocker.patch("app.services.embedding_service.batch_manager.encode")
+    with override_settings(enable_cache=True, redis_url=None, disk_cache_path=None):
+        cache = CacheManager()
+        mocker.patch("app.services.embedding_service.cache_manager", cache)
+        assert cache.import_snapshot(path) == 2
+        assert await EmbeddingService.get_embeddings("mini", ["offline one", "offline two"]) == [[0.5, 0.25]] * 2
+    encode.assert_not_called()
+
+def test_snapshot_admin_endpoints(client, auth_headers, tmp_path, override_settings):
+    path = str(tmp_path / "admin.snap")
+
+    with override_settings(cache_snapshot_path=str(tmp_path / "cache.snap")):
+        response = client.post("/admin/cache/export", json={"path": path}, headers=auth_headers)
+        assert response.status_code == 200
+        # Relative paths are taken from the snapshot directory
+        response = client.post("/admin/cache/import", json={"path": "admin.snap"}, headers=auth_headers)
+        assert response.status_code == 200
+
+        (tmp_path / "bogus.snap").write_bytes(b"not a snapshot")
+        response = client.post("/admin/cache/import", json={"path": str(tmp_path / "bogus.snap")}, headers=auth_headers)
+        assert response.status_code == 400
+
+def test_admin_file_endpoints_are_confined_and_need_master_key(client, auth_headers, tmp_path, override_settings):
+    with override_settings(cache_snapshot_path=str(tmp_path / "snaps" / "cache.snap"), prewarm_corpus_path=str(tmp_path / "corpus" / "c.jsonl")):
+        for body in ({"path": "/etc/passwd"}, {"path": "../outside.snap"}):
+            assert client.post("/admin/cache/export", json=body, headers=auth_headers).status_code == 400
+            assert client.post("/admin/cache/import", json=body, headers=auth_headers).status_code == 400
+            assert client.post("/admin/cache/prewarm", json=body, headers=auth_headers).status_code == 400
+        # Open (AUTH_MODE=none) access isn't enough for server files
+        assert client.post("/admin/cache/export", json={}).status_code == 403
+        assert client.post("/admin/cache/prewarm", json={"path": "c.jsonl"}).status_code == 403
+
+    with override_settings(cache_snapshot_path=None):
+        response = client.post("/admin/cache/export", json={"path": str(tmp_path / "x.snap")}, headers=auth_headers)
+        assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_prewarm_fills_cache_at_low_priority(tmp_path, mocker):
+    import json
+    from app.core.batcher import client_weight, PREWARM_CLIENT_ID
+    from app.core.cache import cache_manager
+    from app.services.prewarm_service import PrewarmService
+
+    mocker.patch.object(cache_manager, "enabled", True)
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text(
+        json.dumps({"model": "mini", "texts": ["prewarm one", "prewarm two"]}) + "\n"
+        + json.dumps({"text": "prewarm three"}) + "\n"
+    )
+
+    service = PrewarmService()
+    await service.run(str(corpus), model="mini")
+
+    assert service.progress["done"] == 3 and service.progress["failed"] == 0
+    version = model_manager.model_version("mini")
+    hits = await cache_manager.get_embeddings("mini", ["prewarm one", "prewarm two", "prewarm three"], version)
+    assert all(v is not None for v in hits)
+    assert client_weight(PREWARM_CLIENT_ID) < client_weight("anonymous")
+
+@pytest.mark.asyncio
+async def test_lease_holder_result_is_shared_with_other_replicas(override_settings, fake_redis):
+    import asyncio
+
+    with override_settings(enable_cache=True, redis_url="redis://fake", cache_lease_enabled=True, cache_lease_poll_ms=5):
+        replica_a, replica_b = CacheManager(), CacheManager()
+
+        assert await replica_a.acquire_leases("mini", ["popular", "other"]) == ["popular", "other"]
+        # B sees A's leases and computes nothing itself
+        assert await replica_b.acquire_leases("mini", ["popular", "other"]) == []
+
+        async def finish_later():
+            await asyncio.sleep(0.02)
+            await replica_a.set_embeddings("mini", {"popular": [1.0, 0.0]})
+
+        writer = asyncio.ensure_future(finish_later())
+        shared = await replica_b.wait_for_shared("mini", ["popular", "other"], timeout=0.2)
+        await writer
+
+        # "other" never arrived: B falls back to computing it after the wait
+        assert shared == {"popular": [1.0, 0.0]}
+        assert await replica_b.get_embedding("mini", "popular") == [1.0, 0.0]
+
+@pytest.mark.asyncio
+async def test_replica_waits_for_lease_holder_instead_of_encoding(override_settings, fake_redis, mocker):
+    import asyncio
+    from app.services.embedding_service import EmbeddingService
+
+    encoded = []
+
+    async def encode(alias, texts, client_id="anonymous", deadline=None):
+        encoded.extend(texts)
+        return [[2.0, 2.0] for _ in texts]
+
+    mocker.patch("app.services.embedding_service.batch_manager.encode", side_effect=encode)
+    with override_settings(enable_cache=True, redis_url="redis://fake", cache_lease_enabled=True, cache_lease_poll_ms=5):
+        holder, replica = CacheManager(), CacheManager()
+        mocker.patch("app.services.embedding_service.cache_manager", replica)
+
+        version = model_manager.model_version("mini")
+        await holder.acquire_leases("mini", ["burst"], version)
+        asyncio.get_running_loop().call_later(
+            0.02, lambda: asyncio.ensure_future(holder.set_embeddings("mini", {"burst": [1.0, 1.0]}, version))
+        )
+
+        assert await EmbeddingService.get_embeddings("mini", ["burst", "fresh"]) == [[1.0, 1.0], [2.0, 2.0]]
+        assert encoded == ["fresh"]
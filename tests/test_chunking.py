@@ -30,3 +30,46 @@ def test_chunk_and_embed_char(client, auth_headers):
     assert len(data["chunks"]) == 2
     assert data["chunks"][0] == "abcde"
     assert data["chunks"][1] == "fghij"
+
+def test_chunk_cache_stores_offsets_and_restores_chunks():
+    from array import array
+    from app.core.chunk_cache import ChunkCache
+    from app.core.chunking import chunking_service
+
+    cache = ChunkCache(max_bytes=1 << 20)
+    text = "The quick brown fox jumps over the lazy dog. " * 20
+    for method, size, overlap in [("char", 50, 10), ("token", 16, 4)]:
+        chunks = chunking_service.chunk_text(text, method=method, size=size, overlap=overlap)
+        cache.put(text, method, size, overlap, chunks)
+        assert cache.get(text, method, size, overlap) == chunks
+
+    assert all(isinstance(stored, array) for stored, _ in cache._entries.values())
+    assert cache.get(text, "char", 50, 0) is None
+    assert cache.get(text + "!", "char", 50, 10) is None
+
+def test_chunk_cache_is_bounded_in_bytes():
+    from app.core.chunk_cache import ChunkCache
+
+    cache = ChunkCache(max_bytes=2000)
+    for i in range(100):
+        cache.put(f"document {i}", "char", 4, 0, [f"document {i}"[j:j + 4] for j in range(0, 12, 4)])
+
+    assert cache.used_bytes <= 2000
+    assert cache.get("document 99", "char", 4, 0) is not None
+    assert cache.get("document 0", "char", 4, 0) is None
+
+def test_resubmitted_document_skips_chunking(client, auth_headers, mocker):
+    from app.core.cache import cache_manager
+    from app.core.chunking import chunking_service
+
+    mocker.patch.object(cache_manager, "enabled", True)
+    chunk_text = mocker.spy(chunking_service, "chunk_text")
+    payload = {"model": "mini", "input": "resubmitted " * 300, "method": "token", "size": 64, "overlap": 8}
+
+    first = client.post("/embed/chunk", json=payload, headers=auth_headers)
+    second = client.post("/embed/chunk", json=payload, headers=auth_headers)
+
+    assert chunk_text.call_count == 1
+    assert second.json()["chunks"] == first.json()["chunks"]
+    assert second.json()["vectors"] == first.json()["vectors"]
+    assert second.headers["X-Cache-Hits"] == str(len(second.json()["chunks"]))
@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from app.services.embedding_service import EmbeddingService
+from app.core.inflight import inflight_registry
+
+class RecordingBatchManager:
+    """Stands in for the batch manager; records every text sent to a forward pass."""
+    def __init__(self, delay=0.01):
+        self.encoded = []
+        self.delay = delay
+
+    async def encode(self, alias, texts, client_id="anonymous", deadline=None):
+        self.encoded.extend(texts)
+        await asyncio.sleep(self.delay)
+        return [[float(len(t)), 1.0] for t in texts]
+
+@pytest.fixture
+def recording_batcher(mocker):
+    recorder = RecordingBatchManager()
+    mocker.patch("app.services.embedding_service.batch_manager", recorder)
+    return recorder
+
+@pytest.mark.asyncio
+async def test_burst_of_identical_requests_costs_one_forward_pass(recording_batcher):
+    results = await asyncio.gather(*[
+        EmbeddingService.get_embeddings("mini", ["hot query"]) for _ in range(50)
+    ])
+
+    assert recording_batcher.encoded == ["hot query"]
+    assert all(r == [[9.0, 1.0]] for r in results)
+    assert len(inflight_registry) == 0
+
+@pytest.mark.asyncio
+async def test_duplicates_within_request_are_encoded_once(recording_batcher):
+    vectors = await EmbeddingService.get_embeddings("mini", ["a", "bb", "a", "a"])
+
+    assert recording_batcher.encoded == ["a", "bb"]
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [1.0, 1.0]]
+
+@pytest.mark.asyncio
+async def test_waiters_recompute_when_first_request_is_cancelled(recording_batcher):
+    leader = asyncio.ensure_future(EmbeddingService.get_embeddings("mini", ["shared"]))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(EmbeddingService.get_embeddings("mini", ["shared"]))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    assert await follower == [[6.0, 1.0]]
+    assert recording_batcher.encoded == ["shared", "shared"]
+    assert len(inflight_registry) == 0
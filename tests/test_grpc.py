@@ -32,7 +32,9 @@ async def test_embed_grpc(mock_embedding_service):
     assert len(response.vectors) == 1
     assert response.vectors[0].values == pytest.approx([0.1, 0.2, 0.3])
     
-    mock_embedding_service.get_embeddings.assert_awaited_once_with("test-model", ["hello"])
+    mock_embedding_service.get_embeddings.assert_awaited_once_with(
+        "test-model", ["hello"], client_id="unknown", deadline=None, dimensions=None
+    )
 
 @pytest.mark.asyncio
 async def test_embed_stream_grpc(mock_embedding_service):
@@ -73,3 +75,39 @@ async def test_chunk_and_embed_grpc(mock_embedding_service):
     assert response.vectors[0].values == pytest.approx([0.1, 0.2])
     
     mock_embedding_service.chunk_and_embed.assert_awaited_once()
+
+def test_client_identity_from_metadata():
+    from app.grpc.servicer import client_identity
+    from app.config.settings import settings
+
+    context = MagicMock()
+    context.invocation_metadata.return_value = [("x-api-key", settings.api_key)]
+    context.peer.return_value = "ipv4:10.0.0.1:5432"
+    assert client_identity(context) == "master_key"
+
+    context.invocation_metadata.return_value = []
+    assert client_identity(context) == "10.0.0.1"
+
+def test_request_deadline_from_context():
+    import time
+    from app.grpc.servicer import request_deadline
+
+    context = MagicMock()
+    context.time_remaining.return_value = 2.0
+    deadline = request_deadline(context)
+    assert 1.5 < deadline - time.monotonic() <= 2.0
+
+    # No deadline set by the client
+    context.time_remaining.return_value = None
+    assert request_deadline(context) is None
+
+@pytest.mark.asyncio
+async def test_embed_grpc_passes_dimensions(mock_embedding_service):
+    servicer = EmbeddingServicer()
+    request = embedding_pb2.EmbedRequest(model="test-model", input=["hello"], dimensions=2)
+    mock_embedding_service.get_embeddings.return_value = [[0.6, 0.8]]
+
+    response = await servicer.Embed(request, MagicMock())
+
+    assert response.dims == 2
+    assert mock_embedding_service.get_embeddings.await_args.kwargs["dimensions"] == 2
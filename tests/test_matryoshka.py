@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from app.core.matryoshka import truncate
+from app.core.model_manager import model_manager
+
+@pytest.fixture
+def matryoshka_mini(mocker):
+    mocker.patch.dict(model_manager.config["mini"], {"matryoshka_dims": [384, 256, 64]})
+
+def test_truncate_renormalizes():
+    vectors = truncate([[3.0, 4.0, 12.0], [1.0, 0.0, 0.0]], 2)
+    np.testing.assert_allclose(vectors, [[0.6, 0.8], [1.0, 0.0]], rtol=1e-6)
+    full = [[3.0, 4.0, 12.0]]
+    assert truncate(full, 3) is full
+    with pytest.raises(ValueError):
+        truncate(full, 4)
+
+def test_embed_dimensions_reuse_the_cached_full_vector(client, auth_headers, override_settings, matryoshka_mini, mocker):
+    from app.core.cache import CacheManager
+    with override_settings(enable_cache=True, redis_url=None, disk_cache_path=None):
+        mocker.patch("app.services.embedding_service.cache_manager", CacheManager())
+        encode = mocker.spy(model_manager.get_model("mini"), "encode")
+
+        full = client.post("/embed", json={"model": "mini", "input": "matryoshka"}, headers=auth_headers).json()
+        small = client.post("/embed", json={"model": "mini", "input": "matryoshka", "dimensions": 64}, headers=auth_headers)
+
+    assert small.status_code == 200
+    assert small.json()["dims"] == 64
+    assert small.headers["X-Cache-Hits"] == "1"
+    assert encode.call_count == 1
+    expected = np.asarray(full["vectors"][0][:64])
+    np.testing.assert_allclose(small.json()["vectors"][0], expected / np.linalg.norm(expected), atol=1e-6)
+
+def test_openai_and_chunk_dimensions(client, auth_headers, matryoshka_mini):
+    response = client.post("/v1/embeddings", json={"model": "mini", "input": ["openai dims one", "openai dims two"], "dimensions": 256}, headers=auth_headers)
+    assert response.status_code == 200
+    assert all(len(item["embedding"]) == 256 for item in response.json()["data"])
+
+    response = client.post("/embed/chunk", json={"model": "mini", "input": "some text to chunk", "dimensions": 64}, headers=auth_headers)
+    assert response.status_code == 200
+    assert all(len(vector) == 64 for vector in response.json()["vectors"])
+
+def test_unsupported_dimensions_are_rejected(client, auth_headers, matryoshka_mini, mocker):
+    response = client.post("/embed", json={"model": "mini", "input": "x", "dimensions": 100}, headers=auth_headers)
+    assert response.status_code == 400
+
+    mocker.patch.dict(model_manager.config, {"plain": {"name": "all-MiniLM-L6-v2", "preload": False}})
+    response = client.post("/v1/embeddings", json={"model": "plain", "input": "x", "dimensions": 64}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "matryoshka_dims" in response.json()["detail"]
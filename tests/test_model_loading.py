@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.model_manager import ModelManager, ModelLoading, model_manager
+
+class SlowModel:
+    """Stands in for SentenceTransformer: slow to construct, counts constructions."""
+    built = 0
+    fail = False
+
+    def __init__(self, name, device=None):
+        time.sleep(0.2)
+        if SlowModel.fail:
+            raise OSError(f"{name} not found")
+        SlowModel.built += 1
+
+@pytest.fixture
+def manager(mocker):
+    SlowModel.built, SlowModel.fail = 0, False
+    mocker.patch("app.core.model_manager.SentenceTransformer", SlowModel)
+    mocker.patch("app.config.settings.model_config", {"slow": {"name": "slow", "preload": False}})
+    return ModelManager()
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_share_one_load_off_the_loop(manager):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticking = asyncio.ensure_future(ticker())
+    models = await asyncio.gather(*(manager.load_model_async("slow") for _ in range(5)))
+    ticking.cancel()
+
+    assert SlowModel.built == 1
+    assert all(model is models[0] for model in models)
+    # The event loop kept running while the model was constructed
+    assert ticks >= 5
+    assert manager.states["slow"]["state"] == "ready"
+
+@pytest.mark.asyncio
+async def test_failed_load_is_reported_and_retried(manager):
+    SlowModel.fail = True
+    with pytest.raises(OSError):
+        await manager.load_model_async("slow")
+    assert manager.states["slow"]["state"] == "failed"
+    assert "not found" in manager.states["slow"]["error"]
+
+    SlowModel.fail = False
+    await manager.load_model_async("slow")
+    assert manager.states["slow"]["state"] == "ready"
+
+@pytest.mark.asyncio
+async def test_fail_fast_rejects_while_loading(manager, override_settings):
+    with override_settings(model_load_fail_fast=True):
+        with pytest.raises(ModelLoading) as error:
+            await manager.ensure_model("slow")
+        assert error.value.retry_after >= 1
+        assert manager.states["slow"]["state"] == "loading"
+        # Still loading: rejected again without starting a second load
+        with pytest.raises(ModelLoading):
+            await manager.ensure_model("slow")
+
+        await asyncio.sleep(0.4)
+        assert await manager.ensure_model("slow") is manager.models["slow"]
+    assert SlowModel.built == 1
+
+@pytest.mark.asyncio
+async def test_fail_fast_unknown_alias_is_not_a_503(manager, override_settings):
+    with override_settings(model_load_fail_fast=True):
+        with pytest.raises(ValueError):
+            await manager.ensure_model("missing")
+
+def test_http_returns_503_while_model_loads(client, auth_headers, override_settings, mocker):
+    mini = model_manager.get_model("mini")
+    loaded = threading.Event()
+
+    def build(alias, name, device, quantize=None):
+        loaded.wait(5)
+        return mini
+
+    mocker.patch.object(model_manager, "_build", side_effect=build)
+    try:
+        with override_settings(model_load_fail_fast=True):
+            response = client.post("/embed", json={"model": "bge", "input": "hi"}, headers=auth_headers)
+            assert response.status_code == 503
+            assert int(response.headers["Retry-After"]) >= 1
+            ready = client.get("/ready")
+            assert ready.json()["models"]["bge"]["state"] == "loading"
+            # bge isn't preloaded: the server stays ready while it loads
+            assert ready.status_code == 200 and ready.json()["status"] == "ready"
+            # Health stays responsive during the load
+            assert client.get("/health").status_code == 200
+
+            loaded.set()
+            for _ in range(50):
+                if "bge" in model_manager.models:
+                    break
+                time.sleep(0.02)
+            response = client.post("/embed", json={"model": "bge", "input": "hi"}, headers=auth_headers)
+            assert response.status_code == 200
+    finally:
+        loaded.set()
+        model_manager.unload_model("bge")
+
+def test_ready_is_503_until_preloaded_models_are_ready(client, mocker):
+    assert client.get("/ready").status_code == 200
+
+    # Not ready until the startup load of a preloaded model has finished
+    mocker.patch.object(model_manager, "_served", set())
+    mocker.patch.dict(model_manager.states["mini"], {"state": "loading"})
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "loading"
+
+    model_manager.states["mini"]["state"] = "failed"
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "failed"
+
+def test_unloading_a_preloaded_model_keeps_the_server_ready(client, auth_headers):
+    try:
+        assert client.post("/admin/unload-model", json={"alias": "mini"}, headers=auth_headers).status_code == 200
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert "mini" not in response.json()["models_loaded"]
+        # The next request loads it again
+        assert client.post("/embed", json={"model": "mini", "input": "reload"}, headers=auth_headers).status_code == 200
+    finally:
+        model_manager.get_model("mini")
+    assert "mini" in client.get("/ready").json()["models_loaded"]
@@ -0,0 +1,137 @@
+import asyncio
+import time
+import pytest
+from app.core.batcher import BatchManager
+from app.core.cache import CacheManager, cache_key
+from app.core.model_manager import ModelManager
+
+class VersionModel:
+    """Stands in for SentenceTransformer: vectors identify the model name that made them."""
+    max_seq_length = 128
+    delay = 0.0
+
+    def __init__(self, name, device=None):
+        if name == "broken":
+            raise OSError(f"{name} not found")
+        self.name = name
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        time.sleep(self.delay)
+        return [[1.0, 0.0] if self.name == "v1" else [0.0, 1.0] for _ in texts]
+
+@pytest.fixture
+def swappable(mocker, override_settings):
+    mocker.patch("app.core.model_manager.SentenceTransformer", VersionModel)
+    mocker.patch("app.config.settings.model_config", {"m": {"name": "v1", "preload": True}})
+    with override_settings(model_warmup=False):
+        manager = ModelManager()
+        mocker.patch("app.core.batcher.model_manager", manager)
+        yield manager, BatchManager()
+
+@pytest.mark.asyncio
+async def test_swap_drains_old_version_and_serves_new_one(swappable):
+    manager, batches = swappable
+    old = manager.models["m"]
+    old.delay = 0.2
+
+    # Queued on the old version before the swap: finishes on it
+    in_flight = asyncio.ensure_future(batches.encode("m", ["queued"]))
+    await asyncio.sleep(0.05)
+    swap = await manager.swap_model("m", "v2")
+
+    assert in_flight.done() and in_flight.result() == [[1.0, 0.0]]
+    assert swap["previous"] == "v1" and swap["version"] == "v2"
+    assert manager.models["m"] is not old
+    assert manager.config["m"]["name"] == "v2"
+    assert await batches.encode("m", ["after"]) == [[0.0, 1.0]]
+    assert manager.states["m"]["state"] == "ready"
+
+@pytest.mark.asyncio
+async def test_request_tokenizing_during_swap_goes_to_new_version(swappable):
+    manager, batches = swappable
+
+    class SlowTokenizer:
+        def __call__(self, texts, **kwargs):
+            time.sleep(0.3)
+            return {"input_ids": [[0, 1, 2] for _ in texts]}
+
+    manager.models["m"].tokenizer = SlowTokenizer()
+    # Still tokenizing for the old version when the swap has drained it and shut down its executor
+    tokenizing = asyncio.ensure_future(batches.encode("m", ["tokenizing"]))
+    await asyncio.sleep(0.05)
+    await manager.swap_model("m", "v2")
+
+    assert await tokenizing == [[0.0, 1.0]]
+
+@pytest.mark.asyncio
+async def test_failed_swap_keeps_old_version(swappable):
+    manager, batches = swappable
+    old = manager.models["m"]
+
+    with pytest.raises(OSError):
+        await manager.swap_model("m", "broken")
+    assert manager.models["m"] is old
+    assert manager.model_version("m") == "v1"
+    assert "swapping_to" not in manager.states["m"]
+    assert await batches.encode("m", ["still v1"]) == [[1.0, 0.0]]
+
+    with pytest.raises(ValueError, match="not loaded"):
+        await manager.swap_model("other", "v2")
+
+def test_model_version_covers_name_backend_and_quantization(swappable):
+    manager, _ = swappable
+    manager.config["o"] = {"name": "v1", "backend": "onnx", "quantize": "int8"}
+    assert manager.model_version("m") == "v1"
+    assert manager.model_version("o") == "v1+onnx+int8"
+    assert manager.model_version("unknown") is None
+    assert cache_key("m", "text", "v1") != cache_key("m", "text", "v2")
+
+@pytest.mark.asyncio
+async def test_cache_never_serves_vectors_of_another_version(mocker, override_settings):
+    from app.core.admission import Overloaded
+    from app.services.embedding_service import EmbeddingService
+
+    version = {"m": "v1"}
+    encoded = []
+
+    async def encode(alias, texts, client_id="anonymous", deadline=None):
+        encoded.extend(texts)
+        made_by = version["m"]
+        # The model is swapped while this batch runs (back and forth for "flapping")
+        if "during swap" in texts and made_by == "v1":
+            version["m"] = "v2"
+        if "flapping" in texts:
+            version["m"] = "v2" if made_by == "v1" else "v1"
+        return [[1.0, 0.0] if made_by == "v1" else [0.0, 1.0] for _ in texts]
+
+    mocker.patch("app.services.embedding_service.batch_manager.encode", side_effect=encode)
+    mocker.patch("app.services.embedding_service.model_manager.model_version", side_effect=version.get)
+    with override_settings(enable_cache=True, redis_url=None, disk_cache_path=None):
+        cache = CacheManager()
+        mocker.patch("app.services.embedding_service.cache_manager", cache)
+
+        await EmbeddingService.get_embeddings("m", ["swap text"])
+        assert await EmbeddingService.get_embeddings("m", ["swap text"]) == [[1.0, 0.0]]
+        assert encoded == ["swap text"]
+
+        version["m"] = "v2"
+        assert await EmbeddingService.get_embeddings("m", ["swap text"]) == [[0.0, 1.0]]
+        assert encoded == ["swap text", "swap text"]
+
+        # A v1 cache hit plus a text encoded across the swap: the whole request runs again
+        # under v2, so every vector comes from one version
+        version["m"] = "v1"
+        vectors = await EmbeddingService.get_embeddings("m", ["swap text", "during swap"])
+        assert vectors == [[0.0, 1.0], [0.0, 1.0]]
+        assert version["m"] == "v2"
+        assert await cache.get_embeddings("m", ["during swap"], "v1") == [None]
+        assert await cache.get_embeddings("m", ["during swap"], "v2") == [[0.0, 1.0]]
+
+        # Still swapping on the second attempt: a retryable error instead of mixed vectors
+        with pytest.raises(Overloaded):
+            await EmbeddingService.get_embeddings("m", ["flapping"])
+
+def test_swap_endpoint_rejects_unloaded_alias(client, auth_headers):
+    response = client.post("/admin/swap-model", json={"alias": "not-loaded", "model_name": "v2"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "not loaded" in response.json()["detail"]
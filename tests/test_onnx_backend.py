@@ -0,0 +1,43 @@
+import importlib.util
+import numpy as np
+import pytest
+import torch
+from app.core.model_manager import model_manager
+from app.core.onnx_backend import OnnxModel, pool, pooling_modes
+
+TEXTS = ["The quick brown fox", "  Padding makes this batch ragged, so masks matter  ", "a"]
+
+def test_numpy_pooling_matches_sentence_transformers():
+    model = model_manager.get_model("mini")
+    features = model.tokenize(TEXTS)
+    with torch.no_grad():
+        token_embeddings = model[0].auto_model(**features)[0].numpy()
+
+    vectors = pool(token_embeddings, features["attention_mask"].numpy(), pooling_modes(model[1]), normalize=True)
+    expected = model.encode(TEXTS, convert_to_numpy=True)
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, expected, atol=1e-5)
+
+def test_pooling_modes_are_concatenated_in_sentence_transformers_order():
+    token_embeddings = np.array([[[1.0, 2.0], [3.0, 6.0], [100.0, 100.0]]])
+    mask = np.array([[1, 1, 0]])
+    vectors = pool(token_embeddings, mask, ["mean", "cls", "max"], normalize=False)
+    np.testing.assert_allclose(vectors, [[1.0, 2.0, 3.0, 6.0, 2.0, 4.0]])
+
+def test_onnx_backend_cannot_run_in_process_mode(mocker):
+    mocker.patch.dict(model_manager.config, {"onnx-proc": {"name": "x", "backend": "onnx", "execution": "process"}})
+    with pytest.raises(ValueError):
+        model_manager._build("onnx-proc", "x", "cpu")
+
+@pytest.mark.skipif(importlib.util.find_spec("onnxruntime") is not None, reason="onnxruntime is installed")
+def test_missing_onnxruntime_is_reported():
+    with pytest.raises(RuntimeError, match="onnxruntime"):
+        OnnxModel("all-MiniLM-L6-v2")
+
+def test_onnx_vectors_match_torch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    onnx_model = OnnxModel("all-MiniLM-L6-v2", onnx_path=str(tmp_path / "model.onnx"), intra_op_threads=1)
+    expected = model_manager.get_model("mini").encode(TEXTS, convert_to_numpy=True)
+    np.testing.assert_allclose(onnx_model.encode(TEXTS, batch_size=2), expected, atol=1e-4)
+    assert onnx_model.resident_bytes > 0
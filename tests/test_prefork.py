@@ -0,0 +1,112 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+import pytest
+from app.core.model_manager import ModelManager
+from app.core.prefork import PreforkServer, bind_socket
+from app.core.process_engine import ProcessPoolModel
+
+class FakeModel:
+    def __init__(self, device="cpu"):
+        self.device = device
+
+@pytest.fixture
+def manager(mocker):
+    mocker.patch("app.config.settings.model_config", {})
+    return ModelManager()
+
+def test_master_restarts_crashed_workers_and_stops_them(tmp_path):
+    log = tmp_path / "starts"
+    log.touch()
+
+    def worker(index: int):
+        starts = log.read_text().split()
+        with open(log, "a") as f:
+            f.write(f"{index}\n")
+        if index == 0 and "0" not in starts:
+            raise RuntimeError("crashed on first start")
+        time.sleep(30) # Until the master's SIGTERM
+
+    server = PreforkServer(2, worker, graceful_timeout_s=5, restart_delay_s=0)
+
+    def stop_when_restarted():
+        deadline = time.monotonic() + 10
+        while log.read_text().split().count("0") < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        server.stop()
+
+    handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    stopper = threading.Thread(target=stop_when_restarted)
+    stopper.start()
+    # Not a worker: the master must leave it to whoever started it
+    other = subprocess.Popen(["sh", "-c", "exit 3"])
+    started = time.monotonic()
+    try:
+        server.run()
+    finally:
+        signal.signal(signal.SIGTERM, handlers[0])
+        signal.signal(signal.SIGINT, handlers[1])
+        stopper.join()
+
+    assert sorted(log.read_text().split()) == ["0", "0", "1"]
+    assert other.wait() == 3
+    assert server.children == {}
+    # Sleeping workers were stopped by SIGTERM, not by the kill timeout
+    assert time.monotonic() - started < 5
+
+def test_bound_socket_is_inherited_by_workers():
+    sock = bind_socket("127.0.0.1", 0)
+    try:
+        assert sock.get_inheritable()
+        assert sock.getsockname()[1] > 0
+    finally:
+        sock.close()
+
+def test_before_fork_rejects_gpu_models(manager):
+    manager.models["cpu-model"] = FakeModel("cpu")
+    manager.before_fork()
+
+    manager.models["gpu-model"] = FakeModel("cuda:0")
+    with pytest.raises(RuntimeError, match="gpu-model"):
+        manager.before_fork()
+
+def test_process_pools_are_started_by_each_worker_not_the_master(manager, mocker):
+    pool = mocker.Mock(spec=ProcessPoolModel)
+    manager.models["p"] = pool
+
+    manager.before_fork()
+    pool.close.assert_called_once()
+    manager.after_fork()
+    pool.start.assert_called_once()
+
+def test_after_fork_replaces_executors_and_splits_threads(manager, mocker, override_settings):
+    manager.models["m"] = FakeModel()
+    manager.executors["m"] = manager._new_executor("m")
+    inherited = manager.executors["m"]
+    set_threads = mocker.patch("app.core.model_manager.torch.set_num_threads")
+    mocker.patch("app.core.model_manager.os.cpu_count", return_value=8)
+
+    with override_settings(workers=4, torch_num_threads=None):
+        manager.after_fork()
+    set_threads.assert_called_once_with(2)
+    assert manager.executors["m"] is not inherited
+    assert manager.executors["m"].submit(os.getpid).result() == os.getpid()
+    inherited.shutdown()
+
+def test_admin_changes_are_refused_with_several_workers(client, auth_headers, override_settings):
+    calls = [
+        ("/admin/load-model", {"alias": "x", "model_name": "all-MiniLM-L6-v2"}),
+        ("/admin/swap-model", {"alias": "mini", "model_name": "all-MiniLM-L6-v2"}),
+        ("/admin/unload-model", {"alias": "mini"}),
+        ("/admin/cache/export", {}),
+        ("/admin/cache/import", {}),
+        ("/admin/cache/prewarm", {"path": "corpus.jsonl"}),
+    ]
+    with override_settings(workers=2):
+        for path, body in calls:
+            response = client.post(path, json=body, headers=auth_headers)
+            assert response.status_code == 409, path
+            assert "WORKERS=2" in response.json()["detail"]
+    assert "mini" in client.get("/ready").json()["models_loaded"]
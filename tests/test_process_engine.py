@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from app.core.model_manager import model_manager
+from app.core.process_engine import ProcessPoolModel
+
+@pytest.fixture(scope="module")
+def process_model():
+    model = ProcessPoolModel(model_manager.config["mini"]["name"], device="cpu", workers=2, max_rows=2)
+    model.start()
+    yield model
+    model.close()
+
+def test_process_pool_matches_in_process_vectors(process_model):
+    texts = ["Hello world", "word", "another text", "hello", "test"]
+
+    # 5 texts through a 2-row buffer exercises chunked shared-memory transfers
+    vectors = process_model.encode(texts)
+    expected = model_manager.get_model("mini").encode(texts)
+
+    assert vectors.dtype == np.float32
+    assert vectors.shape == expected.shape
+    assert np.allclose(vectors, expected, atol=1e-5)
+
+def test_process_pool_exposes_model_metadata(process_model):
+    assert process_model.get_sentence_embedding_dimension() == 384
+    assert process_model.max_seq_length
+    assert len(process_model._workers) == 2
+
+def test_closed_pool_raises_instead_of_restarting():
+    model = ProcessPoolModel(model_manager.config["mini"]["name"], device="cpu", workers=1)
+    model.close()
+    # An evicted model must not respawn its worker processes
+    with pytest.raises(RuntimeError, match="stopped"):
+        model.encode(["after unload"])
+    assert model._workers == []
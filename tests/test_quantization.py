@@ -0,0 +1,70 @@
+import pytest
+import torch
+from app.core.model_manager import ModelManager, model_manager
+from app.core.quantization import cosine_drift, validate_quantize
+
+def test_validate_quantize():
+    assert validate_quantize(None) is None
+    assert validate_quantize("INT8", "cpu") == "int8"
+    with pytest.raises(ValueError):
+        validate_quantize("int4")
+    with pytest.raises(ValueError):
+        validate_quantize("int8", "cuda")
+
+def test_cosine_drift():
+    drift = cosine_drift([[1.0, 0.0], [0.0, 1.0]], [[1.0, 0.0], [1.0, 1.0]])
+    assert drift["min_cosine"] == pytest.approx(0.707107, abs=1e-6)
+    assert drift["mean_cosine"] == pytest.approx(0.853553, abs=1e-6)
+
+def test_int8_model_is_smaller_and_self_checked(mocker):
+    mocker.patch("app.config.settings.model_config", {
+        "fp32": {"name": "all-MiniLM-L6-v2", "preload": False},
+        "int8": {"name": "all-MiniLM-L6-v2", "preload": False, "quantize": "int8"},
+    })
+    manager = ModelManager()
+    try:
+        fp32 = manager.load_model("fp32")
+        int8 = manager.load_model("int8")
+
+        assert not any(isinstance(m, torch.nn.Linear) for m in int8.modules())
+        # int8 weights are counted (packed params), and are smaller than fp32
+        assert 0 < manager.model_bytes["int8"] < manager.model_bytes["fp32"]
+
+        drift = manager.quantization["int8"]
+        assert drift["min_cosine"] > 0.9
+        assert "fp32" not in manager.quantization
+        assert manager.residency()["models"]["int8"]["quantization"] == drift
+
+        vectors = int8.encode(["hello world"])
+        assert vectors.shape == fp32.encode(["hello world"]).shape
+    finally:
+        for alias in list(manager.models):
+            manager.unload_model(alias)
+
+def test_admin_load_model_with_quantization(client, auth_headers):
+    payload = {"alias": "mini-int8", "model_name": "all-MiniLM-L6-v2", "device": "cpu", "quantize": "int8"}
+    try:
+        response = client.post("/admin/load-model", json=payload, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["quantization"]["min_cosine"] > 0.9
+
+        response = client.post("/embed", json={"model": "mini-int8", "input": "quantized"}, headers=auth_headers)
+        assert response.status_code == 200
+        assert client.get("/admin/models", headers=auth_headers).json()["models"]["mini-int8"]["quantize"] == "int8"
+
+        # Loading a loaded alias again is fine; changing what it runs is not
+        assert client.post("/admin/load-model", json=payload, headers=auth_headers).status_code == 200
+        same = {"alias": "mini-int8", "model_name": "all-MiniLM-L6-v2"}
+        assert client.post("/admin/load-model", json=same, headers=auth_headers).status_code == 200
+        other = {"alias": "mini-int8", "model_name": "paraphrase-MiniLM-L3-v2"}
+        assert client.post("/admin/load-model", json=other, headers=auth_headers).status_code == 409
+        quantized = {"alias": "mini", "model_name": model_manager.config["mini"]["name"], "quantize": "int8"}
+        response = client.post("/admin/load-model", json=quantized, headers=auth_headers)
+        assert response.status_code == 409
+        assert "swap-model" in response.json()["detail"]
+        assert model_manager.model_version("mini") == model_manager.config["mini"]["name"]
+    finally:
+        client.post("/admin/unload-model", json={"alias": "mini-int8"}, headers=auth_headers)
+
+    payload = {"alias": "mini-int4", "model_name": "all-MiniLM-L6-v2", "quantize": "int4"}
+    assert client.post("/admin/load-model", json=payload, headers=auth_headers).status_code == 400
@@ -0,0 +1,77 @@
+import pytest
+import torch
+from app.core.model_manager import ModelManager
+from app.core.residency import parameter_bytes
+
+class FakeModel(torch.nn.Module):
+    """Stands in for SentenceTransformer: the name sets the parameter count."""
+    def __init__(self, name, device=None):
+        super().__init__()
+        width = {"small": 64, "large": 128}[name]
+        self.layer = torch.nn.Linear(width, width, bias=False)
+
+SMALL = 64 * 64 * 4
+LARGE = 128 * 128 * 4
+
+@pytest.fixture
+def manager(mocker):
+    mocker.patch("app.core.model_manager.SentenceTransformer", FakeModel)
+    mocker.patch("app.config.settings.model_config", {
+        "pinned": {"name": "small", "preload": True},
+        "a": {"name": "small", "preload": False},
+        "b": {"name": "small", "preload": False},
+        "c": {"name": "large", "preload": False},
+    })
+    manager = ModelManager()
+    yield manager
+    for alias in list(manager.models):
+        manager.unload_model(alias)
+
+def test_parameter_bytes_counts_tied_weights_once():
+    model = FakeModel("small")
+    model.tied = model.layer
+    assert parameter_bytes(model) == SMALL
+
+def test_lru_unpinned_model_is_evicted_to_fit_budget(manager, override_settings):
+    assert manager.residency()["models"]["pinned"]["bytes"] == SMALL
+
+    with override_settings(model_memory_budget_bytes=SMALL * 3):
+        manager.get_model("a")
+        manager.get_model("b")
+        manager.get_model("a") # b is now least recently used
+
+        manager.get_model("c") # needs two small models' worth of room
+        assert set(manager.models) == {"pinned", "c"}
+
+        manager.get_model("a")
+        # Pinned stays even though it is least recently used; c goes
+        assert set(manager.models) == {"pinned", "a"}
+        assert manager.resident_total <= SMALL * 3
+
+def test_busy_model_is_not_evicted(manager, override_settings):
+    manager.in_use_checks.append(lambda alias: alias == "a")
+    with override_settings(model_memory_budget_bytes=SMALL * 2):
+        manager.get_model("a")
+        manager.get_model("b")
+        # Over budget, but the only candidate is busy
+        assert set(manager.models) == {"pinned", "a", "b"}
+
+def test_idle_models_are_unloaded_after_ttl(manager, override_settings):
+    unloaded = []
+    manager.unload_listeners.append(unloaded.append)
+    manager.get_model("a")
+    manager.get_model("b")
+    now = manager.last_used["b"]
+    manager.last_used["a"] = now - 120
+
+    with override_settings(model_idle_ttl_s=60):
+        assert manager.unload_idle(now=now) == ["a"]
+        assert manager.unload_idle(now=now + 3600) == ["b"]
+    assert set(manager.models) == {"pinned"}
+    assert unloaded == ["a", "b"]
+
+def test_admin_models_reports_residency(client, auth_headers):
+    response = client.get("/admin/models", headers=auth_headers)
+    assert response.status_code == 200
+    mini = response.json()["models"]["mini"]
+    assert mini["bytes"] > 0 and mini["pinned"] is True
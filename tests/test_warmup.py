@@ -0,0 +1,67 @@
+import pytest
+from app.core.model_manager import ModelManager
+from app.core.warmup import warm_up, warmup_plan
+
+class RecordingModel:
+    """Stands in for SentenceTransformer: records the batch shapes it encodes."""
+    max_seq_length = 256
+
+    def __init__(self, name=None, device=None):
+        self.shapes = []
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        self.shapes.append((len(texts), len(texts[0].split()) + 2))
+        return [[0.0]] * len(texts)
+
+def test_plan_uses_settings_and_per_model_overrides(override_settings):
+    with override_settings(model_warmup=True, model_warmup_batch_sizes=[1, 8, 64], model_warmup_seq_lengths=[16, 128], batch_max_size=32):
+        assert warmup_plan({}) == [(1, 16), (8, 16), (32, 16), (1, 128), (8, 128), (32, 128)]
+        assert warmup_plan({"warmup_batch_sizes": [4], "warmup_seq_lengths": [64]}) == [(4, 64)]
+        assert warmup_plan({"max_batch_size": 4}) == [(1, 16), (4, 16), (1, 128), (4, 128)]
+        assert warmup_plan({"warmup": False}) == []
+    with override_settings(model_warmup=False):
+        assert warmup_plan({}) == []
+        assert warmup_plan({"warmup": True, "warmup_batch_sizes": [2], "warmup_seq_lengths": [8]}) == [(2, 8)]
+
+def test_warm_up_caps_sequence_length_and_survives_errors():
+    model = RecordingModel()
+    seconds = warm_up(model, [(2, 16), (2, 512), (2, 1024)])
+    # 512 and 1024 both cap to max_seq_length: one batch
+    assert model.shapes == [(2, 16), (2, 256)]
+    assert seconds >= 0
+
+    class Broken:
+        def encode(self, texts, batch_size=None):
+            raise RuntimeError("out of memory")
+
+    assert warm_up(Broken(), [(1, 16)]) >= 0
+
+@pytest.mark.asyncio
+async def test_model_is_warmed_up_before_it_is_ready(mocker, override_settings):
+    built = []
+
+    def build(*args, **kwargs):
+        model = RecordingModel()
+        built.append(model)
+        return model
+
+    mocker.patch("app.core.model_manager.SentenceTransformer", side_effect=build)
+    mocker.patch("app.config.settings.model_config", {"m": {"name": "m", "preload": False, "warmup_seq_lengths": [32]}})
+    manager = ModelManager()
+    original = RecordingModel.encode
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        # Warm-up runs while the model is still loading and not yet served
+        self.ready_when_encoding = "m" in manager.models or manager.states["m"]["state"] == "ready"
+        return original(self, texts, batch_size)
+
+    mocker.patch.object(RecordingModel, "encode", encode)
+    with override_settings(model_warmup=True, model_warmup_batch_sizes=[1, 4], batch_max_size=32):
+        await manager.load_model_async("m")
+
+    model = built[0]
+    assert model.shapes == [(1, 32), (4, 32)]
+    assert model.ready_when_encoding is False
+    assert manager.states["m"]["state"] == "ready"
+    assert manager.states["m"]["warmup_s"] >= 0
+    assert manager.residency()["models"]["m"]["warmup_s"] == round(manager.warmup_seconds["m"], 3)